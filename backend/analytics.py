@@ -0,0 +1,97 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from cache import TTLCache
+from database import database
+from sketches import ALL_PORTFOLIOS, HyperLogLog
+from storage import day_start
+
+logger = logging.getLogger(__name__)
+
+# Dashboards poll; identical queries within this many seconds share one result
+analytics_cache = TTLCache(
+    "analytics", ttl=float(os.environ.get("ANALYTICS_CACHE_TTL", 30))
+)
+
+class AnalyticsService:
+    """Service layer for multi-window analytics queries"""
+
+    @staticmethod
+    async def summary(days: int = 30, portfolio: Optional[str] = None) -> dict:
+        """Rollup totals plus unique visitors and top referrers from the traffic sketches"""
+        # Awaited in turn: both are cheap reads, and each task gather() would
+        # start waits its turn behind every other request on the event loop
+        summary = await database.get_analytics_summary(days, portfolio)
+        sketch = await database.get_traffic_sketch(days, portfolio)
+        if summary and sketch is not None:
+            summary["uniqueVisitors"] = sketch.visitors.count()
+            summary["topReferrers"] = [
+                {"referrer": host, "views": views} for host, views, _ in sketch.referrers.top(10)
+            ]
+        return summary
+
+    @staticmethod
+    async def query(
+        windows: List[int], bucket: str = "day", top: int = 10, portfolio: Optional[str] = None
+    ) -> dict:
+        """Answer views, contacts, top pages and referrers for several windows at once,
+        across all portfolios or for one"""
+        windows = sorted(set(windows))
+        key = (tuple(windows), bucket, top, portfolio)
+        return await analytics_cache.get(
+            key, lambda: AnalyticsService._compute(windows, bucket, top, portfolio)
+        )
+
+    @staticmethod
+    async def _compute(windows: List[int], bucket: str, top: int, portfolio: Optional[str]) -> dict:
+        # One pass per collection (a $facet aggregation on Mongo), in turn
+        # like the summary; results are cached, so this runs once per TTL
+        page_stats = await database.page_view_window_stats(windows, bucket, top, portfolio)
+        contact_stats = await database.contact_window_stats(windows, portfolio)
+        uniques = await AnalyticsService._unique_visitors(windows, portfolio)
+        if not page_stats or len(contact_stats) != len(windows):
+            # Raising keeps the failure out of the cache
+            raise RuntimeError("Analytics aggregation failed")
+
+        return {
+            "generatedAt": datetime.utcnow().isoformat(),
+            "bucket": bucket,
+            "windows": [
+                {
+                    "days": days,
+                    "totalViews": page_stats["windows"][days]["totalViews"],
+                    "totalContacts": contact_stats.get(days, 0),
+                    "uniqueVisitors": uniques[days],
+                    "topPages": page_stats["windows"][days]["topPages"],
+                    "topReferrers": page_stats["windows"][days]["topReferrers"],
+                }
+                for days in windows
+            ],
+            "series": [
+                {"start": point["start"].isoformat(), "views": point["views"]}
+                for point in page_stats["series"]
+            ],
+        }
+
+    @staticmethod
+    async def _unique_visitors(windows: List[int], portfolio: Optional[str]) -> Dict[int, int]:
+        """Estimated unique visitors per window, counted over whole days.
+
+        The daily visitor sketches of the widest window are read once and
+        merged newest first, so each day is merged a single time.
+        """
+        today = day_start(datetime.utcnow())
+        sketches = await database.load_traffic_sketches(
+            today - timedelta(days=windows[-1]), portfolio or ALL_PORTFOLIOS
+        )
+        newest_first = sorted(sketches, reverse=True)
+        merged, uniques, i = HyperLogLog(), {}, 0
+        for days in windows:
+            since = today - timedelta(days=days)
+            while i < len(newest_first) and newest_first[i] >= since:
+                merged = merged.merge(sketches[newest_first[i]].visitors)
+                i += 1
+            uniques[days] = merged.count()
+        return uniques
@@ -0,0 +1,28 @@
+import hmac
+import logging
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+# Shared secret for endpoints that change admin data. Unset, they are
+# refused outright rather than left open.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN") or None
+
+
+def bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+async def require_admin(request: Request):
+    """FastAPI dependency: 401 without a valid ``Authorization: Bearer <ADMIN_TOKEN>``,
+    403 if no ADMIN_TOKEN is configured"""
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    token = bearer_token(request)
+    if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        logger.warning(f"Rejected admin request to {request.url.path}")
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
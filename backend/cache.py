@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from metrics import CACHE_BYTES, CACHE_ENTRIES, CACHE_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+
+def approximate_size(value: Any) -> int:
+    """Rough memory footprint of a cached value in bytes.
+
+    Models are measured by their JSON size, which tracks the size of the
+    document rather than Python's per-object overhead; good enough to keep
+    a budget in proportion.
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+    if isinstance(value, BaseModel):
+        return len(value.model_dump_json())
+    return sys.getsizeof(value)
+
+
+class CacheEntry:
+    """A cached value together with the version it was loaded at"""
+
+    __slots__ = ("key", "value", "version", "size", "_derived", "_groups", "_owner")
+
+    def __init__(self, key: Hashable, value: Any, version: int, owner: Optional["VersionedCache"] = None):
+        self.key = key
+        self.value = value
+        self.version = version
+        self.size = 0
+        self._derived = {}
+        self._groups: Dict[Hashable, List[Any]] = {}
+        self._owner = owner
+
+    def derive(
+        self, key: Any, factory: Callable[[Any], Any], group: Optional[Hashable] = None, limit: int = 0
+    ) -> Any:
+        """Memoize ``factory(value)`` for the lifetime of this entry.
+
+        At most ``limit`` values derived under the same ``group`` are kept;
+        deriving another first forgets the oldest of them.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        if group is not None and limit:
+            keys = self._groups.setdefault(group, [])
+            while len(keys) >= limit:
+                self._forget_derived(keys.pop(0))
+        result = self._derived[key] = factory(self.value)
+        if group is not None and limit:
+            keys.append(key)
+        if self._owner is not None:
+            self._owner._resized(self, approximate_size(result))
+        return result
+
+    def _forget_derived(self, key: Any):
+        result = self._derived.pop(key)
+        if self._owner is not None:
+            self._owner._resized(self, -approximate_size(result))
+
+
+class VersionedCache:
+    """In-process LRU cache for values that only change on explicit writes,
+    such as each tenant's portfolio.
+
+    Entries are kept in least-recently-used order and evicted once their
+    approximate size, counting what was derived from them (rendered and
+    compressed bodies), passes ``max_bytes``; lookups and stores are O(1).
+    Every invalidation bumps ``version``; a load that started before its key
+    was invalidated is returned to its callers but never stored, so a slow
+    read can't resurrect data that a concurrent write has replaced.
+    Concurrent misses for a key share one in-flight load.
+    """
+
+    def __init__(self, name: str, max_bytes: int = 64 * 1024 * 1024):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.version = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, Tuple[asyncio.Future, int]] = {}
+        # Latest invalidation of each key that has a load in flight
+        self._invalidated: Dict[Hashable, int] = {}
+        self._listeners: List[Callable[[Hashable, int], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._entries)
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """The cached entry for ``key``, without loading it or refreshing its recency"""
+        return self._entries.get(key)
+
+    def invalidate(self, key: Hashable):
+        """Drop the cached value for ``key``; the next read reloads it"""
+        self.version += 1
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._forget(entry)
+        if key in self._inflight:
+            self._invalidated[key] = self.version
+        logger.debug(f"Cache '{self.name}' invalidated {key!r} (version {self.version})")
+        for listener in list(self._listeners):
+            listener(key, self.version)
+
+    def subscribe(self, listener: Callable[[Hashable, int], None]):
+        """Call ``listener(key, version)`` after every invalidation"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Hashable, int], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def get_entry(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Optional[CacheEntry]:
+        """Return the cached entry for ``key``, loading it through ``loader`` on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        inflight = self._inflight.get(key)
+        if inflight is None or self._invalidated.get(key, -1) > inflight[1]:
+            future = asyncio.ensure_future(self._load(key, loader, self.version))
+            inflight = self._inflight[key] = (future, self.version)
+
+        # Shield so a cancelled caller doesn't cancel the load others wait on
+        return await asyncio.shield(inflight[0])
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, loading it through ``loader`` on a miss"""
+        entry = await self.get_entry(key, loader)
+        return entry.value if entry is not None else None
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], version: int) -> Optional[CacheEntry]:
+        try:
+            value = await loader()
+        finally:
+            stale = self._invalidated.get(key, -1) > version
+            if self._inflight.get(key, (None, None))[1] == version:
+                del self._inflight[key]
+            if key not in self._inflight:
+                self._invalidated.pop(key, None)
+        if value is None:
+            # Don't cache misses: the document may be created at any moment
+            return None
+        entry = CacheEntry(key, value, version, owner=self)
+        entry.size = approximate_size(value)
+        if not stale:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._forget(previous)
+            self._entries[key] = entry
+            self.bytes += entry.size
+            self._evict()
+        return entry
+
+    def _resized(self, entry: CacheEntry, delta: int):
+        entry.size += delta
+        if self._entries.get(entry.key) is entry:
+            self.bytes += delta
+            self._evict()
+
+    def _forget(self, entry: CacheEntry):
+        self.bytes -= entry.size
+
+    def _evict(self):
+        # The newest entry stays even if it alone is over budget
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._forget(entry)
+            CACHE_EVICTIONS.labels(self.name).inc()
+        CACHE_BYTES.labels(self.name).set(self.bytes)
+        CACHE_ENTRIES.labels(self.name).set(len(self._entries))
+
+
+class TTLCache:
+    """Small keyed cache whose entries expire after ``ttl`` seconds.
+
+    Holds at most ``max_entries`` results, evicting the least recently
+    stored. Like VersionedCache, concurrent misses for the same key share
+    one in-flight computation.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the fresh value for ``key``, computing it through ``loader`` if needed"""
+        hit = self._entries.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            return hit[1]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(self._load(key, loader))
+        return await asyncio.shield(future)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        finally:
+            self._inflight.pop(key, None)
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+
+# Global cache of portfolio documents, keyed by slug
+portfolio_cache = VersionedCache(
+    "portfolio", max_bytes=int(os.environ.get("PORTFOLIO_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from cache import portfolio_cache
+from database import database
+from metrics import CACHE_COHERENCE_INVALIDATIONS
+
+logger = logging.getLogger(__name__)
+
+# CACHE_COHERENCE modes: follow a change stream where the store offers one
+# (falling back to polling), only poll, or trust local invalidation alone
+COHERENCE_MODES = ("auto", "watch", "poll", "off")
+
+
+# Portfolios whose revisions are read per poll query
+POLL_CHUNK_SIZE = 500
+
+
+class PortfolioCoherence:
+    """Keeps this worker's portfolio cache in step with writes made by others.
+
+    A write invalidates the cache of the worker that made it; every other
+    worker learns of it here. Where the store can push changes (a Mongo
+    replica set) they arrive through a change stream within milliseconds.
+    Otherwise the revision tokens stored next to the cached portfolios are
+    polled every CACHE_COHERENCE_POLL_INTERVAL seconds, an indexed lookup
+    that never reads the documents, which bounds staleness to that interval.
+
+    Only portfolios this worker holds are compared: a cached portfolio whose
+    stored revision differs from its own is invalidated, which also
+    triggers the listeners that rebuild derived copies such as the
+    pre-rendered site. A lost change stream is reopened after
+    CACHE_COHERENCE_RETRY_SECONDS; it starts by asking for a full
+    comparison, so writes made while it was down are not missed.
+    """
+
+    def __init__(self):
+        self.mode = "auto"
+        self.poll_interval = 1.0
+        self.retry_delay = 5.0
+        self._task: Optional[asyncio.Task] = None
+
+    def configure_from_env(self):
+        self.mode = os.environ.get("CACHE_COHERENCE", self.mode).lower()
+        if self.mode not in COHERENCE_MODES:
+            raise ValueError(f"Unknown CACHE_COHERENCE {self.mode!r}; expected one of {', '.join(COHERENCE_MODES)}")
+        self.poll_interval = float(os.environ.get("CACHE_COHERENCE_POLL_INTERVAL", self.poll_interval))
+        self.retry_delay = float(os.environ.get("CACHE_COHERENCE_RETRY_SECONDS", self.retry_delay))
+
+    async def start(self):
+        """Start following portfolio writes from other workers"""
+        self.configure_from_env()
+        if self.mode == "off":
+            logger.info("Cache coherence disabled; other workers' writes won't be seen")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def observe(self, slug: str, revision: Optional[str], source: str):
+        """Invalidate the cached portfolio ``slug`` unless it is at ``revision``"""
+        entry = portfolio_cache.peek(slug)
+        # Not cached here, or already current (our own writes invalidated
+        # the cache when they were made)
+        if entry is None or entry.value.revision == revision:
+            return
+        CACHE_COHERENCE_INVALIDATIONS.labels(source).inc()
+        logger.info(f"Portfolio {slug!r} changed in another worker (revision {revision}, via {source})")
+        portfolio_cache.invalidate(slug)
+
+    async def resync(self, source: str):
+        """Compare every cached portfolio with its stored revision"""
+        slugs = portfolio_cache.keys()
+        for i in range(0, len(slugs), POLL_CHUNK_SIZE):
+            chunk = slugs[i:i + POLL_CHUNK_SIZE]
+            revisions = await database.get_portfolio_revisions(chunk)
+            # An empty answer is an unreachable store as often as missing
+            # portfolios; only act on the revisions actually read
+            for slug, revision in revisions.items():
+                self.observe(slug, revision, source)
+
+    async def _run(self):
+        if self.mode in ("auto", "watch"):
+            while True:
+                try:
+                    await self._watch()
+                except NotImplementedError as e:
+                    if self.mode == "watch":
+                        logger.error(f"Cache coherence needs change streams: {e}; polling instead")
+                    break
+                except Exception as e:
+                    logger.warning(f"Portfolio change stream lost: {e}; reopening in {self.retry_delay:.0f}s")
+                    await asyncio.sleep(self.retry_delay)
+        logger.info(f"Cache coherence polling portfolio revisions every {self.poll_interval}s")
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.resync("poll")
+
+    async def _watch(self):
+        changes = database.watch_portfolio()
+        try:
+            async for change in changes:
+                if change is None:
+                    await self.resync("watch")
+                else:
+                    self.observe(*change, "watch")
+            # A stream that ends cleanly was closed under us; reopen it
+            raise ConnectionError("change stream closed")
+        finally:
+            await changes.aclose()
+
+
+# Global coherence follower for the portfolio cache
+portfolio_coherence = PortfolioCoherence()
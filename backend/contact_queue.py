@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from models import ContactSubmission
+from database import database
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contact_jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contact_jobs_available ON contact_jobs (available_at);
+CREATE TABLE IF NOT EXISTS contact_idempotency (
+    key TEXT PRIMARY KEY,
+    submission_id TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS contact_idempotency_expires ON contact_idempotency (expires_at);
+CREATE TABLE IF NOT EXISTS contact_dead_letters (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+# Retry delays grow exponentially up to this many seconds
+MAX_RETRY_DELAY = 300.0
+
+
+class IdempotencyKeyReused(Exception):
+    """An Idempotency-Key came back with a different submission than the one it was first sent with"""
+
+
+def content_key(portfolio: str, email: str, message: str) -> str:
+    """Dedupe key for submissions sent without an Idempotency-Key"""
+    digest = hashlib.sha256(f"{portfolio}\0{email.strip().lower()}\0{message.strip()}".encode()).hexdigest()
+    return f"hash:{digest}"
+
+
+def fingerprint(submission: ContactSubmission) -> str:
+    """Hash of what the client sent, to tell a retry from a new submission under the same key"""
+    fields = (submission.portfolio, submission.name, submission.email, submission.company or "", submission.message)
+    return hashlib.sha256("\0".join(fields).encode()).hexdigest()
+
+
+class ContactQueue:
+    """Durable local queue between the contact endpoint and the database.
+
+    Submissions are committed to a SQLite file (CONTACT_QUEUE_PATH) and the
+    request returns straight away; a pool of workers then writes them to the
+    database, retrying with backoff while it is unavailable. A job is leased
+    while it is being written, so one abandoned by a crashed worker is
+    picked up again, and storage treats a repeated submission id as already
+    created, so redelivery never duplicates a row.
+
+    Queue operations are single short SQLite transactions run inline: far
+    cheaper than a round trip to the database, and cheaper than handing them
+    to a thread, which stalls behind a busy event loop. In WAL mode with
+    ``synchronous=NORMAL`` (the default) a commit survives a process crash;
+    set CONTACT_QUEUE_SYNCHRONOUS=FULL to also survive power loss at the cost
+    of an fsync per submission.
+
+    A job that still fails after CONTACT_QUEUE_MAX_ATTEMPTS deliveries, or
+    whose payload can't be read back at all, is moved to a dead-letter
+    table and logged as an error; ``manage.py requeue-contacts`` puts it
+    back once the cause is fixed.
+
+    Retries from clients are recognised by their Idempotency-Key (kept for
+    CONTACT_IDEMPOTENCY_TTL seconds) or, without one, by a hash of email and
+    message within CONTACT_DEDUPE_WINDOW seconds, and answered with the id
+    of the original submission. Keys are scoped to the portfolio and client,
+    and a key sent again with a different body is refused with
+    IdempotencyKeyReused. Submission ids are random, never derived from
+    the key: once a key expires, reusing it can at worst store a
+    duplicate, never make a new message look already stored.
+    """
+
+    def __init__(self):
+        self.path = str(Path(__file__).parent / "contact_queue.db")
+        self.workers = 2
+        self.poll_interval = 1.0
+        self.lease = 60.0
+        self.max_attempts = 20
+        self.idempotency_ttl = 86400.0
+        self.dedupe_window = 600.0
+        self.synchronous = "NORMAL"
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._next_prune = 0.0
+        self._stopping = False
+
+    def configure_from_env(self):
+        self.path = os.environ.get("CONTACT_QUEUE_PATH", self.path)
+        self.workers = int(os.environ.get("CONTACT_QUEUE_WORKERS", self.workers))
+        self.poll_interval = float(os.environ.get("CONTACT_QUEUE_POLL_INTERVAL", self.poll_interval))
+        self.lease = float(os.environ.get("CONTACT_QUEUE_LEASE_SECONDS", self.lease))
+        self.max_attempts = int(os.environ.get("CONTACT_QUEUE_MAX_ATTEMPTS", self.max_attempts))
+        self.idempotency_ttl = float(os.environ.get("CONTACT_IDEMPOTENCY_TTL", self.idempotency_ttl))
+        self.dedupe_window = float(os.environ.get("CONTACT_DEDUPE_WINDOW", self.dedupe_window))
+        self.synchronous = os.environ.get("CONTACT_QUEUE_SYNCHRONOUS", self.synchronous).upper()
+
+    def open(self):
+        """Open the queue file, without starting workers"""
+        self.configure_from_env()
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        self._conn.execute("PRAGMA busy_timeout=1000")
+        self._conn.executescript(SCHEMA)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(contact_idempotency)")]
+        if "fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE contact_idempotency ADD COLUMN fingerprint TEXT")
+
+    async def start(self):
+        """Open the queue file and start the workers"""
+        self.open()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        logger.info(
+            f"Contact queue started ({self.path}, workers={self.workers}, pending={self.pending()}, "
+            f"dead letters={self.dead_letters()})"
+        )
+
+    async def stop(self):
+        """Stop the workers; undelivered submissions stay queued for the next start"""
+        # Workers finish the write in hand and exit; cancelling one parked in
+        # wait_for can be swallowed, leaving shutdown waiting forever
+        self._stopping = True
+        if self._wakeup:
+            self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn:
+            remaining = self.pending()
+            self._conn.close()
+            self._conn = None
+            logger.info(f"Contact queue stopped ({remaining} pending)")
+
+    def pending(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM contact_jobs").fetchone()[0]
+
+    def dead_letters(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM contact_dead_letters").fetchone()[0]
+
+    def requeue_dead_letters(self) -> int:
+        """Move every dead-lettered job back onto the queue with a fresh attempt count"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO contact_jobs (id, payload, available_at) "
+                "SELECT id, payload, ? FROM contact_dead_letters",
+                (time.time(),)
+            )
+            requeued = self._conn.execute("DELETE FROM contact_dead_letters").rowcount
+            self._conn.execute("COMMIT")
+            return requeued
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def submit(
+        self, submission: ContactSubmission, idempotency_key: Optional[str] = None, client: Optional[str] = None
+    ) -> Tuple[str, bool]:
+        """Queue a submission; returns its id and whether it repeats an earlier one.
+
+        Raises IdempotencyKeyReused if ``idempotency_key`` was already used
+        by ``client`` for a different submission.
+        """
+        if idempotency_key:
+            key, ttl = f"key:{submission.portfolio}:{client or ''}:{idempotency_key}", self.idempotency_ttl
+        else:
+            key, ttl = content_key(submission.portfolio, submission.email, submission.message), self.dedupe_window
+
+        if self._conn is None:
+            # Not started (e.g. a script using the service directly): write through
+            if not await database.create_contact_submission(submission):
+                raise RuntimeError("contact submission could not be stored")
+            return submission.id, False
+
+        submission_id, duplicate = self._enqueue(
+            key, ttl, submission.id, fingerprint(submission), submission.model_dump_json()
+        )
+        if not duplicate and self._wakeup:
+            self._wakeup.set()
+        return submission_id, duplicate
+
+    def _enqueue(
+        self, key: str, ttl: float, submission_id: str, body_fingerprint: str, payload: str
+    ) -> Tuple[str, bool]:
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so processes sharing the file serialize here
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT submission_id, fingerprint FROM contact_idempotency WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO contact_idempotency (key, submission_id, expires_at, fingerprint) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, submission_id, now + ttl, body_fingerprint)
+                )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO contact_jobs (id, payload, available_at) VALUES (?, ?, ?)",
+                    (submission_id, payload, now)
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return submission_id, False
+        existing_id, existing_fingerprint = row
+        # Keys stored before fingerprints were kept match any body
+        if existing_fingerprint is not None and existing_fingerprint != body_fingerprint:
+            raise IdempotencyKeyReused(f"Idempotency-Key already used for submission {existing_id}")
+        return existing_id, True
+
+    def _claim(self) -> Optional[Tuple[str, str, int]]:
+        """Lease the oldest job that is due, if any"""
+        now = time.time()
+        return self._conn.execute(
+            "UPDATE contact_jobs SET available_at = ?, attempts = attempts + 1 "
+            "WHERE id = (SELECT id FROM contact_jobs WHERE available_at <= ? ORDER BY available_at LIMIT 1) "
+            "RETURNING id, payload, attempts",
+            (now + self.lease, now)
+        ).fetchone()
+
+    def _complete(self, job_id: str):
+        self._conn.execute("DELETE FROM contact_jobs WHERE id = ?", (job_id,))
+
+    def _retry_later(self, job_id: str, delay: float):
+        self._conn.execute(
+            "UPDATE contact_jobs SET available_at = ? WHERE id = ?", (time.time() + delay, job_id)
+        )
+
+    def _dead_letter(self, job_id: str, payload: str, attempts: int, error: str):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contact_dead_letters (id, payload, attempts, error, failed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job_id, payload, attempts, error, time.time())
+            )
+            self._complete(job_id)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.error(f"Contact submission {job_id} moved to dead letters after {attempts} attempts: {error}")
+
+    def _prune(self):
+        self._conn.execute("DELETE FROM contact_idempotency WHERE expires_at <= ?", (time.time(),))
+
+    async def _deliver(self, job_id: str, payload: str, attempts: int):
+        try:
+            submission = ContactSubmission.model_validate_json(payload)
+        except ValueError as e:
+            # No later attempt can read it either
+            self._dead_letter(job_id, payload, attempts, f"unreadable payload: {e}")
+            return
+        try:
+            # Shielded so shutdown can't interrupt a write halfway through
+            stored = await asyncio.shield(database.create_contact_submission(submission))
+            error = "not stored"
+        except Exception as e:
+            stored, error = False, str(e)
+        if stored:
+            self._complete(job_id)
+            return
+        if attempts >= self.max_attempts:
+            self._dead_letter(job_id, payload, attempts, error)
+            return
+        delay = min(2 ** attempts, MAX_RETRY_DELAY)
+        self._retry_later(job_id, delay)
+        logger.warning(f"Contact submission {job_id} not stored (attempt {attempts}), retrying in {delay:.0f}s")
+
+    async def _work(self):
+        while not self._stopping:
+            try:
+                self._wakeup.clear()
+                job = self._claim()
+                if job:
+                    await self._deliver(*job)
+                    continue
+                if time.monotonic() >= self._next_prune:
+                    self._next_prune = time.monotonic() + 60
+                    self._prune()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            except Exception as e:
+                logger.error(f"Contact queue worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+
+# Global contact queue
+contact_queue = ContactQueue()
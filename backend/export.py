@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, List
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Streamed output is flushed to the client in chunks of roughly this size
+CHUNK_SIZE = 64 * 1024
+
+PAGE_VIEW_FIELDS = ["id", "portfolio", "page", "timestamp", "ipAddress", "userAgent", "referrer"]
+CONTACT_SUBMISSION_FIELDS = [
+    "id", "portfolio", "name", "email", "company", "message", "timestamp",
+    "source", "status", "ipAddress", "userAgent",
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Headers are sent before the first record is read, so a failure can't
+# change the status; instead every export ends with a trailer saying whether
+# it is complete. NDJSON ends with one more object under this key:
+#   {"_export": {"complete": true, "count": 1234}}
+#   {"_export": {"complete": false, "count": 500, "error": "export failed"}}
+# CSV ends with a line starting with "#", which no record (led by its id) does:
+#   #export complete,count=1234
+#   #export incomplete,count=500,error=export failed
+# An export without a trailer was cut off in transit.
+TRAILER_KEY = "_export"
+
+# Reported in a trailer instead of the exception, which may hold internals
+EXPORT_ERROR = "export failed"
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_line(doc: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(doc, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(doc, default=_json_default, separators=(",", ":")) + "\n").encode()
+
+
+async def ndjson_stream(docs: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Encode documents as newline-delimited JSON, one chunk at a time,
+    ending with a trailer object"""
+    buffer = bytearray()
+    trailer = {"complete": True, "count": 0}
+    try:
+        async for doc in docs:
+            buffer += encode_line(doc)
+            trailer["count"] += 1
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+    except Exception as e:
+        # Headers are already sent; all we can do is say so at the end
+        logger.error(f"Export aborted after {trailer['count']} records: {e}")
+        trailer.update(complete=False, error=EXPORT_ERROR)
+    buffer += encode_line({TRAILER_KEY: trailer})
+    yield bytes(buffer)
+
+
+async def csv_stream(docs: AsyncIterator[dict], fields: List[str]) -> AsyncIterator[bytes]:
+    """Encode documents as CSV with a header row, one chunk at a time,
+    ending with a trailer line"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    complete = True
+    try:
+        async for doc in docs:
+            writer.writerow({
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in doc.items()
+            })
+            count += 1
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        logger.error(f"Export aborted after {count} records: {e}")
+        complete = False
+    if complete:
+        buffer.write(f"#export complete,count={count}\r\n")
+    else:
+        buffer.write(f"#export incomplete,count={count},error={EXPORT_ERROR}\r\n")
+    yield buffer.getvalue().encode()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+from models import PageView
+from database import database
+from metrics import PAGE_VIEWS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+
+class PageViewBuffer:
+    """Write-behind buffer that batches page views into bulk inserts.
+
+    Beacons are queued in memory and flushed with a single ``insert_many``
+    once ``batch_size`` views are waiting or ``flush_interval`` seconds have
+    passed. The queue is bounded; when it is full, ``submit`` waits up to
+    ``enqueue_timeout`` seconds and then reports failure so the endpoint can
+    shed load instead of growing memory without limit.
+
+    A batch whose write fails is tried once more after ``retry_delay``
+    seconds; if that fails too it is dropped and counted in
+    ``page_views_dropped_total``, so the flusher never falls further behind
+    than one retry.
+    """
+
+    def __init__(self):
+        self.max_size = 10000
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.enqueue_timeout = 0.5
+        self.retry_delay = 1.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def configure_from_env(self):
+        self.max_size = int(os.environ.get("PAGE_VIEW_BUFFER_SIZE", self.max_size))
+        self.batch_size = int(os.environ.get("PAGE_VIEW_BATCH_SIZE", self.batch_size))
+        self.flush_interval = float(os.environ.get("PAGE_VIEW_FLUSH_INTERVAL", self.flush_interval))
+        self.enqueue_timeout = float(os.environ.get("PAGE_VIEW_ENQUEUE_TIMEOUT", self.enqueue_timeout))
+        self.retry_delay = float(os.environ.get("PAGE_VIEW_RETRY_DELAY", self.retry_delay))
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Start the background flusher"""
+        self.configure_from_env()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Page view buffer started (size={self.max_size}, batch={self.batch_size}, "
+            f"interval={self.flush_interval}s)"
+        )
+
+    async def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        # The flusher writes out the batch in hand and exits; cancelling it
+        # while parked in wait_for can be swallowed, leaving shutdown waiting
+        self._stopping = True
+        if self._task:
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._queue:
+            while not self._queue.empty():
+                await self._flush(self._drain(self.batch_size))
+        logger.info("Page view buffer stopped")
+
+    async def submit(self, page_view: PageView) -> bool:
+        """Queue a page view; returns False if the buffer stayed full"""
+        if self._queue is None:
+            # Not started (e.g. a script using the service directly): write through
+            return await database.log_page_views([page_view])
+        try:
+            self._queue.put_nowait(page_view)
+            self._wakeup.set()
+            return True
+        except asyncio.QueueFull:
+            pass
+        try:
+            await asyncio.wait_for(self._queue.put(page_view), self.enqueue_timeout)
+            self._wakeup.set()
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Page view buffer full, rejecting beacon")
+            PAGE_VIEWS_DROPPED.labels("buffer_full").inc()
+            return False
+
+    def _drain(self, limit: int) -> List[PageView]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _wait(self, timeout: Optional[float]):
+        """Sleep until views are queued, stop() is called or ``timeout`` passes"""
+        self._wakeup.clear()
+        if self._queue.empty() and not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        while not self._stopping:
+            await self._wait(None)
+            batch = self._drain(self.batch_size)
+            deadline = time.monotonic() + self.flush_interval
+            while batch and len(batch) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await self._wait(remaining)
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            await self._flush(batch)
+
+    async def _write(self, batch: List[PageView]) -> bool:
+        try:
+            # Shielded so shutdown can't interrupt a batch halfway through the write
+            return await asyncio.shield(database.log_page_views(batch))
+        except Exception as e:
+            logger.error(f"Page view flush failed: {e}")
+            return False
+
+    async def _flush(self, batch: List[PageView]):
+        if not batch:
+            return
+        if await self._write(batch):
+            return
+        await asyncio.sleep(self.retry_delay)
+        if await self._write(batch):
+            logger.info(f"Wrote {len(batch)} page views on retry")
+            return
+        PAGE_VIEWS_DROPPED.labels("flush_failed").inc(len(batch))
+        logger.error(f"Dropped {len(batch)} page views after a failed flush and retry")
+
+
+# Global page view buffer
+page_view_buffer = PageViewBuffer()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the portfolio backend.
+
+Usage: python manage.py --help
+"""
+
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import typer
+from dotenv import load_dotenv
+
+# Load environment variables before the database reads them
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from contact_queue import contact_queue
+from database import database
+from export import encode_line
+from portfolio_service import load_seed
+from retention import RETAINED_COLLECTIONS, read_archive, retention
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+cli = typer.Typer(help="Maintenance commands for the portfolio backend")
+
+
+@cli.callback()
+def main():
+    """Maintenance commands for the portfolio backend"""
+
+
+def run(coro_factory):
+    """Run a coroutine against a connected database"""
+    async def runner():
+        await database.connect()
+        try:
+            return await coro_factory()
+        finally:
+            await database.disconnect()
+    return asyncio.run(runner())
+
+
+@cli.command("backfill-rollups")
+def backfill_rollups():
+    """Rebuild the daily analytics counters from raw page views and contacts"""
+    result = run(database.backfill_rollups)
+    typer.echo(json.dumps(result))
+
+
+@cli.command("backfill-sketches")
+def backfill_sketches():
+    """Rebuild the unique visitor and referrer sketches from raw page views"""
+    result = run(database.rebuild_traffic_sketches)
+    typer.echo(json.dumps(result))
+
+
+@cli.command("bucket-page-views")
+def bucket_page_views(
+    drop: bool = typer.Option(False, "--drop", help="Drop the page_views collection once copied"),
+):
+    """Move raw page views into hourly buckets (run with PAGE_VIEW_STORAGE=buckets)"""
+    try:
+        result = run(lambda: database.bucket_page_views(drop))
+    except (NotImplementedError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(1)
+    typer.echo(json.dumps(result))
+
+
+@cli.command("apply-retention")
+def apply_retention():
+    """Archive raw records past their retention period to ARCHIVE_DIR, then delete them"""
+    retention.configure_from_env()
+    if not retention.enabled:
+        typer.echo("No retention period set (PAGE_VIEW_RETENTION_DAYS, CONTACT_RETENTION_DAYS)", err=True)
+        raise typer.Exit(1)
+    result = run(retention.run_once)
+    typer.echo(json.dumps(result))
+
+
+@cli.command("requeue-contacts")
+def requeue_contacts():
+    """Put dead-lettered contact submissions back on the queue at CONTACT_QUEUE_PATH"""
+    contact_queue.open()
+    requeued = contact_queue.requeue_dead_letters()
+    typer.echo(f"Requeued {requeued} contact submissions")
+
+
+@cli.command("read-archive")
+def read_archive_command(
+    collection: str = typer.Argument(..., help=f"One of {', '.join(RETAINED_COLLECTIONS)}"),
+    start: Optional[datetime] = typer.Option(None, help="Only records at or after this UTC time"),
+    end: Optional[datetime] = typer.Option(None, help="Only records before this UTC time"),
+    portfolio: Optional[str] = typer.Option(None, help="Only records of this portfolio"),
+):
+    """Write archived records to stdout as NDJSON, oldest first"""
+    if collection not in RETAINED_COLLECTIONS:
+        raise typer.BadParameter(f"Unknown collection {collection!r}")
+    retention.configure_from_env()
+    for doc in read_archive(retention.archive_dir, collection, start, end, portfolio):
+        sys.stdout.buffer.write(encode_line(doc))
+
+
+@cli.command("import-portfolio")
+def import_portfolio(
+    slug: str = typer.Argument(..., help="Slug the portfolio is served under"),
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, help="Portfolio fixture, in the seed format"),
+):
+    """Create or replace the portfolio with this slug from a fixture file"""
+    try:
+        portfolio = load_seed(path, slug)
+    except ValueError as e:
+        # Covers pydantic validation errors as well as unsupported versions
+        raise typer.BadParameter(str(e))
+    if not run(lambda: database.upsert_portfolio_data(portfolio)):
+        typer.echo(f"Failed to store portfolio {slug!r}", err=True)
+        raise typer.Exit(1)
+    typer.echo(f"Imported portfolio {slug!r} from {path}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,366 @@
+from storage import StorageBackend, COUNT_ESTIMATE_CAP, bucket_start, day_start, summary_result
+from models import DEFAULT_PORTFOLIO, PortfolioData, ContactSubmission, ContactSubmissionSummary, PageView
+from metrics import timed_operation
+from sketches import TrafficSketch, referrer_host, sketch_page_views
+from collections import Counter
+from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+from typing import AsyncIterator, Dict, Optional, List, Tuple
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class MemoryStorage(StorageBackend):
+    """Process-local storage for tests, benchmarks and demos.
+
+    Nothing is persisted and nothing is shared between workers. Contact
+    submissions and page views are kept sorted by (timestamp, id), so keyset
+    pages and time windows are found by bisection like an index range scan.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.portfolios: Dict[str, dict] = {}
+        self.contacts: List[Tuple[Tuple[datetime, str], dict]] = []
+        self.contacts_by_id: Dict[str, dict] = {}
+        self.page_views: List[Tuple[Tuple[datetime, str], dict]] = []
+        self.page_view_daily: Counter = Counter()
+        self.contact_daily: Counter = Counter()
+        self.traffic_sketches: Dict[Tuple[str, datetime], TrafficSketch] = {}
+
+    async def connect(self):
+        """Nothing to connect to"""
+        logger.info("Using in-memory storage")
+
+    async def disconnect(self):
+        """Nothing to disconnect from"""
+
+    @timed_operation
+    async def ping(self) -> float:
+        return 0.0
+
+    # Portfolio Data Operations
+    @timed_operation
+    async def get_portfolio_data(self, slug: str = DEFAULT_PORTFOLIO) -> Optional[PortfolioData]:
+        """Get the portfolio with this slug"""
+        doc = self.portfolios.get(slug)
+        if doc is None:
+            return None
+        return PortfolioData(**doc)
+
+    @timed_operation
+    async def upsert_portfolio_data(self, portfolio: PortfolioData) -> bool:
+        """Insert or update the portfolio with ``portfolio.slug``"""
+        self.portfolios[portfolio.slug] = {**portfolio.model_dump(), "revision": uuid.uuid4().hex}
+        self._portfolio_changed(portfolio.slug)
+        logger.info(f"Portfolio data upserted successfully: {portfolio.slug}")
+        return True
+
+    async def get_portfolio_revisions(self, slugs: List[str]) -> Dict[str, Optional[str]]:
+        """Revision tokens of the given portfolios"""
+        return {slug: self.portfolios[slug]["revision"] for slug in slugs if slug in self.portfolios}
+
+    # Contact Submission Operations
+    @timed_operation
+    async def create_contact_submission(self, submission: ContactSubmission) -> bool:
+        """Create a new contact submission"""
+        doc = submission.model_dump()
+        if submission.id in self.contacts_by_id:
+            logger.info(f"Contact submission already stored: {submission.id}")
+            return True
+        self.contacts_by_id[submission.id] = doc
+        insort(self.contacts, ((submission.timestamp, submission.id), doc), key=lambda item: item[0])
+        self.contact_daily[(submission.portfolio, day_start(submission.timestamp))] += 1
+        logger.info(f"Contact submission created: {submission.id}")
+        return True
+
+    @staticmethod
+    def _matches(
+        doc: dict,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> bool:
+        if portfolio and doc.get("portfolio", DEFAULT_PORTFOLIO) != portfolio:
+            return False
+        if status and doc.get("status") != status:
+            return False
+        if start and doc["timestamp"] < start:
+            return False
+        if end and doc["timestamp"] >= end:
+            return False
+        if company and not (doc.get("company") or "").lower().startswith(company.lower()):
+            return False
+        return True
+
+    @timed_operation
+    async def get_contact_submissions(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple[datetime, str]] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        include_message: bool = False,
+        portfolio: Optional[str] = None
+    ) -> Tuple[List[ContactSubmissionSummary], bool]:
+        """Get one page of submissions, newest first, starting after a keyset position"""
+        position = len(self.contacts)
+        if after:
+            position = bisect_left(self.contacts, after, key=lambda item: item[0])
+        submissions = []
+        for index in range(position - 1, -1, -1):
+            doc = self.contacts[index][1]
+            if not self._matches(doc, status, start, end, company, portfolio):
+                continue
+            if len(submissions) > limit:
+                break
+            fields = doc if include_message else {k: v for k, v in doc.items() if k != "message"}
+            submissions.append(ContactSubmissionSummary.model_construct(**fields))
+        return submissions[:limit], len(submissions) > limit
+
+    @timed_operation
+    async def estimate_contact_submissions(
+        self,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> Tuple[Optional[int], bool]:
+        """Count matching submissions, stopping at COUNT_ESTIMATE_CAP"""
+        if not (status or start or end or company or portfolio):
+            return len(self.contacts), False
+        count = 0
+        for _, doc in self.contacts:
+            if self._matches(doc, status, start, end, company, portfolio):
+                count += 1
+                if count >= COUNT_ESTIMATE_CAP:
+                    return count, True
+        return count, False
+
+    @timed_operation
+    async def iter_contact_submissions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[str] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream submission documents oldest first"""
+        for _, doc in list(self.contacts):
+            if self._matches(doc, status, start, end, portfolio=portfolio):
+                yield dict(doc)
+
+    @staticmethod
+    def _delete_range(records: list, start: datetime, end: datetime, limit: int) -> list:
+        """Remove up to ``limit`` of the (key, doc) records timestamped in [start, end)"""
+        low = bisect_left(records, (start, ""), key=lambda item: item[0])
+        high = min(bisect_left(records, (end, ""), key=lambda item: item[0]), low + limit)
+        deleted = [doc for _, doc in records[low:high]]
+        del records[low:high]
+        return deleted
+
+    @staticmethod
+    def _count_range(records: list, start: datetime, end: datetime) -> int:
+        low = bisect_left(records, (start, ""), key=lambda item: item[0])
+        return bisect_left(records, (end, ""), key=lambda item: item[0]) - low
+
+    @timed_operation
+    async def count_contact_submissions(self, start: datetime, end: datetime) -> int:
+        return self._count_range(self.contacts, start, end)
+
+    @timed_operation
+    async def delete_contact_submissions(self, start: datetime, end: datetime, limit: int) -> int:
+        deleted = self._delete_range(self.contacts, start, end, limit)
+        for doc in deleted:
+            del self.contacts_by_id[doc["id"]]
+        return len(deleted)
+
+    @timed_operation
+    async def update_submission_status(self, submission_id: str, status: str) -> bool:
+        """Update contact submission status"""
+        doc = self.contacts_by_id.get(submission_id)
+        if doc is None or doc["status"] == status:
+            return False
+        doc["status"] = status
+        return True
+
+    @timed_operation
+    async def get_submission_statuses(self, submission_ids: List[str]) -> Dict[str, str]:
+        return {
+            submission_id: self.contacts_by_id[submission_id]["status"]
+            for submission_id in submission_ids if submission_id in self.contacts_by_id
+        }
+
+    @timed_operation
+    async def set_submission_statuses(self, changes: List[Tuple[str, str, str]]) -> int:
+        applied = 0
+        for submission_id, expected, status in changes:
+            doc = self.contacts_by_id.get(submission_id)
+            if doc is not None and doc["status"] == expected:
+                doc["status"] = status
+                applied += 1
+        return applied
+
+    @timed_operation
+    async def set_matching_submission_statuses(
+        self,
+        status: str,
+        from_statuses: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> int:
+        changed = 0
+        for _, doc in self.contacts:
+            if doc["status"] in from_statuses and self._matches(doc, None, start, end, company, portfolio):
+                doc["status"] = status
+                changed += 1
+        return changed
+
+    # Analytics Operations
+    @timed_operation
+    async def log_page_views(self, page_views: List[PageView]) -> bool:
+        """Log a batch of page views"""
+        for page_view in page_views:
+            insort(
+                self.page_views,
+                ((page_view.timestamp, page_view.id), page_view.model_dump()),
+                key=lambda item: item[0]
+            )
+            self.page_view_daily[(page_view.portfolio, day_start(page_view.timestamp), page_view.page)] += 1
+        return await self.merge_traffic_sketches(sketch_page_views(page_views))
+
+    @timed_operation
+    async def delete_page_views(self, start: datetime, end: datetime, limit: int) -> int:
+        return len(self._delete_range(self.page_views, start, end, limit))
+
+    @timed_operation
+    async def count_page_views(self, start: datetime, end: datetime) -> int:
+        return self._count_range(self.page_views, start, end)
+
+    async def load_traffic_sketches(self, since: datetime, portfolio: str) -> Dict[datetime, TrafficSketch]:
+        days = (day_start(datetime.utcnow()) - since).days + 1
+        keys = [(portfolio, since + timedelta(days=i)) for i in range(days)]
+        return {key[1]: self.traffic_sketches[key] for key in keys if key in self.traffic_sketches}
+
+    async def merge_traffic_sketches(self, sketches: Dict[Tuple[str, datetime], TrafficSketch]) -> bool:
+        for key, sketch in sketches.items():
+            stored = self.traffic_sketches.get(key)
+            self.traffic_sketches[key] = stored.merge(sketch) if stored else sketch
+        return True
+
+    async def clear_traffic_sketches(self):
+        self.traffic_sketches.clear()
+
+    def _page_views_since(self, cutoff: datetime, portfolio: Optional[str] = None):
+        position = bisect_left(self.page_views, (cutoff, ""), key=lambda item: item[0])
+        return (
+            doc for _, doc in self.page_views[position:]
+            if not portfolio or doc.get("portfolio", DEFAULT_PORTFOLIO) == portfolio
+        )
+
+    @timed_operation
+    async def iter_page_views(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream page view documents oldest first"""
+        for doc in list(self._page_views_since(start or datetime.min, portfolio)):
+            if end and doc["timestamp"] >= end:
+                break
+            yield dict(doc)
+
+    @timed_operation
+    async def backfill_rollups(self) -> dict:
+        """Rebuild the daily counters of the days that still have raw records"""
+        page_view_daily = Counter(
+            (doc["portfolio"], day_start(doc["timestamp"]), doc["page"]) for _, doc in self.page_views
+        )
+        contact_daily = Counter(
+            (doc["portfolio"], day_start(doc["timestamp"])) for _, doc in self.contacts
+        )
+        page_days = {(portfolio, day) for portfolio, day, _ in page_view_daily}
+        self.page_view_daily = Counter(
+            {key: n for key, n in self.page_view_daily.items() if key[:2] not in page_days}
+        ) + page_view_daily
+        self.contact_daily = Counter(
+            {key: n for key, n in self.contact_daily.items() if key not in contact_daily}
+        ) + contact_daily
+        return {"pageDays": len(self.page_view_daily), "contactDays": len(self.contact_daily)}
+
+    @timed_operation
+    async def get_analytics_summary(self, days: int = 30, portfolio: Optional[str] = None) -> dict:
+        """Get analytics summary for the last N days from the daily rollups"""
+        cutoff_day = day_start(datetime.utcnow() - timedelta(days=days))
+        pages = Counter()
+        for (slug, day, page), views in self.page_view_daily.items():
+            if day >= cutoff_day and (not portfolio or slug == portfolio):
+                pages[page] += views
+        contacts = sum(
+            n for (slug, day), n in self.contact_daily.items()
+            if day >= cutoff_day and (not portfolio or slug == portfolio)
+        )
+        return summary_result(
+            days,
+            sum(pages.values()),
+            contacts,
+            [{"page": page, "views": views} for page, views in pages.most_common(10)]
+        )
+
+    @timed_operation
+    async def page_view_window_stats(
+        self, windows: List[int], bucket: str, top: int, portfolio: Optional[str] = None
+    ) -> dict:
+        """Per-window stats and a time series in a single scan of the widest window"""
+        now = datetime.utcnow()
+        cutoffs = {days: now - timedelta(days=days) for days in windows}
+        totals = Counter()
+        pages = {days: Counter() for days in windows}
+        referrers = {days: Counter() for days in windows}
+        series = Counter()
+        for doc in self._page_views_since(min(cutoffs.values()), portfolio):
+            series[bucket_start(doc["timestamp"], bucket)] += 1
+            for days, cutoff in cutoffs.items():
+                if doc["timestamp"] >= cutoff:
+                    totals[days] += 1
+                    pages[days][doc["page"]] += 1
+                    host = referrer_host(doc.get("referrer"))
+                    if host:
+                        referrers[days][host] += 1
+        return {
+            "windows": {
+                days: {
+                    "totalViews": totals[days],
+                    "topPages": [{"page": p, "views": n} for p, n in pages[days].most_common(top)],
+                    "topReferrers": [
+                        {"referrer": r, "views": n} for r, n in referrers[days].most_common(top)
+                    ]
+                }
+                for days in windows
+            },
+            "series": [{"start": start, "views": n} for start, n in sorted(series.items())]
+        }
+
+    @timed_operation
+    async def contact_window_stats(self, windows: List[int], portfolio: Optional[str] = None) -> Dict[int, int]:
+        """Submission counts per window"""
+        now = datetime.utcnow()
+        return {
+            days: sum(
+                1 for _, doc in self.contacts
+                if doc["timestamp"] >= now - timedelta(days=days) and self._matches(doc, portfolio=portfolio)
+            )
+            for days in windows
+        }
@@ -0,0 +1,194 @@
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter, Gauge, Histogram
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) sized for an API whose fast paths are sub-millisecond
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+REQUEST_COUNT = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+DB_OPERATION_LATENCY = Histogram(
+    "db_operation_duration_seconds", "Database operation latency", ["operation", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total", "Requests rejected by a rate limiter", ["limiter"]
+)
+CACHE_BYTES = Gauge("cache_bytes", "Approximate size of a cache's resident entries", ["cache"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries resident in a cache", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries evicted to keep a cache within its budget", ["cache"])
+CACHE_COHERENCE_INVALIDATIONS = Counter(
+    "cache_coherence_invalidations_total", "Cache invalidations caused by other workers' writes", ["source"]
+)
+RETENTION_ARCHIVED_RECORDS = Counter(
+    "retention_archived_records_total", "Raw records moved from the database to archive segments", ["collection"]
+)
+PAGE_VIEWS_DROPPED = Counter(
+    "page_views_dropped_total", "Page views that were never stored", ["reason"]
+)
+PAGE_VIEW_ROLLUP_FAILURES = Counter(
+    "page_view_rollup_failures_total", "Stored page views whose daily counters or sketches failed to update"
+)
+STARTUP_PHASE_SECONDS = Gauge(
+    "startup_phase_seconds", "Duration of each application startup phase", ["phase"]
+)
+
+# Per-request accumulator of named durations, reported in the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_timing(name: str, seconds: float):
+    """Add a duration to the current request's Server-Timing breakdown"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def _observe_db(operation: str, outcome: str, seconds: float):
+    DB_OPERATION_LATENCY.labels(operation, outcome).observe(seconds)
+    record_timing("db", seconds)
+
+
+def timed_operation(func):
+    """Record a database method's latency under its own name.
+
+    Works for coroutines and for async generators, where the time spent
+    producing items (not the consumer's time between them) is measured.
+    """
+    operation = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def generator_wrapper(*args, **kwargs):
+            busy = 0.0
+            outcome = "ok"
+            iterator = func(*args, **kwargs).__aiter__()
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        busy += time.perf_counter() - started
+                        return
+                    busy += time.perf_counter() - started
+                    yield item
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                _observe_db(operation, outcome, busy)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            _observe_db(operation, outcome, time.perf_counter() - started)
+    return wrapper
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON response encoded with orjson, reporting its encoding time as Server-Timing 'serialize'.
+
+    Models are dumped by pydantic's own JSON encoder (for pages of models
+    it beats orjson over model_dump, which builds every dict first) and
+    dicts (including datetimes) by orjson, so handlers returning one of these directly skip
+    FastAPI's response_model validation and ``jsonable_encoder`` pass.
+    """
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        if isinstance(content, BaseModel):
+            body = content.model_dump_json().encode()
+        elif orjson is not None:
+            body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            body = super().render(content)
+        record_timing("serialize", time.perf_counter() - started)
+        return body
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request counts and latency.
+
+    Routes are labelled by their path template (``/api/portfolio``), never the
+    raw URL, so label cardinality stays bounded. Responses get a
+    Server-Timing header splitting the handler's time into db, serialize and
+    total app time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route_label(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None and hasattr(route, "path"):
+            return route.path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            self._route_paths = {
+                getattr(r, "endpoint", None): r.path for r in scope["app"].routes if hasattr(r, "path")
+            }
+        return self._route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = time.perf_counter() - started
+                parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+                parts.append(f"app;dur={total * 1000:.3f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(parts).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = self._route_label(scope)
+            REQUEST_COUNT.labels(scope["method"], route, str(status)).inc()
+            REQUEST_LATENCY.labels(scope["method"], route).observe(elapsed)
+            _request_timings.reset(token)
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from models import DEFAULT_PORTFOLIO
+
+logger = logging.getLogger(__name__)
+
+# Collection recording which schema versions have been applied
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+# Opt-in TTL indexes expiring raw records: (collection, days env var,
+# retention env var). Off by default: retention.py archives old records
+# before deleting them, which a TTL index would pre-empt.
+TTL_INDEXES = [
+    ("page_views", "PAGE_VIEW_TTL_DAYS", "PAGE_VIEW_RETENTION_DAYS"),
+    ("contact_submissions", "CONTACT_TTL_DAYS", "CONTACT_RETENTION_DAYS"),
+]
+TTL_INDEX_NAME = "ttl"
+
+
+class Migration:
+    """A numbered, idempotent change to the database schema"""
+
+    def __init__(self, version: int, description: str, apply: Callable[..., Awaitable[None]]):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+async def _create_core_indexes(db):
+    await db.contact_submissions.create_indexes([
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("timestamp", DESCENDING)], name="timestamp_desc"),
+        IndexModel([("status", ASCENDING), ("timestamp", DESCENDING)], name="status_timestamp"),
+    ])
+    await db.page_views.create_indexes([
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+        IndexModel([("page", ASCENDING), ("timestamp", DESCENDING)], name="page_timestamp"),
+    ])
+    # Rollup upserts rely on these keys being unique
+    await db.page_view_daily.create_index(
+        [("day", ASCENDING), ("page", ASCENDING)], unique=True, name="day_page_unique"
+    )
+    await db.contact_daily.create_index([("day", ASCENDING)], unique=True, name="day_unique")
+
+
+async def _backfill_rollups(db):
+    # Imported lazily, as mongo_storage runs these migrations. Page views
+    # were only stored one per document when this migration was written.
+    from mongo_storage import backfill_rollups
+    await backfill_rollups(db)
+
+
+async def _create_keyset_indexes(db):
+    # Keyset pagination sorts on (timestamp, id); these supersede the
+    # single-field indexes from migration 1
+    await db.contact_submissions.create_indexes([
+        IndexModel([("timestamp", DESCENDING), ("id", DESCENDING)], name="timestamp_id"),
+        IndexModel(
+            [("status", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+            name="status_timestamp_id"
+        ),
+    ])
+    for name in ("timestamp_desc", "status_timestamp"):
+        if name in await db.contact_submissions.index_information():
+            await db.contact_submissions.drop_index(name)
+
+
+async def _scope_by_portfolio(db):
+    # Everything written before portfolios had slugs belongs to the default one
+    await db.portfolio_data.update_many({"slug": {"$exists": False}}, {"$set": {"slug": DEFAULT_PORTFOLIO}})
+    await db.portfolio_data.create_index([("slug", ASCENDING)], unique=True, name="slug_unique")
+    for collection in ("contact_submissions", "page_views", "page_view_daily", "contact_daily"):
+        await db[collection].update_many(
+            {"portfolio": {"$exists": False}}, {"$set": {"portfolio": DEFAULT_PORTFOLIO}}
+        )
+    await db.contact_submissions.create_index(
+        [("portfolio", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="portfolio_timestamp_id"
+    )
+    await db.page_views.create_index([("portfolio", ASCENDING), ("timestamp", ASCENDING)], name="portfolio_timestamp")
+    # Rollups are now kept per portfolio; create the new unique keys before
+    # dropping the old ones so upserts are never left without one
+    await db.page_view_daily.create_index(
+        [("portfolio", ASCENDING), ("day", ASCENDING), ("page", ASCENDING)],
+        unique=True, name="portfolio_day_page_unique"
+    )
+    await db.contact_daily.create_index(
+        [("portfolio", ASCENDING), ("day", ASCENDING)], unique=True, name="portfolio_day_unique"
+    )
+    for collection, name in (("page_view_daily", "day_page_unique"), ("contact_daily", "day_unique")):
+        if name in await db[collection].index_information():
+            await db[collection].drop_index(name)
+
+
+async def _index_traffic_sketches(db):
+    # Sketch merges insert the first document of a day and rely on this to
+    # detect a concurrent insert from another worker
+    await db.page_view_sketches.create_index(
+        [("portfolio", ASCENDING), ("day", ASCENDING)], unique=True, name="portfolio_day_unique"
+    )
+
+
+async def _index_page_view_buckets(db):
+    # Ingest finds the open bucket of a page and hour; reads scan hours
+    await db.page_view_buckets.create_indexes([
+        IndexModel([("portfolio", ASCENDING), ("page", ASCENDING), ("hour", ASCENDING)], name="portfolio_page_hour"),
+        IndexModel([("hour", ASCENDING)], name="hour"),
+        IndexModel([("portfolio", ASCENDING), ("hour", ASCENDING)], name="portfolio_hour"),
+    ])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create core indexes", _create_core_indexes),
+    Migration(2, "Backfill daily analytics rollups", _backfill_rollups),
+    Migration(3, "Index contact submissions for keyset pagination", _create_keyset_indexes),
+    Migration(4, "Scope portfolios, contacts and page views by portfolio slug", _scope_by_portfolio),
+    Migration(5, "Index daily traffic sketches", _index_traffic_sketches),
+    Migration(6, "Index hourly page view buckets", _index_page_view_buckets),
+]
+
+
+async def run_migrations(db, migrations: List[Migration] = MIGRATIONS):
+    """Apply every migration not yet recorded in the metadata collection.
+
+    Safe to call from several workers at once: each version is claimed by
+    inserting its metadata document, so exactly one worker applies it while
+    the others wait for it to be marked applied. A claim carries a lease;
+    if its owner dies, the claim expires (and is removed by a TTL index) so
+    another worker can take over.
+    """
+    lease = timedelta(seconds=int(os.environ.get("MIGRATION_LEASE_SECONDS", 600)))
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    meta = db[MIGRATIONS_COLLECTION]
+    await meta.create_index("expiresAt", expireAfterSeconds=0, name="claim_ttl")
+
+    applied = {doc["_id"] async for doc in meta.find({"status": "applied"}, {"_id": 1})}
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+        while not await _claim(meta, migration, owner, lease):
+            doc = await meta.find_one({"_id": migration.version}, {"status": 1})
+            if doc and doc.get("status") == "applied":
+                break
+            logger.info(f"Waiting for another worker to apply migration {migration.version}")
+            await asyncio.sleep(1)
+        else:
+            await _apply(db, meta, migration, owner)
+    logger.info(f"Schema is at version {max((m.version for m in migrations), default=0)}")
+
+
+async def _apply(db, meta, migration: Migration, owner: str):
+    logger.info(f"Applying migration {migration.version}: {migration.description}")
+    try:
+        await migration.apply(db)
+    except Exception:
+        # Release the claim so another worker or the next start can retry
+        await meta.delete_one({"_id": migration.version, "owner": owner})
+        raise
+    await meta.update_one(
+        {"_id": migration.version, "owner": owner},
+        {"$set": {"status": "applied", "appliedAt": datetime.utcnow()}, "$unset": {"expiresAt": ""}}
+    )
+    logger.info(f"Migration {migration.version} applied")
+
+
+async def _claim(meta, migration: Migration, owner: str, lease: timedelta) -> bool:
+    """Try to become the worker that applies ``migration``"""
+    now = datetime.utcnow()
+    try:
+        await meta.insert_one({
+            "_id": migration.version,
+            "description": migration.description,
+            "status": "running",
+            "owner": owner,
+            "startedAt": now,
+            "expiresAt": now + lease,
+        })
+        return True
+    except DuplicateKeyError:
+        pass
+    # Take over a claim whose owner let its lease run out
+    stale = await meta.find_one_and_update(
+        {"_id": migration.version, "status": "running", "expiresAt": {"$lt": now}},
+        {"$set": {"owner": owner, "startedAt": now, "expiresAt": now + lease}}
+    )
+    return stale is not None
+
+
+async def sync_ttl_indexes(db, page_view_layout: str = "documents"):
+    """Create, change or drop the TTL indexes to match their env vars.
+
+    Runs on every start rather than as a migration, since the expiry is
+    configuration. The index is descending so it doesn't clash with the
+    ascending date indexes the queries use.
+    """
+    for collection, days_var, retention_var in TTL_INDEXES:
+        field = "timestamp"
+        if collection == "page_views" and page_view_layout == "buckets":
+            # A bucket expires as a whole, after the hour it holds
+            collection, field = "page_view_buckets", "hour"
+        days = int(os.environ.get(days_var) or 0)
+        seconds: Optional[int] = days * 86400 if days > 0 else None
+        current = (await db[collection].index_information()).get(TTL_INDEX_NAME, {}).get("expireAfterSeconds")
+        if seconds == current:
+            continue
+        if seconds is None:
+            await db[collection].drop_index(TTL_INDEX_NAME)
+            logger.info(f"Dropped the TTL index on {collection}")
+            continue
+        retention_days = int(os.environ.get(retention_var) or 0)
+        if retention_days and days <= retention_days:
+            logger.warning(
+                f"{days_var}={days} expires {collection} before retention archives them "
+                f"after {retention_days} days; they will be deleted without an archive"
+            )
+        if current is None:
+            await db[collection].create_index([(field, DESCENDING)], expireAfterSeconds=seconds, name=TTL_INDEX_NAME)
+        else:
+            await db.command("collMod", collection, index={"name": TTL_INDEX_NAME, "expireAfterSeconds": seconds})
+        logger.info(f"{collection} expire {days} days after their {field}")
@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Dict, Optional, Any
+from pydantic import AfterValidator, BaseModel, Field, EmailStr, field_validator, model_validator
+from typing import Annotated, List, Dict, Optional, Any
 from datetime import datetime
 import uuid
 
+# Portfolios are keyed by slug; data from before multi-tenancy belongs to this one
+DEFAULT_PORTFOLIO = "default"
+SLUG_PATTERN = r"^[a-z0-9](?:[a-z0-9-]{0,62}[a-z0-9])?$"
+
 # Portfolio Data Models
 class PersonalInfo(BaseModel):
     name: str
@@ -52,6 +56,7 @@ class Achievement(BaseModel):
 
 class PortfolioData(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    slug: str = Field(DEFAULT_PORTFOLIO, pattern=SLUG_PATTERN)
     personal: PersonalInfo
     about: AboutInfo
     skills: SkillsInfo
@@ -60,10 +65,79 @@ class PortfolioData(BaseModel):
     certifications: List[str]
     achievements: List[Achievement]
     lastUpdated: datetime = Field(default_factory=datetime.utcnow)
+    # Token of the stored write this copy was read from; never serialized
+    revision: Optional[str] = Field(None, exclude=True)
+
+    @field_validator("slug")
+    @classmethod
+    def slug_not_reserved(cls, slug: str) -> str:
+        # /api/portfolio/{name} serves sections of the default portfolio too
+        if slug in PORTFOLIO_SECTIONS:
+            raise ValueError(f"'{slug}' is reserved")
+        return slug
+
+# Top-level parts of the portfolio that can be fetched on their own
+PORTFOLIO_SECTIONS = ("personal", "about", "skills", "experience", "projects", "certifications", "achievements")
+
+# Display names of the SkillsInfo groups
+SKILL_GROUPS = {
+    "productManagement": "Product Management",
+    "programDelivery": "Program Delivery",
+    "dataAndAI": "Data & AI",
+    "leadership": "Leadership",
+    "technical": "Technical",
+}
+
+# Search Models
+class SearchHit(BaseModel):
+    id: str
+    section: str
+    title: str
+    snippet: str
+    score: float
+
+class SearchResults(BaseModel):
+    query: str
+    hits: List[SearchHit]
+    total: int
+
+class SearchSuggestion(BaseModel):
+    term: str
+    documents: int
+
+class SearchSuggestions(BaseModel):
+    prefix: str
+    suggestions: List[SearchSuggestion]
 
 # Contact Form Models
+
+# Triage states of a contact submission, each with the states it may move on to
+SUBMISSION_TRANSITIONS: Dict[str, tuple] = {
+    "new": ("read", "replied", "archived", "spam"),
+    "read": ("new", "replied", "archived", "spam"),
+    "replied": ("archived",),
+    "archived": ("read",),
+    "spam": ("new",),
+}
+SUBMISSION_STATUSES = tuple(SUBMISSION_TRANSITIONS)
+
+# Largest number of (id, status) pairs one bulk status request may carry
+MAX_BULK_STATUS_UPDATES = 1000
+
+def statuses_leading_to(status: str) -> List[str]:
+    """The statuses a submission may be in to be moved to ``status``"""
+    return [source for source, targets in SUBMISSION_TRANSITIONS.items() if status in targets]
+
+def check_status(status: str) -> str:
+    if status not in SUBMISSION_TRANSITIONS:
+        raise ValueError(f"Unknown status '{status}'; expected one of {', '.join(SUBMISSION_STATUSES)}")
+    return status
+
+SubmissionStatus = Annotated[str, AfterValidator(check_status)]
+
 class ContactSubmission(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    portfolio: str = DEFAULT_PORTFOLIO
     name: str = Field(..., min_length=1, max_length=100)
     email: EmailStr
     company: Optional[str] = Field(None, max_length=100)
@@ -74,7 +148,81 @@ class ContactSubmission(BaseModel):
     ipAddress: Optional[str] = None
     userAgent: Optional[str] = None
 
+class ContactSubmissionSummary(BaseModel):
+    """List view of a submission; the message body is only included on request"""
+    id: str
+    portfolio: str = DEFAULT_PORTFOLIO
+    name: str
+    email: EmailStr
+    company: Optional[str] = None
+    message: Optional[str] = None
+    timestamp: datetime
+    source: str
+    status: str
+    ipAddress: Optional[str] = None
+    userAgent: Optional[str] = None
+
+class ContactSubmissionPage(BaseModel):
+    submissions: List[ContactSubmissionSummary]
+    count: int
+    nextCursor: Optional[str] = None
+    totalEstimate: Optional[int] = None
+    totalIsLowerBound: bool = False
+
+class SubmissionStatusChange(BaseModel):
+    id: str
+    status: SubmissionStatus
+
+class SubmissionFilter(BaseModel):
+    """Selects submissions like the filters of the submissions list.
+
+    An empty filter would match every submission, so that has to be asked
+    for explicitly with ``all``.
+    """
+    status: Optional[SubmissionStatus] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    company: Optional[str] = None
+    portfolio: Optional[str] = None
+    all: bool = False
+
+    @model_validator(mode="after")
+    def criteria_or_all(self) -> "SubmissionFilter":
+        if not self.all and not self.model_dump(exclude={"all"}, exclude_none=True):
+            raise ValueError("Give at least one filter criterion, or all: true to match every submission")
+        return self
+
+class BulkStatusUpdate(BaseModel):
+    """Either ``updates`` (one status per id), or a ``filter`` and the ``status`` to give every match"""
+    updates: List[SubmissionStatusChange] = Field(default_factory=list, max_length=MAX_BULK_STATUS_UPDATES)
+    filter: Optional[SubmissionFilter] = None
+    status: Optional[SubmissionStatus] = None
+
+    @model_validator(mode="after")
+    def one_kind_of_update(self) -> "BulkStatusUpdate":
+        if self.updates and (self.filter or self.status):
+            raise ValueError("Give either updates or a filter with a status, not both")
+        if not self.updates and not (self.filter and self.status):
+            raise ValueError("Give updates, or a filter with a status")
+        ids = [change.id for change in self.updates]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Each submission id may only appear once")
+        return self
+
+class SubmissionStatusResult(BaseModel):
+    id: str
+    status: str
+    # updated, unchanged (already in that status), not_found,
+    # invalid_transition or conflict (changed by someone else meanwhile)
+    outcome: str
+    previousStatus: Optional[str] = None
+
+class BulkStatusUpdateResult(BaseModel):
+    updated: int
+    results: List[SubmissionStatusResult] = Field(default_factory=list)
+
 class ContactSubmissionCreate(BaseModel):
+    portfolio: str = Field(DEFAULT_PORTFOLIO, pattern=SLUG_PATTERN)
     name: str = Field(..., min_length=1, max_length=100)
     email: EmailStr
     company: Optional[str] = Field(None, max_length=100)
@@ -88,6 +236,7 @@ class ContactResponse(BaseModel):
 # Analytics Models (Optional)
 class PageView(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    portfolio: str = DEFAULT_PORTFOLIO
     page: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     ipAddress: Optional[str] = None
@@ -95,5 +244,6 @@ class PageView(BaseModel):
     referrer: Optional[str] = None
 
 class PageViewCreate(BaseModel):
+    portfolio: str = Field(DEFAULT_PORTFOLIO, pattern=SLUG_PATTERN)
     page: str
     referrer: Optional[str] = None
\ No newline at end of file
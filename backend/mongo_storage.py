@@ -0,0 +1,946 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from models import DEFAULT_PORTFOLIO, PortfolioData, ContactSubmission, ContactSubmissionSummary, PageView
+from storage import StorageBackend, COUNT_ESTIMATE_CAP, bucket_start, day_start, summary_result
+from migrations import run_migrations, sync_ttl_indexes
+from metrics import PAGE_VIEW_ROLLUP_FAILURES, timed_operation
+from sketches import TrafficSketch, sketch_page_views
+from collections import Counter
+from datetime import datetime, timedelta
+import asyncio
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional, List, Tuple
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def day_of(field: str) -> dict:
+    """Expression for the UTC day of a date field"""
+    return {
+        "$dateFromParts": {
+            "year": {"$year": field},
+            "month": {"$month": field},
+            "day": {"$dayOfMonth": field}
+        }
+    }
+
+
+# Groups raw documents by the UTC day of their timestamp
+DAY_OF_TIMESTAMP = day_of("$timestamp")
+
+# How page views are stored (PAGE_VIEW_STORAGE): one document per view in
+# page_views, or packed into page_view_buckets, one document per portfolio,
+# page and hour holding up to PAGE_VIEW_BUCKET_SIZE views
+PAGE_VIEW_LAYOUTS = ("documents", "buckets")
+
+# Fields of a view inside a bucket, by the name they have in page_views;
+# kept to one letter as they repeat in every view
+BUCKETED_FIELDS = {"timestamp": "t", "ipAddress": "i", "userAgent": "u", "referrer": "r"}
+
+# Records from before multi-tenancy belong to the default portfolio
+PORTFOLIO_OF_DOCUMENT = {"$ifNull": ["$portfolio", DEFAULT_PORTFOLIO]}
+
+# Host of a referrer URL, lowercased, or the referrer itself if it has
+# none; the same as sketches.referrer_host
+REFERRER_HOST = {
+    "$let": {
+        "vars": {"match": {"$regexFind": {"input": "$referrer", "regex": r"^(?:[A-Za-z][A-Za-z0-9+.-]*:)?//([^/?#]+)"}}},
+        "in": {"$cond": [
+            {"$eq": ["$$match", None]},
+            "$referrer",
+            {"$toLower": {"$arrayElemAt": ["$$match.captures", 0]}}
+        ]}
+    }
+}
+
+# Optimistic sketch updates give up after this many conflicting writes
+SKETCH_WRITE_ATTEMPTS = 10
+
+# Server error codes meaning change streams can't be opened at all
+# (40573: not a replica set or sharded cluster; 136: collection-less storage engine)
+CHANGE_STREAMS_UNSUPPORTED = {40573, 136}
+
+# Client options tunable from the environment, as (env var, pymongo option)
+POOL_OPTIONS = [
+    ("MONGO_MAX_POOL_SIZE", "maxPoolSize"),
+    ("MONGO_MIN_POOL_SIZE", "minPoolSize"),
+    ("MONGO_MAX_IDLE_TIME_MS", "maxIdleTimeMS"),
+    ("MONGO_SERVER_SELECTION_TIMEOUT_MS", "serverSelectionTimeoutMS"),
+    ("MONGO_CONNECT_TIMEOUT_MS", "connectTimeoutMS"),
+    ("MONGO_SOCKET_TIMEOUT_MS", "socketTimeoutMS"),
+    ("MONGO_WAIT_QUEUE_TIMEOUT_MS", "waitQueueTimeoutMS"),
+]
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so readiness can report pool health"""
+    
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkout_failures = 0
+    
+    def snapshot(self) -> dict:
+        return {
+            "open": self.open,
+            "checkedOut": self.checked_out,
+            "idle": max(self.open - self.checked_out, 0),
+            "created": self.created,
+            "closed": self.closed,
+            "checkoutFailures": self.checkout_failures
+        }
+    
+    def connection_created(self, event):
+        self.open += 1
+        self.created += 1
+    
+    def connection_closed(self, event):
+        self.open -= 1
+        self.closed += 1
+    
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+    
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+    
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+
+
+async def backfill_rollups(db, page_view_layout: str = "documents") -> dict:
+    """Rebuild the daily counters of ``db`` from its raw page views and
+    contact submissions; see MongoStorage.backfill_rollups"""
+    page_pipeline = [
+        {"$group": {
+            "_id": {"portfolio": PORTFOLIO_OF_DOCUMENT, "day": DAY_OF_TIMESTAMP, "page": "$page"},
+            "views": {"$sum": 1}
+        }}
+    ]
+    page_views = db.page_views
+    if page_view_layout == "buckets":
+        page_views = db.page_view_buckets
+        page_pipeline = [
+            {"$group": {
+                "_id": {"portfolio": "$portfolio", "day": day_of("$hour"), "page": "$page"},
+                "views": {"$sum": "$count"}
+            }}
+        ]
+    page_ops = []
+    async for doc in page_views.aggregate(page_pipeline):
+        key = doc["_id"]
+        page_ops.append(UpdateOne(key, {"$set": {"views": doc["views"]}}, upsert=True))
+    
+    contact_pipeline = [
+        {"$group": {
+            "_id": {"portfolio": PORTFOLIO_OF_DOCUMENT, "day": DAY_OF_TIMESTAMP},
+            "contacts": {"$sum": 1}
+        }}
+    ]
+    contact_ops = []
+    # Everything is counted from here on; a redelivery mustn't add it again
+    await db.contact_submissions.update_many({"counted": False}, {"$set": {"counted": True}})
+    async for doc in db.contact_submissions.aggregate(contact_pipeline):
+        contact_ops.append(
+            UpdateOne(doc["_id"], {"$set": {"contacts": doc["contacts"]}}, upsert=True)
+        )
+    
+    if page_ops:
+        await db.page_view_daily.bulk_write(page_ops, ordered=False)
+    if contact_ops:
+        await db.contact_daily.bulk_write(contact_ops, ordered=False)
+    logger.info(f"Rollups backfilled: {len(page_ops)} page-days, {len(contact_ops)} contact-days")
+    return {"pageDays": len(page_ops), "contactDays": len(contact_ops)}
+
+
+class MongoStorage(StorageBackend):
+    """MongoDB storage through Motor"""
+    
+    name = "mongo"
+    
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.pool_stats = PoolStats()
+        self.page_view_layout = "documents"
+        self.bucket_size = 200
+    
+    async def connect(self):
+        """Connect to MongoDB database"""
+        try:
+            mongo_url = os.environ['MONGO_URL']
+            options = {"serverSelectionTimeoutMS": 5000}
+            for env_var, option in POOL_OPTIONS:
+                if os.environ.get(env_var):
+                    options[option] = int(os.environ[env_var])
+            self.client = AsyncIOMotorClient(
+                mongo_url, event_listeners=[self.pool_stats], **options
+            )
+            self.db = self.client[os.environ['DB_NAME']]
+            self.page_view_layout = os.environ.get("PAGE_VIEW_STORAGE", self.page_view_layout).lower()
+            if self.page_view_layout not in PAGE_VIEW_LAYOUTS:
+                raise ValueError(f"PAGE_VIEW_STORAGE must be one of {', '.join(PAGE_VIEW_LAYOUTS)}")
+            self.bucket_size = int(os.environ.get("PAGE_VIEW_BUCKET_SIZE", self.bucket_size))
+            logger.info(f"Successfully connected to MongoDB ({options}, {self.page_view_layout} page views)")
+        except Exception as e:
+            logger.error(f"Failed to connect to MongoDB: {e}")
+            raise
+    
+    async def warm_up(self):
+        """Open pool connections ahead of traffic so the first requests don't pay for them"""
+        connections = int(os.environ.get(
+            "MONGO_WARMUP_CONNECTIONS", os.environ.get("MONGO_MIN_POOL_SIZE") or 4
+        ))
+        started = time.perf_counter()
+        # Concurrent pings each need their own socket, filling the pool
+        await asyncio.gather(*(self.ping() for _ in range(max(connections, 1))))
+        elapsed = (time.perf_counter() - started) * 1000
+        logger.info(f"Warmed up {self.pool_stats.open} MongoDB connections in {elapsed:.1f}ms")
+    
+    @timed_operation
+    async def ping(self) -> float:
+        """Round-trip a ping to the server; returns latency in milliseconds"""
+        started = time.perf_counter()
+        await self.client.admin.command("ping")
+        return (time.perf_counter() - started) * 1000
+    
+    def pool_snapshot(self) -> dict:
+        return self.pool_stats.snapshot()
+    
+    async def migrate(self):
+        """Bring indexes and schema up to date"""
+        await run_migrations(self.db)
+        await sync_ttl_indexes(self.db, self.page_view_layout)
+    
+    async def disconnect(self):
+        """Disconnect from MongoDB database"""
+        if self.client:
+            self.client.close()
+            logger.info("Disconnected from MongoDB")
+    
+    # Portfolio Data Operations
+    @timed_operation
+    async def get_portfolio_data(self, slug: str = DEFAULT_PORTFOLIO) -> Optional[PortfolioData]:
+        """Get the portfolio with this slug"""
+        try:
+            portfolio_doc = await self.db.portfolio_data.find_one({"slug": slug})
+            if portfolio_doc:
+                # Remove MongoDB's _id field and return the data
+                portfolio_doc.pop('_id', None)
+                return PortfolioData(**portfolio_doc)
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching portfolio data: {e}")
+            return None
+    
+    @timed_operation
+    async def upsert_portfolio_data(self, portfolio: PortfolioData) -> bool:
+        """Insert or update the portfolio with ``portfolio.slug``"""
+        try:
+            portfolio_dict = {**portfolio.model_dump(), "revision": uuid.uuid4().hex}
+            result = await self.db.portfolio_data.replace_one(
+                {"slug": portfolio.slug},
+                portfolio_dict,
+                upsert=True
+            )
+            self._portfolio_changed(portfolio.slug)
+            logger.info(f"Portfolio data upserted successfully: {portfolio.slug} ({result.upserted_id or 'updated'})")
+            return True
+        except Exception as e:
+            logger.error(f"Error upserting portfolio data: {e}")
+            return False
+    
+    @timed_operation
+    async def get_portfolio_revisions(self, slugs: List[str]) -> Dict[str, Optional[str]]:
+        """Revision tokens of several portfolios, read through the slug index"""
+        try:
+            cursor = self.db.portfolio_data.find(
+                {"slug": {"$in": slugs}}, {"_id": 0, "slug": 1, "revision": 1}
+            )
+            return {doc["slug"]: doc.get("revision") async for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error fetching portfolio revisions: {e}")
+            return {}
+    
+    async def watch_portfolio(self) -> AsyncIterator[Optional[Tuple[str, Optional[str]]]]:
+        """Follow portfolio writes through a change stream (replica sets only)"""
+        pipeline = [{"$project": {"operationType": 1, "fullDocument.slug": 1, "fullDocument.revision": 1}}]
+        try:
+            # updateLookup attaches the document to in-place updates as well
+            async with self.db.portfolio_data.watch(pipeline, full_document="updateLookup") as stream:
+                # try_next opens the stream without waiting
+                await stream.try_next()
+                yield None
+                async for change in stream:
+                    document = change.get("fullDocument") or {}
+                    yield (document["slug"], document.get("revision")) if "slug" in document else None
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                raise NotImplementedError(f"change streams unavailable: {e}") from e
+            raise
+    
+    # Contact Submission Operations
+    @timed_operation
+    async def create_contact_submission(self, submission: ContactSubmission) -> bool:
+        """Create a new contact submission"""
+        try:
+            # Stored as not yet counted in the daily rollup, so a redelivery
+            # after a failed increment still counts it, and only once
+            submission_dict = {**submission.model_dump(), "counted": False}
+            try:
+                await self.db.contact_submissions.insert_one(submission_dict)
+                logger.info(f"Contact submission created: {submission.id}")
+            except DuplicateKeyError:
+                # Redelivered from the contact queue
+                logger.info(f"Contact submission already stored: {submission.id}")
+            await self._count_contact(submission)
+            return True
+        except Exception as e:
+            logger.error(f"Error creating contact submission: {e}")
+            return False
+
+    async def _count_contact(self, submission: ContactSubmission):
+        """Add a stored submission to the daily rollup unless that was done already"""
+        claimed = await self.db.contact_submissions.update_one(
+            {"id": submission.id, "counted": False}, {"$set": {"counted": True}}
+        )
+        if not claimed.modified_count:
+            return
+        try:
+            await self.db.contact_daily.update_one(
+                {"portfolio": submission.portfolio, "day": day_start(submission.timestamp)},
+                {"$inc": {"contacts": 1}},
+                upsert=True
+            )
+        except Exception:
+            # Leave it for the redelivery to count
+            await self.db.contact_submissions.update_one({"id": submission.id}, {"$set": {"counted": False}})
+            raise
+    
+    @staticmethod
+    def _time_range_filter(
+        start: Optional[datetime] = None, end: Optional[datetime] = None, portfolio: Optional[str] = None
+    ) -> dict:
+        query = {"portfolio": portfolio} if portfolio else {}
+        if start or end:
+            query["timestamp"] = {}
+            if start:
+                query["timestamp"]["$gte"] = start
+            if end:
+                query["timestamp"]["$lt"] = end
+        return query
+    
+    @classmethod
+    def _submission_filter(
+        cls,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> dict:
+        query = cls._time_range_filter(start, end, portfolio)
+        if status:
+            query["status"] = status
+        if company:
+            query["company"] = {"$regex": f"^{re.escape(company)}", "$options": "i"}
+        return query
+    
+    @timed_operation
+    async def get_contact_submissions(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple[datetime, str]] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        include_message: bool = False,
+        portfolio: Optional[str] = None
+    ) -> Tuple[List[ContactSubmissionSummary], bool]:
+        """Get one page of submissions, newest first, starting after a keyset position.
+
+        Returns the page and whether more submissions follow it.
+        """
+        try:
+            query = self._submission_filter(status, start, end, company, portfolio)
+            if after:
+                after_timestamp, after_id = after
+                # Seek past the last row of the previous page using the (timestamp, id) index
+                query = {"$and": [query, {"$or": [
+                    {"timestamp": {"$lt": after_timestamp}},
+                    {"timestamp": after_timestamp, "id": {"$lt": after_id}}
+                ]}]}
+            projection = {"_id": 0, "counted": 0}
+            if not include_message:
+                projection["message"] = 0
+            cursor = (
+                self.db.contact_submissions.find(query, projection)
+                .sort([("timestamp", -1), ("id", -1)])
+                .limit(limit + 1)
+            )
+            # Documents were validated when written; skip validating them again
+            submissions = [ContactSubmissionSummary.model_construct(**doc) async for doc in cursor]
+            return submissions[:limit], len(submissions) > limit
+        except Exception as e:
+            logger.error(f"Error fetching contact submissions: {e}")
+            return [], False
+    
+    @timed_operation
+    async def estimate_contact_submissions(
+        self,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> Tuple[Optional[int], bool]:
+        """Estimate how many submissions match without a full count.
+
+        Unfiltered totals come from collection metadata. Filtered counts stop
+        at COUNT_ESTIMATE_CAP; the flag says the total is a lower bound.
+        """
+        try:
+            query = self._submission_filter(status, start, end, company, portfolio)
+            if not query:
+                return await self.db.contact_submissions.estimated_document_count(), False
+            count = await self.db.contact_submissions.count_documents(query, limit=COUNT_ESTIMATE_CAP)
+            return count, count >= COUNT_ESTIMATE_CAP
+        except Exception as e:
+            logger.error(f"Error estimating contact submissions: {e}")
+            return None, False
+    
+    @timed_operation
+    async def iter_contact_submissions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[str] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream raw submission documents oldest first, batch_size at a time"""
+        query = self._submission_filter(status, start, end, portfolio=portfolio)
+        cursor = (
+            self.db.contact_submissions.find(query, {"_id": 0, "counted": 0})
+            .sort("timestamp", 1)
+            .batch_size(batch_size)
+        )
+        async for doc in cursor:
+            yield doc
+    
+    @staticmethod
+    async def _delete_range(collection, query: dict, limit: int) -> int:
+        """Delete up to ``limit`` documents matching ``query``, by _id so the batch stays bounded"""
+        ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(limit)]
+        if not ids:
+            return 0
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        return result.deleted_count
+    
+    @timed_operation
+    async def count_contact_submissions(self, start: datetime, end: datetime) -> int:
+        return await self.db.contact_submissions.count_documents(self._time_range_filter(start, end))
+    
+    @timed_operation
+    async def delete_contact_submissions(self, start: datetime, end: datetime, limit: int) -> int:
+        return await self._delete_range(self.db.contact_submissions, self._time_range_filter(start, end), limit)
+    
+    @timed_operation
+    async def update_submission_status(self, submission_id: str, status: str) -> bool:
+        """Update contact submission status"""
+        try:
+            result = await self.db.contact_submissions.update_one(
+                {"id": submission_id},
+                {"$set": {"status": status}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error updating submission status: {e}")
+            return False
+    
+    @timed_operation
+    async def get_submission_statuses(self, submission_ids: List[str]) -> Dict[str, str]:
+        cursor = self.db.contact_submissions.find({"id": {"$in": submission_ids}}, {"_id": 0, "id": 1, "status": 1})
+        return {doc["id"]: doc["status"] async for doc in cursor}
+    
+    @timed_operation
+    async def set_submission_statuses(self, changes: List[Tuple[str, str, str]]) -> int:
+        if not changes:
+            return 0
+        result = await self.db.contact_submissions.bulk_write(
+            [
+                UpdateOne({"id": submission_id, "status": expected}, {"$set": {"status": status}})
+                for submission_id, expected, status in changes
+            ],
+            ordered=False
+        )
+        return result.modified_count
+    
+    @timed_operation
+    async def set_matching_submission_statuses(
+        self,
+        status: str,
+        from_statuses: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> int:
+        query = self._submission_filter(start=start, end=end, company=company, portfolio=portfolio)
+        query["status"] = {"$in": from_statuses}
+        result = await self.db.contact_submissions.update_many(query, {"$set": {"status": status}})
+        return result.modified_count
+    
+    # Analytics Operations
+    @timed_operation
+    async def log_page_views(self, page_views: List[PageView]) -> bool:
+        """Log a batch of page views with a single unordered bulk write.
+
+        Returns False only if the views weren't stored, so a caller can
+        retry the batch. Once they are, a failure to update the daily
+        counters or sketches is logged and counted instead: retrying would
+        store the views again, and backfill-rollups and backfill-sketches
+        rebuild both from the raw views.
+        """
+        try:
+            if self.page_view_layout == "buckets":
+                await self._push_to_buckets(page_views)
+            else:
+                await self._insert_page_views(page_views)
+        except Exception as e:
+            logger.error(f"Error logging {len(page_views)} page views: {e}")
+            return False
+        try:
+            await self._increment_page_view_rollups(page_views)
+            await self._merge_sketches(sketch_page_views(page_views))
+        except Exception as e:
+            PAGE_VIEW_ROLLUP_FAILURES.inc(len(page_views))
+            logger.error(
+                f"Stored {len(page_views)} page views but failed to count them: {e}; "
+                f"run backfill-rollups and backfill-sketches to repair the summary"
+            )
+        logger.debug(f"Page views logged: {len(page_views)}")
+        return True
+    
+    async def _insert_page_views(self, page_views: List[PageView]):
+        """Insert views, treating ones already stored under their id as written.
+
+        A batch retried after a partial insert then stores only the rest;
+        the views of a failed batch were never counted, so the caller still
+        counts all of them.
+        """
+        try:
+            await self.db.page_views.insert_many(
+                [page_view.model_dump() for page_view in page_views], ordered=False
+            )
+        except BulkWriteError as e:
+            duplicates_only = all(error["code"] == 11000 for error in e.details["writeErrors"])
+            if not duplicates_only or e.details.get("writeConcernErrors"):
+                raise
+    
+    @timed_operation
+    async def iter_page_views(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream raw page view documents oldest first, batch_size at a time"""
+        if self.page_view_layout == "buckets":
+            async for doc in self._iter_bucketed_page_views(start, end, batch_size, portfolio):
+                yield doc
+            return
+        query = self._time_range_filter(start, end, portfolio)
+        cursor = (
+            self.db.page_views.find(query, {"_id": 0})
+            .sort("timestamp", 1)
+            .batch_size(batch_size)
+        )
+        async for doc in cursor:
+            yield doc
+    
+    @timed_operation
+    async def delete_page_views(self, start: datetime, end: datetime, limit: int) -> int:
+        """In the bucketed layout whole buckets go, so the range is widened to whole hours"""
+        if self.page_view_layout != "buckets":
+            return await self._delete_range(self.db.page_views, self._time_range_filter(start, end), limit)
+        query = self._bucket_filter(start, end)
+        buckets = [
+            doc async for doc in
+            self.db.page_view_buckets.find(query, {"_id": 1, "count": 1}).limit(max(1, limit // self.bucket_size))
+        ]
+        if not buckets:
+            return 0
+        await self.db.page_view_buckets.delete_many({"_id": {"$in": [doc["_id"] for doc in buckets]}})
+        return sum(doc["count"] for doc in buckets)
+    
+    @timed_operation
+    async def count_page_views(self, start: datetime, end: datetime) -> int:
+        """In the bucketed layout, every view in the whole buckets delete_page_views would remove"""
+        if self.page_view_layout != "buckets":
+            return await self.db.page_views.count_documents(self._time_range_filter(start, end))
+        result = await self.db.page_view_buckets.aggregate([
+            {"$match": self._bucket_filter(start, end)},
+            {"$group": {"_id": None, "views": {"$sum": "$count"}}}
+        ]).to_list(None)
+        return result[0]["views"] if result else 0
+    
+    @staticmethod
+    def _bucket_view(page_view: PageView) -> dict:
+        view = {"t": page_view.timestamp}
+        for field, key in BUCKETED_FIELDS.items():
+            value = getattr(page_view, field)
+            if field != "timestamp" and value is not None:
+                view[key] = value
+        return view
+    
+    @staticmethod
+    def _unbucket_view(bucket: dict, view: dict) -> dict:
+        """A view from a bucket, shaped like a page_views document (it has no id)"""
+        doc = {"portfolio": bucket["portfolio"], "page": bucket["page"]}
+        for field, key in BUCKETED_FIELDS.items():
+            doc[field] = view.get(key)
+        return doc
+    
+    def _chunk_buckets(self, page_views: List[PageView]) -> Dict[Tuple[str, str, datetime], List[List[dict]]]:
+        """Group views by bucket key, split into chunks that each fit in one bucket"""
+        grouped: Dict[Tuple[str, str, datetime], List[dict]] = {}
+        for page_view in page_views:
+            key = (page_view.portfolio, page_view.page, bucket_start(page_view.timestamp, "hour"))
+            grouped.setdefault(key, []).append(self._bucket_view(page_view))
+        return {
+            key: [views[i:i + self.bucket_size] for i in range(0, len(views), self.bucket_size)]
+            for key, views in grouped.items()
+        }
+    
+    async def _push_to_buckets(self, page_views: List[PageView]):
+        """Append views to the open bucket of their portfolio, page and hour.
+
+        A bucket only matches while the chunk still fits, so a full one is
+        left alone and the upsert starts the next bucket for that hour.
+        """
+        ops = []
+        for (portfolio, page, hour), chunks in self._chunk_buckets(page_views).items():
+            for chunk in chunks:
+                ops.append(UpdateOne(
+                    {"portfolio": portfolio, "page": page, "hour": hour, "sealed": {"$ne": True},
+                     "count": {"$lte": self.bucket_size - len(chunk)}},
+                    {"$push": {"views": {"$each": chunk}}, "$inc": {"count": len(chunk)}},
+                    upsert=True
+                ))
+        await self.db.page_view_buckets.bulk_write(ops, ordered=False)
+    
+    @staticmethod
+    def _bucket_filter(
+        start: Optional[datetime] = None, end: Optional[datetime] = None, portfolio: Optional[str] = None
+    ) -> dict:
+        """Buckets that may hold views in [start, end): their hour starts at most an hour earlier"""
+        query = {"portfolio": portfolio} if portfolio else {}
+        if start or end:
+            query["hour"] = {}
+            if start:
+                query["hour"]["$gte"] = bucket_start(start, "hour")
+            if end:
+                query["hour"]["$lt"] = end
+        return query
+    
+    async def _iter_bucketed_page_views(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        batch_size: int,
+        portfolio: Optional[str]
+    ) -> AsyncIterator[dict]:
+        cursor = (
+            self.db.page_view_buckets.find(self._bucket_filter(start, end, portfolio), {"_id": 0})
+            .sort("hour", 1)
+            .batch_size(max(1, batch_size // self.bucket_size))
+        )
+        
+        def in_range(doc: dict) -> bool:
+            return (start is None or doc["timestamp"] >= start) and (end is None or doc["timestamp"] < end)
+        
+        # Views are only ordered within a bucket, so collect each hour before yielding it
+        hour, pending = None, []
+        async for bucket in cursor:
+            if bucket["hour"] != hour:
+                pending.sort(key=lambda doc: doc["timestamp"])
+                for doc in pending:
+                    yield doc
+                hour, pending = bucket["hour"], []
+            pending.extend(
+                doc for doc in (self._unbucket_view(bucket, view) for view in bucket["views"]) if in_range(doc)
+            )
+        pending.sort(key=lambda doc: doc["timestamp"])
+        for doc in pending:
+            yield doc
+    
+    @timed_operation
+    async def bucket_page_views(self, drop_source: bool = False) -> dict:
+        """Copy every document of page_views into page_view_buckets.
+
+        An hour's views are bucketed together, each bucket under an _id
+        derived from its key, so re-running after an interruption replaces
+        the buckets it wrote instead of duplicating them. Copied buckets are
+        sealed: views ingested meanwhile go to buckets of their own.
+        """
+        if self.page_view_layout != "buckets":
+            raise ValueError("Set PAGE_VIEW_STORAGE=buckets first, or new views keep going to page_views")
+        views = buckets = 0
+        
+        async def flush(hour_views: List[PageView]) -> int:
+            ops = []
+            for (portfolio, page, hour), chunks in self._chunk_buckets(hour_views).items():
+                for i, chunk in enumerate(chunks):
+                    bucket_id = f"migrated:{portfolio}:{page}:{hour.isoformat()}:{i}"
+                    ops.append(ReplaceOne({"_id": bucket_id}, {
+                        "_id": bucket_id, "portfolio": portfolio, "page": page, "hour": hour,
+                        "count": len(chunk), "views": chunk, "sealed": True
+                    }, upsert=True))
+            if ops:
+                await self.db.page_view_buckets.bulk_write(ops, ordered=False)
+            return len(ops)
+        
+        hour, pending = None, []
+        cursor = self.db.page_views.find({}, {"_id": 0}).sort("timestamp", 1).batch_size(1000)
+        async for doc in cursor:
+            page_view = PageView.model_construct(**{"portfolio": DEFAULT_PORTFOLIO, **doc})
+            doc_hour = bucket_start(page_view.timestamp, "hour")
+            if doc_hour != hour:
+                buckets += await flush(pending)
+                hour, pending = doc_hour, []
+            pending.append(page_view)
+            views += 1
+        buckets += await flush(pending)
+        
+        if drop_source:
+            await self.db.page_views.drop()
+        logger.info(f"Bucketed {views} page views into {buckets} buckets")
+        return {"views": views, "buckets": buckets, "dropped": drop_source}
+    
+    async def _merge_sketch(self, portfolio: str, day: datetime, sketch: TrafficSketch):
+        """Read-merge-write one day's sketch, retrying if another worker wrote it meanwhile"""
+        key = {"portfolio": portfolio, "day": day}
+        for _ in range(SKETCH_WRITE_ATTEMPTS):
+            stored = await self.db.page_view_sketches.find_one(key)
+            if stored is None:
+                try:
+                    await self.db.page_view_sketches.insert_one({**key, **sketch.to_document(), "version": 1})
+                    return
+                except DuplicateKeyError:
+                    continue
+            merged = TrafficSketch.from_document(stored).merge(sketch)
+            result = await self.db.page_view_sketches.update_one(
+                {"_id": stored["_id"], "version": stored["version"]},
+                {"$set": merged.to_document(), "$inc": {"version": 1}}
+            )
+            if result.modified_count:
+                return
+        raise RuntimeError(f"sketch of {portfolio} on {day:%Y-%m-%d} kept changing underneath")
+
+    async def _merge_sketches(self, sketches: Dict[Tuple[str, datetime], TrafficSketch]):
+        await asyncio.gather(*(
+            self._merge_sketch(portfolio, day, sketch) for (portfolio, day), sketch in sketches.items()
+        ))
+
+    @timed_operation
+    async def load_traffic_sketches(self, since: datetime, portfolio: str) -> Dict[datetime, TrafficSketch]:
+        cursor = self.db.page_view_sketches.find(
+            {"portfolio": portfolio, "day": {"$gte": since}}, {"_id": 0, "day": 1, "visitors": 1, "referrers": 1}
+        )
+        return {doc["day"]: TrafficSketch.from_document(doc) async for doc in cursor}
+
+    @timed_operation
+    async def merge_traffic_sketches(self, sketches: Dict[Tuple[str, datetime], TrafficSketch]) -> bool:
+        try:
+            await self._merge_sketches(sketches)
+            return True
+        except Exception as e:
+            logger.error(f"Error merging traffic sketches: {e}")
+            return False
+
+    async def clear_traffic_sketches(self):
+        await self.db.page_view_sketches.delete_many({})
+
+    async def _increment_page_view_rollups(self, page_views: List[PageView]):
+        """Add a batch of page views to the per-day, per-page counters"""
+        counts = Counter((pv.portfolio, day_start(pv.timestamp), pv.page) for pv in page_views)
+        await self.db.page_view_daily.bulk_write(
+            [
+                UpdateOne(
+                    {"portfolio": portfolio, "day": day, "page": page}, {"$inc": {"views": n}}, upsert=True
+                )
+                for (portfolio, day, page), n in counts.items()
+            ],
+            ordered=False
+        )
+    
+    @timed_operation
+    async def backfill_rollups(self) -> dict:
+        """Rebuild the daily counters from the raw page views and contact_submissions.
+
+        Counters are overwritten with exact totals, so this is safe to re-run;
+        views ingested while it runs may be counted for the day being rebuilt.
+        Days with no raw documents left, such as those retention archived,
+        keep their counters.
+        """
+        return await backfill_rollups(self.db, self.page_view_layout)
+    
+    @timed_operation
+    async def get_analytics_summary(self, days: int = 30, portfolio: Optional[str] = None) -> dict:
+        """Get analytics summary for the last N days from the daily rollups"""
+        try:
+            cutoff_day = day_start(datetime.utcnow() - timedelta(days=days))
+            match = {"$match": {"day": {"$gte": cutoff_day}}}
+            if portfolio:
+                match["$match"]["portfolio"] = portfolio
+            
+            # Total and top pages in one pass over the page counters
+            page_pipeline = [
+                match,
+                {"$group": {"_id": "$page", "count": {"$sum": "$views"}}},
+                {"$sort": {"count": -1}}
+            ]
+            contact_pipeline = [
+                match,
+                {"$group": {"_id": None, "count": {"$sum": "$contacts"}}}
+            ]
+            page_counts, contact_counts = await asyncio.gather(
+                self.db.page_view_daily.aggregate(page_pipeline).to_list(None),
+                self.db.contact_daily.aggregate(contact_pipeline).to_list(None)
+            )
+            
+            return summary_result(
+                days,
+                sum(doc["count"] for doc in page_counts),
+                contact_counts[0]["count"] if contact_counts else 0,
+                [{"page": doc["_id"], "views": doc["count"]} for doc in page_counts[:10]]
+            )
+        except Exception as e:
+            logger.error(f"Error getting analytics summary: {e}")
+            return {}
+
+    @timed_operation
+    async def page_view_window_stats(
+        self, windows: List[int], bucket: str, top: int, portfolio: Optional[str] = None
+    ) -> dict:
+        """Totals, top pages and top referrers per window plus a time series, in one $facet pass.
+
+        The series spans the widest window, bucketed by ``bucket`` ("hour" or "day").
+        """
+        try:
+            now = datetime.utcnow()
+            cutoffs = {days: now - timedelta(days=days) for days in windows}
+            facets = {
+                "series": [
+                    {"$group": {
+                        "_id": {"$dateTrunc": {"date": "$timestamp", "unit": bucket}},
+                        "views": {"$sum": 1}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ]
+            }
+            for days, cutoff in cutoffs.items():
+                in_window = {"$match": {"timestamp": {"$gte": cutoff}}}
+                facets[f"total_{days}"] = [in_window, {"$count": "views"}]
+                facets[f"pages_{days}"] = [
+                    in_window,
+                    {"$group": {"_id": "$page", "views": {"$sum": 1}}},
+                    {"$sort": {"views": -1}},
+                    {"$limit": top}
+                ]
+                facets[f"referrers_{days}"] = [
+                    {"$match": {"timestamp": {"$gte": cutoff}, "referrer": {"$nin": [None, ""]}}},
+                    {"$group": {"_id": REFERRER_HOST, "views": {"$sum": 1}}},
+                    {"$sort": {"views": -1}},
+                    {"$limit": top}
+                ]
+            since = min(cutoffs.values())
+            if self.page_view_layout == "buckets":
+                page_views = self.db.page_view_buckets
+                pipeline = [
+                    {"$match": self._bucket_filter(since, portfolio=portfolio)},
+                    {"$unwind": "$views"},
+                    {"$project": {"_id": 0, "page": 1, "timestamp": "$views.t", "referrer": "$views.r"}},
+                    {"$match": {"timestamp": {"$gte": since}}},
+                    {"$facet": facets}
+                ]
+            else:
+                page_views = self.db.page_views
+                pipeline = [
+                    {"$match": self._time_range_filter(since, portfolio=portfolio)},
+                    {"$facet": facets}
+                ]
+            result = await page_views.aggregate(pipeline).to_list(None)
+            facets = result[0] if result else {}
+            return {
+                "windows": {
+                    days: {
+                        "totalViews": sum(doc["views"] for doc in facets.get(f"total_{days}", [])),
+                        "topPages": [
+                            {"page": doc["_id"], "views": doc["views"]}
+                            for doc in facets.get(f"pages_{days}", [])
+                        ],
+                        "topReferrers": [
+                            {"referrer": doc["_id"], "views": doc["views"]}
+                            for doc in facets.get(f"referrers_{days}", [])
+                        ]
+                    }
+                    for days in windows
+                },
+                "series": [
+                    {"start": doc["_id"], "views": doc["views"]} for doc in facets.get("series", [])
+                ]
+            }
+        except Exception as e:
+            logger.error(f"Error computing page view window stats: {e}")
+            return {}
+    
+    @timed_operation
+    async def contact_window_stats(self, windows: List[int], portfolio: Optional[str] = None) -> Dict[int, int]:
+        """Submission counts per window in one $facet pass"""
+        try:
+            now = datetime.utcnow()
+            cutoffs = {days: now - timedelta(days=days) for days in windows}
+            pipeline = [
+                {"$match": self._time_range_filter(min(cutoffs.values()), portfolio=portfolio)},
+                {"$facet": {
+                    f"total_{days}": [{"$match": {"timestamp": {"$gte": cutoff}}}, {"$count": "contacts"}]
+                    for days, cutoff in cutoffs.items()
+                }}
+            ]
+            result = await self.db.contact_submissions.aggregate(pipeline).to_list(None)
+            facets = result[0] if result else {}
+            return {
+                days: sum(doc["contacts"] for doc in facets.get(f"total_{days}", []))
+                for days in windows
+            }
+        except Exception as e:
+            logger.error(f"Error computing contact window stats: {e}")
+            return {}
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from html import escape
+from pathlib import Path
+from typing import Dict, Optional
+
+from models import DEFAULT_PORTFOLIO, PortfolioData, SKILL_GROUPS
+from cache import portfolio_cache
+from portfolio_service import PortfolioService
+from responses import RenderedBody
+
+logger = logging.getLogger(__name__)
+
+# Rendered pages are named after their content hash, so they never change
+PAGE_NAME = re.compile(r"^portfolio\.([0-9a-f]{32})\.html$")
+
+# Extension of each stored representation, keyed by content coding
+FILE_SUFFIXES = {None: "", "gzip": ".gz", "br": ".br"}
+
+STYLE = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body { font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif; line-height: 1.6; color: #1f2937; }
+.container { max-width: 1200px; margin: 0 auto; padding: 0 2rem; }
+.hero { min-height: 70vh; display: flex; align-items: center; text-align: center; background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%); padding: 4rem 0; }
+.hero h1 { font-size: clamp(2.5rem, 5vw, 4rem); font-weight: 300; margin-bottom: 1rem; }
+.hero h2 { font-size: clamp(1.2rem, 3vw, 1.8rem); font-weight: 400; color: #4b5563; margin-bottom: 1rem; }
+.hero p { font-size: clamp(1rem, 2vw, 1.2rem); color: #6b7280; margin-bottom: 2rem; }
+.stats { display: flex; justify-content: center; gap: 2rem; margin: 2rem 0; flex-wrap: wrap; }
+.stat { color: #4b5563; }
+.stat-number { font-size: 2rem; font-weight: 700; color: #2563eb; }
+.section { padding: 4rem 0; }
+.section:nth-of-type(even) { background: #f9fafb; }
+.section h2 { font-size: 3rem; font-weight: 300; text-align: center; margin-bottom: 3rem; }
+.about-grid { display: grid; grid-template-columns: 1fr 2fr; gap: 4rem; align-items: center; }
+.profile-img { width: 300px; height: 300px; border-radius: 1rem; object-fit: cover; margin: 0 auto; display: block; box-shadow: 0 20px 40px rgba(0,0,0,0.1); }
+.checklist { list-style: none; }
+.checklist li { margin-bottom: 0.5rem; color: #4b5563; }
+.checklist li::before { content: "\\2713  "; color: #2563eb; }
+.grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(280px, 1fr)); gap: 2rem; }
+.card { background: white; padding: 1.5rem; border-radius: 1rem; box-shadow: 0 4px 12px rgba(0,0,0,0.06); }
+.card h3 { margin-bottom: 0.5rem; color: #1f2937; }
+.meta { color: #6b7280; font-size: 0.9rem; margin-bottom: 1rem; }
+.tags { display: flex; flex-wrap: wrap; gap: 0.5rem; margin-top: 1rem; }
+.tag { background: #dbeafe; color: #1e40af; padding: 0.2rem 0.7rem; border-radius: 999px; font-size: 0.8rem; }
+.contact-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 2rem; }
+.contact-item { display: block; background: white; padding: 1.5rem; border-radius: 1rem; text-decoration: none; color: inherit; }
+footer { background: #1f2937; color: white; padding: 2rem 0; text-align: center; }
+footer p { color: #9ca3af; font-size: 0.9rem; }
+@media (max-width: 768px) { .about-grid { grid-template-columns: 1fr; } .stats { gap: 1rem; } }
+"""
+
+def _items(values) -> str:
+    return "".join(f"<li>{escape(value)}</li>" for value in values)
+
+
+def _tags(values) -> str:
+    return "".join(f'<span class="tag">{escape(value)}</span>' for value in values)
+
+
+def render_html(portfolio: PortfolioData) -> str:
+    """Render the complete portfolio as a self-contained HTML page"""
+    personal = portfolio.personal
+    skills = "".join(
+        f'<div class="card"><h3>{escape(label)}</h3><div class="tags">{_tags(getattr(portfolio.skills, field))}</div></div>'
+        for field, label in SKILL_GROUPS.items()
+    )
+    experience = "".join(
+        f'<div class="card"><h3>{escape(item.title)}</h3>'
+        f'<p class="meta">{escape(item.company)} &middot; {escape(item.location)} &middot; '
+        f'{escape(item.duration)} &middot; {escape(item.type)}</p>'
+        f'<ul class="checklist">{_items(item.highlights)}</ul></div>'
+        for item in portfolio.experience
+    )
+    projects = "".join(
+        f'<div class="card"><h3>{escape(project.title)}</h3>'
+        f'<p class="meta">{escape(project.category)}</p>'
+        f'<p>{escape(project.description)}</p>'
+        f'<ul class="checklist" style="margin-top: 1rem;">{_items(project.achievements)}</ul>'
+        f'<p class="meta" style="margin-top: 1rem;">{escape(project.impact)}</p>'
+        f'<div class="tags">{_tags(project.technologies)}</div></div>'
+        for project in portfolio.projects
+    )
+    achievements = "".join(
+        f'<div class="card"><h3>{escape(item.title)}</h3><p>{escape(item.description)}</p></div>'
+        for item in portfolio.achievements
+    )
+    phone = personal.phone.split(",")[0].strip()
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{escape(personal.name)} - {escape(personal.title)}</title>
+    <meta name="description" content="{escape(personal.tagline)}">
+    <style>{STYLE}</style>
+</head>
+<body>
+    <section class="hero">
+        <div class="container">
+            <h1>{escape(personal.name)}</h1>
+            <h2>{escape(personal.title)}</h2>
+            <p>{escape(personal.tagline)}</p>
+            <div class="stats">
+                <div class="stat"><span class="stat-number">{escape(personal.yearsExperience)}</span> <span>Years Experience</span></div>
+                <div class="stat">{escape(personal.domain)}</div>
+                <div class="stat">{escape(personal.location)}</div>
+            </div>
+        </div>
+    </section>
+
+    <section class="section" id="about">
+        <div class="container">
+            <h2>About Me</h2>
+            <div class="about-grid">
+                <img src="{escape(personal.profileImage)}" alt="{escape(personal.name)}" class="profile-img">
+                <div>
+                    <p style="font-size: 1.1rem; margin-bottom: 2rem; color: #4b5563;">{escape(portfolio.about.summary)}</p>
+                    <ul class="checklist">{_items(portfolio.about.highlights)}</ul>
+                </div>
+            </div>
+        </div>
+    </section>
+
+    <section class="section" id="skills">
+        <div class="container"><h2>Skills</h2><div class="grid">{skills}</div></div>
+    </section>
+
+    <section class="section" id="experience">
+        <div class="container"><h2>Experience</h2><div class="grid">{experience}</div></div>
+    </section>
+
+    <section class="section" id="projects">
+        <div class="container"><h2>Projects</h2><div class="grid">{projects}</div></div>
+    </section>
+
+    <section class="section" id="achievements">
+        <div class="container">
+            <h2>Achievements</h2>
+            <div class="grid">{achievements}</div>
+            <h3 style="text-align: center; margin: 3rem 0 1rem;">Certifications</h3>
+            <div class="tags" style="justify-content: center;">{_tags(portfolio.certifications)}</div>
+        </div>
+    </section>
+
+    <section class="section" id="contact">
+        <div class="container">
+            <h2>Let's Connect</h2>
+            <div class="contact-grid">
+                <a href="mailto:{escape(personal.email)}" class="contact-item"><h4>Email</h4><p>{escape(personal.email)}</p></a>
+                <a href="tel:{escape(phone)}" class="contact-item"><h4>Phone</h4><p>{escape(personal.phone)}</p></a>
+                <a href="{escape(personal.linkedin)}" target="_blank" rel="noopener" class="contact-item"><h4>LinkedIn</h4><p>Connect on LinkedIn</p></a>
+                <div class="contact-item"><h4>Location</h4><p>{escape(personal.location)}</p></div>
+            </div>
+        </div>
+    </section>
+
+    <footer>
+        <div class="container">
+            <h3 style="margin-bottom: 1rem;">{escape(personal.name)}</h3>
+            <p>{escape(personal.title)}</p>
+        </div>
+    </footer>
+</body>
+</html>
+"""
+
+
+class StaticSite:
+    """Pre-rendered HTML for the default portfolio, rebuilt whenever it changes.
+
+    Every write to it invalidates its cache entry, which schedules a rebuild.
+    Each page is written to STATIC_RENDER_DIR as ``portfolio.<hash>.html``
+    together with ``.gz`` and ``.br`` variants; a file name never changes
+    content, so it can be cached forever. The latest page is also kept in
+    memory for the stable entry URL. Rebuilds requested while one is
+    running collapse into a single follow-up.
+    """
+
+    def __init__(self):
+        self.output_dir = Path(__file__).parent / "static_render"
+        self.keep = 5
+        self.current: Optional[RenderedBody] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def configure_from_env(self):
+        self.output_dir = Path(os.environ.get("STATIC_RENDER_DIR", self.output_dir))
+        self.keep = int(os.environ.get("STATIC_RENDER_KEEP", self.keep))
+
+    async def start(self):
+        """Render the current portfolio and rebuild after every change"""
+        self.configure_from_env()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        portfolio_cache.subscribe(self._portfolio_changed)
+        await self.rebuild()
+
+    async def stop(self):
+        portfolio_cache.unsubscribe(self._portfolio_changed)
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def current_name(self) -> Optional[str]:
+        return f"portfolio.{self.current.etag}.html" if self.current else None
+
+    def path_for(self, name: str, encoding: Optional[str] = None) -> Optional[Path]:
+        """Location of a rendered page, or None for names that aren't ours"""
+        if not PAGE_NAME.match(name):
+            return None
+        return self.output_dir / (name + FILE_SUFFIXES[encoding])
+
+    def _portfolio_changed(self, slug: str, version: int):
+        if slug != DEFAULT_PORTFOLIO:
+            return
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._rebuild_until_clean())
+
+    async def _rebuild_until_clean(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Static render failed: {e}")
+
+    async def rebuild(self):
+        """Render, compress and publish the current portfolio"""
+        portfolio = await PortfolioService.get_portfolio()
+        if portfolio is None:
+            return
+        started = time.perf_counter()
+        rendered = await asyncio.to_thread(self._publish, portfolio)
+        self.current = rendered
+        logger.info(
+            f"Rendered {self.current_name} ({len(rendered.identity)} bytes) "
+            f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+    def _publish(self, portfolio: PortfolioData) -> RenderedBody:
+        rendered = RenderedBody(render_html(portfolio).encode())
+        name = f"portfolio.{rendered.etag}.html"
+        bodies: Dict[Optional[str], bytes] = {None: rendered.identity, **rendered.variants}
+        for encoding, body in bodies.items():
+            path = self.path_for(name, encoding)
+            if path.exists():
+                # Same content as an earlier render; mark it recent so pruning keeps it
+                os.utime(path)
+                continue
+            # Write then rename, so a reader never sees a partial file
+            temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            temporary.write_bytes(body)
+            os.replace(temporary, path)
+        self._prune(name)
+        return rendered
+
+    def _prune(self, keep_name: str):
+        """Delete all but the ``keep`` most recent pages (and their variants)"""
+        pages = sorted(
+            (path for path in self.output_dir.glob("portfolio.*.html") if PAGE_NAME.match(path.name)),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True
+        )
+        for path in pages[self.keep:]:
+            if path.name == keep_name:
+                continue
+            for suffix in FILE_SUFFIXES.values():
+                path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+# Global static site renderer
+static_site = StaticSite()
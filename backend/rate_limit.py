@@ -0,0 +1,100 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Number of reverse proxies in front of the app that append to X-Forwarded-For.
+# Left at 0 the header is ignored, since any client can send it.
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """The address of the client, looking past trusted proxies"""
+    if TRUSTED_PROXY_HOPS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            addresses = [address.strip() for address in forwarded.split(",")]
+            # Each trusted proxy appended one entry; the one before them is the client
+            return addresses[max(len(addresses) - TRUSTED_PROXY_HOPS, 0)]
+    return request.client.host if request.client else None
+
+
+def parse_limit(spec: str) -> Optional[Tuple[int, float]]:
+    """Parse '<requests>/<seconds>' into (capacity, period); 'off' disables"""
+    if spec.strip().lower() in ("", "0", "off"):
+        return None
+    requests, _, seconds = spec.partition("/")
+    return int(requests), float(seconds or 1)
+
+
+class RateLimiter:
+    """Per-client token buckets for one route.
+
+    Each client may burst up to ``capacity`` requests, refilled evenly over
+    ``period`` seconds. Buckets live in an LRU-ordered dict capped at
+    ``max_clients``, so a check is O(1) and a flood of distinct addresses
+    only evicts the least recently seen clients, whose buckets restart full.
+    """
+
+    def __init__(self, name: str, capacity: int, period: float, max_clients: int = 10000):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls, name: str, variable: str, default: str) -> Optional["RateLimiter"]:
+        limit = parse_limit(os.environ.get(variable, default))
+        if not RATE_LIMIT_ENABLED or limit is None:
+            return None
+        return cls(name, *limit)
+
+    def acquire(self, key: str) -> float:
+        """Take a token for ``key``; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(self.capacity)
+            if len(self._buckets) >= self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            tokens, updated = bucket
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            self._buckets.move_to_end(key)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+
+def rate_limit(limiter: Optional[RateLimiter]):
+    """FastAPI dependency answering 429 with Retry-After once a client's bucket is empty"""
+    async def check(request: Request):
+        if limiter is None:
+            return
+        retry_after = limiter.acquire(client_ip(request) or "unknown")
+        if retry_after:
+            RATE_LIMITED.labels(limiter.name).inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please slow down",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    return check
+
+
+# Write endpoints, limited per client address
+contact_limiter = RateLimiter.from_env("contact", "RATE_LIMIT_CONTACT", "5/60")
+page_view_limiter = RateLimiter.from_env("page_view", "RATE_LIMIT_PAGE_VIEW", "120/60")
@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import logging
+import time
+from typing import AbstractSet, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from metrics import record_timing
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to pydantic's encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Preferred content codings, best first
+ENCODINGS = ("br", "gzip")
+
+# (gzip level, brotli quality) for bodies rendered once per portfolio
+# version and served many times: the whole portfolio and its sections
+PRECOMPRESSED_LEVELS = (9, 11)
+
+# Ad-hoc ?fields= subsets are compressed inside the request that first asks
+# for one, where brotli 11 costs far more than it saves on the wire
+ADHOC_LEVELS = (6, 5)
+
+
+class RenderedBody:
+    """A JSON body rendered once, with precompressed variants and an ETag"""
+
+    __slots__ = ("identity", "variants", "etag")
+
+    def __init__(self, body: bytes, levels: Tuple[int, int] = PRECOMPRESSED_LEVELS):
+        gzip_level, brotli_quality = levels
+        self.identity = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, bytes] = {
+            "gzip": gzip.compress(body, compresslevel=gzip_level, mtime=0),
+        }
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body, quality=brotli_quality)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.identity) + sum(len(body) for body in self.variants.values())
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        # Each representation gets its own strong validator
+        return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header names any variant of this body"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag == self.etag or tag.rsplit("-", 1)[0] == self.etag:
+                return True
+        return False
+
+
+def render_json(model: BaseModel, include: Optional[AbstractSet[str]] = None) -> RenderedBody:
+    """Serialize a model (or only the ``include`` fields) to JSON bytes and compress it,
+    at lighter levels for a subset of fields"""
+    started = time.perf_counter()
+    levels = ADHOC_LEVELS if include else PRECOMPRESSED_LEVELS
+    if orjson is not None:
+        # A quarter faster than model_dump_json on the seed portfolio, same bytes
+        body = orjson.dumps(model.model_dump(mode="json", include=include))
+    else:
+        body = model.model_dump_json(include=include).encode()
+    rendered = RenderedBody(body, levels)
+    record_timing("serialize", time.perf_counter() - started)
+    return rendered
+
+
+def render_section(model: BaseModel, field: str) -> RenderedBody:
+    """Serialize one field of a model on its own, without the enclosing object"""
+    # pydantic_core's encoder, not orjson: a section is mostly nested models,
+    # and dumping them to dicts first made orjson 1.3-4x slower here
+    started = time.perf_counter()
+    rendered = RenderedBody(to_json(getattr(model, field)))
+    record_timing("serialize", time.perf_counter() - started)
+    return rendered
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """Pick the best content coding the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def rendered_response(
+    request: Request, rendered: RenderedBody, cache_control: str, media_type: str = "application/json"
+) -> Response:
+    """Answer from a pre-rendered body, honouring If-None-Match and Accept-Encoding"""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), rendered.variants)
+    headers = {
+        "ETag": rendered.etag_for(encoding),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+
+    if rendered.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = rendered.variants[encoding]
+    else:
+        body = rendered.identity
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,323 @@
+import asyncio
+import fcntl
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import database
+from export import CHUNK_SIZE, encode_line
+from metrics import RETENTION_ARCHIVED_RECORDS
+from storage import day_start
+
+logger = logging.getLogger(__name__)
+
+# Collections the job archives, with the env var giving each one's retention in days
+RETAINED_COLLECTIONS = {
+    "page_views": "PAGE_VIEW_RETENTION_DAYS",
+    "contact_submissions": "CONTACT_RETENTION_DAYS",
+}
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class SegmentManifest:
+    """Index of the archive segments, kept as one JSON file next to them.
+
+    Each segment holds one collection's records of one UTC day. Its entry
+    says which day and time range it covers, how many records it holds
+    and whether those have been deleted from the database yet
+    ("archived", then "deleted"), so an interrupted run can finish the
+    deletes without archiving anything twice.
+    """
+
+    def __init__(self, archive_dir: Path):
+        self.path = archive_dir / MANIFEST_NAME
+        self.segments: List[dict] = []
+        if self.path.exists():
+            self.segments = json.loads(self.path.read_text())["segments"]
+
+    def save(self):
+        # Write then rename, so a reader never sees a partial manifest
+        temporary = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        temporary.write_text(json.dumps({"version": MANIFEST_VERSION, "segments": self.segments}, indent=1))
+        os.replace(temporary, self.path)
+
+    def find(
+        self, collection: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[dict]:
+        """Segments of ``collection`` with records in [start, end), oldest first"""
+        return sorted(
+            (
+                segment for segment in self.segments
+                if segment["collection"] == collection
+                and (start is None or datetime.fromisoformat(segment["last"]) >= start)
+                and (end is None or datetime.fromisoformat(segment["first"]) < end)
+            ),
+            key=lambda segment: (segment["first"], segment["file"])
+        )
+
+
+class SegmentWriter:
+    """Gzipped NDJSON segment of one collection's records of one day.
+
+    Compression runs in a worker thread, a chunk at a time, so a large
+    archive run doesn't stall the event loop serving requests.
+    """
+
+    def __init__(self, archive_dir: Path, collection: str, day: datetime):
+        created = datetime.utcnow()
+        self.collection = collection
+        self.day = day
+        self.file = f"{collection}/{day:%Y-%m}/{collection}-{day:%Y-%m-%d}.{created:%Y%m%dT%H%M%S%f}.ndjson.gz"
+        self.path = archive_dir / self.file
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._temporary = self.path.with_name(f".{self.path.name}.tmp")
+        self._gzip = gzip.open(self._temporary, "wb", compresslevel=6)
+        self._buffer = bytearray()
+        self.records = 0
+        self.first: Optional[datetime] = None
+        self.last: Optional[datetime] = None
+
+    async def write(self, doc: dict):
+        self._buffer += encode_line(doc)
+        self.records += 1
+        self.first = self.first or doc["timestamp"]
+        self.last = doc["timestamp"]
+        if len(self._buffer) >= CHUNK_SIZE:
+            await self._flush()
+
+    async def _flush(self):
+        chunk, self._buffer = bytes(self._buffer), bytearray()
+        await asyncio.to_thread(self._gzip.write, chunk)
+
+    def _close(self):
+        self._gzip.close()
+        with open(self._temporary, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(self._temporary, self.path)
+
+    async def close(self) -> dict:
+        """Finish the file and return its manifest entry"""
+        await self._flush()
+        await asyncio.to_thread(self._close)
+        return {
+            "collection": self.collection,
+            "file": self.file,
+            "day": self.day.date().isoformat(),
+            "first": self.first.isoformat(),
+            "last": self.last.isoformat(),
+            "records": self.records,
+            "bytes": self.path.stat().st_size,
+            "status": "archived",
+            "createdAt": datetime.utcnow().isoformat(),
+        }
+
+
+class RetentionJob:
+    """Moves raw records past their retention period out to archive segments.
+
+    Records older than PAGE_VIEW_RETENTION_DAYS / CONTACT_RETENTION_DAYS
+    (counted in whole UTC days; 0 keeps them forever) are written to
+    gzipped NDJSON segments under ARCHIVE_DIR, one per collection and day,
+    listed in a manifest. Only once a segment is safely on disk, and the
+    database still holds exactly as many records in its range, are they
+    deleted, RETENTION_BATCH_SIZE at a time with a pause between batches,
+    so live traffic keeps getting through. The daily rollups and traffic
+    sketches are left alone, and backfills skip days without raw records,
+    so summaries of archived days stay exact.
+
+    Runs every RETENTION_INTERVAL_SECONDS in the server, or on demand with
+    ``manage.py apply-retention``. A lock file keeps workers sharing the
+    archive directory from running it at the same time; with several
+    hosts, enable it on one of them only.
+    """
+
+    def __init__(self):
+        self.archive_dir = Path(__file__).parent / "archive"
+        self.retention_days: Dict[str, int] = {collection: 0 for collection in RETAINED_COLLECTIONS}
+        self.interval = 3600.0
+        self.batch_size = 1000
+        self.batch_pause = 0.05
+        self._task: Optional[asyncio.Task] = None
+
+    def configure_from_env(self):
+        self.archive_dir = Path(os.environ.get("ARCHIVE_DIR", self.archive_dir))
+        for collection, env_var in RETAINED_COLLECTIONS.items():
+            self.retention_days[collection] = int(os.environ.get(env_var, self.retention_days[collection]))
+        self.interval = float(os.environ.get("RETENTION_INTERVAL_SECONDS", self.interval))
+        self.batch_size = int(os.environ.get("RETENTION_BATCH_SIZE", self.batch_size))
+        self.batch_pause = float(os.environ.get("RETENTION_BATCH_PAUSE", self.batch_pause))
+
+    @property
+    def enabled(self) -> bool:
+        return any(days > 0 for days in self.retention_days.values())
+
+    async def start(self):
+        """Start archiving on a schedule, if any retention period is set"""
+        self.configure_from_env()
+        if not self.enabled:
+            logger.info("Retention disabled; raw records are kept forever")
+            return
+        if self.interval <= 0:
+            logger.info("Retention not scheduled; run manage.py apply-retention to archive")
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Retention every {self.interval:.0f}s: {self.retention_days} days, archived to {self.archive_dir}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> dict:
+        """Archive and delete everything past its retention period; returns counts per collection"""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.archive_dir / ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Retention already running in another process")
+                return {"skipped": True}
+            manifest = SegmentManifest(self.archive_dir)
+            results = {}
+            for collection, days in self.retention_days.items():
+                if days > 0:
+                    cutoff = day_start(datetime.utcnow()) - timedelta(days=days)
+                    results[collection] = await self._apply(manifest, collection, cutoff)
+            return results
+
+    async def _apply(self, manifest: SegmentManifest, collection: str, cutoff: datetime) -> dict:
+        # Finish the deletes of segments a previous run wrote first: their
+        # records are still in the database and would be archived again
+        deleted = 0
+        pending = [segment for segment in manifest.find(collection) if segment["status"] == "archived"]
+        for segment in pending:
+            deleted += await self._delete_segment(manifest, collection, segment) or 0
+        segments = []
+        for segment in await self._archive(manifest, collection, cutoff):
+            n = await self._delete_segment(manifest, collection, segment)
+            if n is not None:
+                deleted += n
+                segments.append(segment)
+        records = sum(segment["records"] for segment in segments)
+        if segments or pending:
+            logger.info(
+                f"Retention archived {records} {collection} older than {cutoff:%Y-%m-%d} "
+                f"into {len(segments)} segments, deleted {deleted}"
+            )
+        return {"segments": len(segments), "records": records, "deleted": deleted}
+
+    async def _archive(self, manifest: SegmentManifest, collection: str, cutoff: datetime) -> List[dict]:
+        """Write every record before ``cutoff`` to day segments, adding each to the manifest"""
+        docs = getattr(database, f"iter_{collection}")(end=cutoff, batch_size=self.batch_size)
+        segments = []
+        writer: Optional[SegmentWriter] = None
+        async for doc in docs:
+            day = day_start(doc["timestamp"])
+            if writer is not None and writer.day != day:
+                segments.append(await self._close(manifest, writer))
+                writer = None
+            if writer is None:
+                writer = SegmentWriter(self.archive_dir, collection, day)
+            await writer.write(doc)
+        if writer is not None:
+            segments.append(await self._close(manifest, writer))
+        return segments
+
+    async def _close(self, manifest: SegmentManifest, writer: SegmentWriter) -> dict:
+        segment = await writer.close()
+        manifest.segments.append(segment)
+        manifest.save()
+        RETENTION_ARCHIVED_RECORDS.labels(writer.collection).inc(writer.records)
+        return segment
+
+    async def _delete_segment(self, manifest: SegmentManifest, collection: str, segment: dict) -> Optional[int]:
+        """Delete a segment's records and mark it deleted; returns how many
+        were deleted, or None if the segment was dropped instead"""
+        start, end = self._segment_range(segment)
+        stored = await getattr(database, f"count_{collection}")(start, end)
+        if stored != segment["records"]:
+            # Something was stored in the segment's range after it was
+            # written (a late flush or a redelivered contact); deleting the
+            # range would lose it. Drop the segment instead, so the day is
+            # archived again with it.
+            logger.warning(
+                f"{segment['file']} holds {segment['records']} {collection} but {stored} are stored "
+                f"in its range; archiving that day again"
+            )
+            manifest.segments.remove(segment)
+            manifest.save()
+            (self.archive_dir / segment["file"]).unlink(missing_ok=True)
+            return None
+        deleted = await self._delete(collection, segment)
+        segment["status"] = "deleted"
+        manifest.save()
+        return deleted
+
+    @staticmethod
+    def _segment_range(segment: dict) -> Tuple[datetime, datetime]:
+        """The stored range a segment covers: up to its last record only, as
+        anything stored for the day since then isn't in it. One millisecond
+        past that, as BSON dates have no finer precision, but never into the
+        next day."""
+        start = datetime.fromisoformat(segment["first"])
+        end = min(
+            datetime.fromisoformat(segment["last"]) + timedelta(milliseconds=1),
+            datetime.fromisoformat(segment["day"]) + timedelta(days=1)
+        )
+        return start, end
+
+    async def _delete(self, collection: str, segment: dict) -> int:
+        """Delete a segment's records from the database in bounded batches"""
+        delete = getattr(database, f"delete_{collection}")
+        start, end = self._segment_range(segment)
+        deleted = 0
+        while True:
+            n = await delete(start, end, self.batch_size)
+            deleted += n
+            if n == 0:
+                break
+            await asyncio.sleep(self.batch_pause)
+        if deleted > segment["records"]:
+            logger.warning(f"Deleted {deleted} {collection} for {segment['file']}, which holds {segment['records']}")
+        return deleted
+
+
+def read_archive(
+    archive_dir: Path,
+    collection: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    portfolio: Optional[str] = None
+) -> Iterator[dict]:
+    """Stream archived records of ``collection`` in [start, end) oldest first, shaped as exported"""
+    for segment in SegmentManifest(archive_dir).find(collection, start, end):
+        with gzip.open(archive_dir / segment["file"], "rt") as f:
+            for line in f:
+                doc = json.loads(line)
+                doc["timestamp"] = datetime.fromisoformat(doc["timestamp"])
+                if start and doc["timestamp"] < start:
+                    continue
+                if end and doc["timestamp"] >= end:
+                    break
+                if portfolio and doc.get("portfolio") != portfolio:
+                    continue
+                yield doc
+
+
+# Global retention job
+retention = RetentionJob()
@@ -0,0 +1,321 @@
+import logging
+import math
+import os
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from html import escape
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from models import PortfolioData, SearchHit, SKILL_GROUPS
+
+logger = logging.getLogger(__name__)
+
+# Letters and digits, keeping trailing '+' and '#' so "C++" and "C#" stay distinct
+TOKEN = re.compile(r"[^\W_]+[+#]*")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the to with".split()
+)
+
+# Term frequency multiplier per kind of field: a match in a title or tag
+# says more about a document than one somewhere in its prose
+FIELD_WEIGHTS = {"title": 3.0, "tag": 2.0, "text": 1.0}
+
+# Prefix completions of the last query word count for less than exact matches
+PREFIX_BOOST = 0.5
+MAX_PREFIX_TERMS = 32
+
+SNIPPET_LENGTH = 160
+SNIPPET_LEAD = 40
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, re.Match]]:
+    """Yield (term, match) for every indexable word in ``text``"""
+    for match in TOKEN.finditer(text):
+        term = match.group().lower()
+        if term not in STOP_WORDS:
+            yield term, match
+
+
+class SearchDocument(NamedTuple):
+    """One searchable unit of the portfolio: a project, a role, a skill group..."""
+
+    id: str
+    section: str
+    title: str
+    # (field kind, texts) pairs, kinds as in FIELD_WEIGHTS
+    fields: Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def portfolio_documents(portfolio: PortfolioData) -> Dict[str, SearchDocument]:
+    """Split the portfolio into the documents the index ranks"""
+    personal = portfolio.personal
+    documents = [
+        SearchDocument("personal", "personal", personal.name, (
+            ("title", (personal.name, personal.title)),
+            ("text", (personal.tagline, personal.domain, personal.location)),
+        )),
+        SearchDocument("about", "about", "About", (
+            ("text", (portfolio.about.summary, *portfolio.about.highlights)),
+        )),
+    ]
+    for field, label in SKILL_GROUPS.items():
+        documents.append(SearchDocument(f"skills/{field}", "skills", label, (
+            ("title", (label,)),
+            ("tag", tuple(getattr(portfolio.skills, field))),
+        )))
+    for item in portfolio.experience:
+        documents.append(SearchDocument(f"experience/{item.id}", "experience", f"{item.title}, {item.company}", (
+            ("title", (item.title, item.company)),
+            ("text", (item.location, item.duration, *item.highlights)),
+        )))
+    for project in portfolio.projects:
+        documents.append(SearchDocument(f"projects/{project.id}", "projects", project.title, (
+            ("title", (project.title,)),
+            ("tag", (project.category, *project.technologies)),
+            ("text", (project.description, *project.achievements, project.impact)),
+        )))
+    for i, certification in enumerate(portfolio.certifications):
+        documents.append(SearchDocument(f"certifications/{i}", "certifications", certification, (
+            ("title", (certification,)),
+        )))
+    for i, achievement in enumerate(portfolio.achievements):
+        documents.append(SearchDocument(f"achievements/{i}", "achievements", achievement.title, (
+            ("title", (achievement.title,)),
+            ("text", (achievement.description,)),
+        )))
+    return {document.id: document for document in documents}
+
+
+class IndexedText(NamedTuple):
+    """A field value tokenized once at index time, for building snippets"""
+
+    kind: str
+    text: str
+    # (term, start, end) of every indexed word
+    spans: Tuple[Tuple[str, int, int], ...]
+    terms: FrozenSet[str]
+
+    @classmethod
+    def build(cls, kind: str, text: str) -> "IndexedText":
+        spans = tuple((term, match.start(), match.end()) for term, match in tokenize(text))
+        return cls(kind, text, spans, frozenset(span[0] for span in spans))
+
+
+def highlight(indexed: IndexedText, terms: Set[str]) -> str:
+    """Render an escaped excerpt of ``indexed`` around the first of ``terms``,
+    each match wrapped in <mark>"""
+    text = indexed.text
+    matches = [(start, end) for term, start, end in indexed.spans if term in terms]
+    start = 0
+    if len(text) > SNIPPET_LENGTH:
+        start = max(0, matches[0][0] - SNIPPET_LEAD)
+        if start:
+            # Begin at a word boundary
+            space = text.find(" ", start)
+            start = space + 1 if 0 <= space < matches[0][0] else start
+    end = min(len(text), start + SNIPPET_LENGTH)
+    if end < len(text):
+        # End at a word boundary
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    parts = ["…"] if start else []
+    position = start
+    for match_start, match_end in matches:
+        if match_start < start or match_end > end:
+            continue
+        parts.append(escape(text[position:match_start]))
+        parts.append(f"<mark>{escape(text[match_start:match_end])}</mark>")
+        position = match_end
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append("…")
+    return "".join(parts)
+
+
+class SearchIndex:
+    """Inverted index over one portfolio, ranked with BM25.
+
+    Postings map each term to the documents containing it and their
+    field-weighted term frequency; a sorted copy of the vocabulary serves
+    prefix lookups by bisection. ``update`` diffs the documents of a new
+    portfolio against the indexed ones and only re-indexes those that
+    changed, so an edit to one project touches one document's postings.
+    Queries never touch the database.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[str, SearchDocument] = {}
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.vocabulary: List[str] = []
+        self.display: Dict[str, str] = {}
+        self._frequencies: Dict[str, Counter] = {}
+        self._texts: Dict[str, List[IndexedText]] = {}
+        self._lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        # Identity of the cache entry the index was last brought up to date with
+        self.source = None
+
+    def update(self, portfolio: PortfolioData):
+        """Bring the index in line with ``portfolio``, re-indexing changed documents only"""
+        started = time.perf_counter()
+        documents = portfolio_documents(portfolio)
+        removed = [doc_id for doc_id in self.documents if doc_id not in documents]
+        changed = [
+            document for doc_id, document in documents.items()
+            if self.documents.get(doc_id) != document
+        ]
+        for doc_id in removed:
+            self._remove(doc_id)
+        for document in changed:
+            if document.id in self.documents:
+                self._remove(document.id)
+            self._add(document)
+        if removed or changed:
+            logger.info(
+                f"Search index updated: {len(changed)} documents indexed, {len(removed)} removed "
+                f"in {(time.perf_counter() - started) * 1000:.2f}ms ({len(self.vocabulary)} terms)"
+            )
+
+    def _add(self, document: SearchDocument):
+        frequencies = Counter()
+        indexed_texts = []
+        for kind, texts in document.fields:
+            weight = FIELD_WEIGHTS[kind]
+            for text in texts:
+                indexed = IndexedText.build(kind, text)
+                indexed_texts.append(indexed)
+                for term, start, end in indexed.spans:
+                    frequencies[term] += weight
+                    self.display.setdefault(term, text[start:end])
+        for term, frequency in frequencies.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                insort(self.vocabulary, term)
+            postings[document.id] = frequency
+        self.documents[document.id] = document
+        self._frequencies[document.id] = frequencies
+        self._texts[document.id] = indexed_texts
+        self._lengths[document.id] = length = sum(frequencies.values())
+        self._total_length += length
+
+    def _remove(self, doc_id: str):
+        for term in self._frequencies.pop(doc_id):
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect_left(self.vocabulary, term)]
+                self.display.pop(term, None)
+        del self.documents[doc_id]
+        del self._texts[doc_id]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def completions(self, prefix: str) -> List[str]:
+        """Indexed terms starting with ``prefix``, in vocabulary order"""
+        terms = []
+        i = bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            terms.append(self.vocabulary[i])
+            i += 1
+        return terms
+
+    def search(
+        self, query: str, limit: int = 10, section: Optional[str] = None, prefix: bool = False
+    ) -> Tuple[List[SearchHit], int]:
+        """Rank documents against ``query``; returns the top ``limit`` hits and the number matched.
+
+        With ``prefix`` the last query word also matches terms it begins, as
+        while the visitor is still typing.
+        """
+        terms = list(dict.fromkeys(term for term, _ in tokenize(query)))
+        if not terms or not self.documents:
+            return [], 0
+        weighted = {term: 1.0 for term in terms}
+        if prefix:
+            for term in self.completions(terms[-1])[:MAX_PREFIX_TERMS]:
+                weighted.setdefault(term, PREFIX_BOOST)
+
+        count = len(self.documents)
+        average_length = self._total_length / count
+        scores: Dict[str, float] = {}
+        for term, boost in weighted.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + boost * idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        if section:
+            scores = {doc_id: score for doc_id, score in scores.items() if self.documents[doc_id].section == section}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        matched = set(weighted)
+        hits = [
+            SearchHit.model_construct(
+                id=doc_id,
+                section=self.documents[doc_id].section,
+                title=self.documents[doc_id].title,
+                snippet=self.snippet(doc_id, matched),
+                score=round(score, 4)
+            )
+            for doc_id, score in ranked[:limit]
+        ]
+        return hits, len(ranked)
+
+    def snippet(self, doc_id: str, terms: Set[str]) -> str:
+        """The excerpt of a document matching most of ``terms``, prose preferred over titles"""
+        best, best_rank = None, (0, False)
+        for indexed in self._texts[doc_id]:
+            rank = (len(indexed.terms & terms), indexed.kind != "title")
+            if rank > best_rank:
+                best, best_rank = indexed, rank
+        if best is None:
+            return escape(self.documents[doc_id].title)
+        return highlight(best, terms)
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Tuple[str, int]]:
+        """Complete the last word of ``prefix``: (term, documents) for the most widespread terms"""
+        words = [match.group().lower() for match in TOKEN.finditer(prefix)]
+        if not words:
+            return []
+        terms = self.completions(words[-1])
+        terms.sort(key=lambda term: -len(self.postings[term]))
+        return [(self.display[term], len(self.postings[term])) for term in terms[:limit]]
+
+
+class SearchIndexes:
+    """Search indexes of the most recently searched portfolios, by slug.
+
+    Holds at most ``max_indexes``, evicting the least recently searched; an
+    evicted portfolio is re-indexed in full on its next search.
+    """
+
+    def __init__(self, max_indexes: int = 128):
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[str, SearchIndex]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def get(self, slug: str) -> SearchIndex:
+        """The index of portfolio ``slug``, created empty if it has none"""
+        index = self._indexes.get(slug)
+        if index is not None:
+            self._indexes.move_to_end(slug)
+            return index
+        index = self._indexes[slug] = SearchIndex()
+        while len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+        return index
+
+
+# Global search indexes, one per recently searched portfolio
+search_indexes = SearchIndexes(int(os.environ.get("SEARCH_INDEX_CACHE_SIZE", 128)))
@@ -1,19 +1,40 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
+import re
+import time
 from pathlib import Path
+from datetime import datetime
+from typing import Awaitable, Dict, Optional
 from dotenv import load_dotenv
 
+# Load environment variables before the modules that read them
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
 # Import our models and services
 from models import *
 from database import database
 from portfolio_service import PortfolioService
-
-# Load environment variables
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+from responses import negotiate_encoding, rendered_response
+from prerender import static_site
+from coherence import portfolio_coherence
+from ingest import page_view_buffer
+from auth import require_admin
+from contact_queue import IdempotencyKeyReused, contact_queue
+from retention import retention
+from rate_limit import client_ip, contact_limiter, page_view_limiter, rate_limit
+from analytics import AnalyticsService
+from pagination import encode_cursor, decode_cursor
+from metrics import MetricsMiddleware, STARTUP_PHASE_SECONDS, TimedJSONResponse
+from export import (
+    MEDIA_TYPES, PAGE_VIEW_FIELDS, CONTACT_SUBMISSION_FIELDS, ndjson_stream, csv_stream
+)
 
 # Configure logging
 logging.basicConfig(
@@ -22,23 +43,68 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Browsers may reuse the portfolio briefly, then revalidate with its ETag
+PORTFOLIO_CACHE_CONTROL = os.environ.get(
+    "PORTFOLIO_CACHE_CONTROL", "public, max-age=60, must-revalidate"
+)
+
+# Pre-rendered pages are named by content hash, so they never go stale
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+SLUG_RE = re.compile(SLUG_PATTERN)
+
+async def ensure_portfolio():
+    """Load the default portfolio into the cache, seeding it on first boot, and pre-render it"""
+    existing_portfolio = await PortfolioService.get_portfolio()
+    if not existing_portfolio:
+        logger.info("No existing portfolio data found, initializing...")
+        await PortfolioService.initialize_portfolio_data()
+    else:
+        logger.info("Portfolio data already exists in database")
+    await static_site.start()
+
+async def startup_phase(name: str, step: Awaitable, timings: Dict[str, float]):
+    """Await one startup step, recording how long it took"""
+    started = time.perf_counter()
+    try:
+        return await step
+    finally:
+        timings[name] = time.perf_counter() - started
+        STARTUP_PHASE_SECONDS.labels(name).set(timings[name])
+
 # Application lifecycle management
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up portfolio backend...")
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    app.state.startup_timings = timings
     try:
-        await database.connect()
+        await startup_phase("connect", database.connect(), timings)
         
-        # Initialize portfolio data if not exists
-        existing_portfolio = await database.get_portfolio_data()
-        if not existing_portfolio:
-            logger.info("No existing portfolio data found, initializing...")
-            await PortfolioService.initialize_portfolio_data()
-        else:
-            logger.info("Portfolio data already exists in database")
-            
-        logger.info("Portfolio backend startup complete")
+        # Everything else only needs the connection, not each other,
+        # except that portfolios are looked up by slug once migrated
+        async def migrate_then_load():
+            await startup_phase("migrate", database.migrate(), timings)
+            await startup_phase("portfolio", ensure_portfolio(), timings)
+        
+        await asyncio.gather(
+            startup_phase("warm_up", database.warm_up(), timings),
+            migrate_then_load(),
+            startup_phase("page_view_buffer", page_view_buffer.start(), timings),
+            startup_phase("contact_queue", contact_queue.start(), timings),
+            startup_phase("coherence", portfolio_coherence.start(), timings),
+        )
+        # Archiving needs the collections migrated, so it starts last
+        await retention.start()
+        
+        timings["total"] = time.perf_counter() - started
+        STARTUP_PHASE_SECONDS.labels("total").set(timings["total"])
+        phases = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in timings.items())
+        logger.info(f"Portfolio backend startup complete ({phases})")
         yield
     except Exception as e:
         logger.error(f"Startup failed: {e}")
@@ -46,6 +112,11 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down portfolio backend...")
+        await retention.stop()
+        await portfolio_coherence.stop()
+        await static_site.stop()
+        await contact_queue.stop()
+        await page_view_buffer.stop()
         await database.disconnect()
 
 # Create the main app with lifespan management
@@ -53,49 +124,195 @@ app = FastAPI(
     title="Sudhanshu's Portfolio API",
     description="Backend API for professional portfolio website",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
 )
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Portfolio endpoints
 @api_router.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "Portfolio API is running", "status": "healthy"}
 
-@api_router.get("/portfolio", response_model=PortfolioData)
-async def get_portfolio():
-    """Get complete portfolio data"""
+@api_router.get("/ready")
+async def readiness():
+    """Readiness probe: pings the database and reports pool statistics"""
+    report = await database.readiness()
+    status_code = 200 if report["ready"] else 503
+    return JSONResponse(status_code=status_code, content=report)
+
+# Portfolio endpoints
+async def portfolio_response(request: Request, slug: str, fields: Optional[str]) -> Response:
+    """The whole portfolio ``slug``, or only the top-level fields listed in ``fields``"""
+    try:
+        selected = None
+        if fields:
+            selected = frozenset(field.strip() for field in fields.split(",") if field.strip())
+            unknown = selected - PortfolioData.model_fields.keys()
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        
+        rendered = await PortfolioService.get_rendered_portfolio(slug, selected)
+        if not rendered:
+            raise HTTPException(status_code=404, detail="Portfolio data not found")
+        return rendered_response(request, rendered, PORTFOLIO_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching portfolio {slug}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def section_response(request: Request, slug: str, section: str) -> Response:
+    """One section of the portfolio ``slug``"""
+    if section not in PORTFOLIO_SECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown portfolio section")
+    try:
+        rendered = await PortfolioService.get_rendered_section(section, slug)
+        if not rendered:
+            raise HTTPException(status_code=404, detail="Portfolio data not found")
+        return rendered_response(request, rendered, PORTFOLIO_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching portfolio {slug} section {section}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def check_slug(slug: str):
+    if not SLUG_RE.match(slug):
+        raise HTTPException(status_code=404, detail="Portfolio data not found")
+
+@api_router.get(
+    "/portfolio",
+    response_model=PortfolioData,
+    responses={304: {"description": "Portfolio unchanged since the given ETag"}}
+)
+async def get_portfolio(request: Request, fields: Optional[str] = None):
+    """Get complete portfolio data, or only the top-level fields listed in ?fields="""
+    return await portfolio_response(request, DEFAULT_PORTFOLIO, fields)
+
+@api_router.get(
+    "/portfolio/{name}",
+    responses={304: {"description": "Portfolio or section unchanged since the given ETag"}}
+)
+async def get_portfolio_or_section(name: str, request: Request, fields: Optional[str] = None):
+    """A section of the default portfolio (personal, about, skills, ...), or the
+    portfolio with slug ``name``; section names are never used as slugs"""
+    if name in PORTFOLIO_SECTIONS:
+        return await section_response(request, DEFAULT_PORTFOLIO, name)
+    check_slug(name)
+    return await portfolio_response(request, name, fields)
+
+@api_router.get(
+    "/portfolio/{slug}/{section}",
+    responses={304: {"description": "Section unchanged since the given ETag"}}
+)
+async def get_portfolio_section(slug: str, section: str, request: Request):
+    """Get a single section of the portfolio with this slug"""
+    check_slug(slug)
+    return await section_response(request, slug, section)
+
+# Pre-rendered HTML, for a first paint that needs neither the JS bundle nor an API call
+@api_router.get(
+    "/site",
+    response_class=HTMLResponse,
+    responses={304: {"description": "Page unchanged since the given ETag"}}
+)
+async def get_static_site(request: Request):
+    """The current portfolio as a complete HTML page"""
+    if static_site.current is None:
+        raise HTTPException(status_code=404, detail="Page not rendered yet")
+    response = rendered_response(
+        request, static_site.current, PORTFOLIO_CACHE_CONTROL, media_type="text/html; charset=utf-8"
+    )
+    response.headers["Link"] = f'</api/site/{static_site.current_name}>; rel="canonical"'
+    return response
+
+@api_router.get("/site/{name}", response_class=HTMLResponse)
+async def get_static_page(name: str, request: Request):
+    """A rendering by content hash (portfolio.<hash>.html), cacheable indefinitely"""
+    identity = static_site.path_for(name)
+    if identity is None or not identity.exists():
+        raise HTTPException(status_code=404, detail="Page not found")
+    available = [encoding for encoding in ("br", "gzip") if static_site.path_for(name, encoding).exists()]
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), available)
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(
+        static_site.path_for(name, encoding), media_type="text/html; charset=utf-8", headers=headers
+    )
+
+# Search
+@api_router.get("/search", response_model=SearchResults)
+async def search_portfolio(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    section: Optional[str] = None,
+    prefix: bool = False,
+    portfolio: str = Query(DEFAULT_PORTFOLIO, pattern=SLUG_PATTERN)
+):
+    """Full-text search across a portfolio; ``prefix`` also completes the last word"""
+    if section and section not in PORTFOLIO_SECTIONS:
+        raise HTTPException(status_code=400, detail="Unknown portfolio section")
     try:
-        portfolio = await PortfolioService.get_portfolio()
-        if not portfolio:
+        results = await PortfolioService.search(q, limit, section, prefix, portfolio)
+        if results is None:
             raise HTTPException(status_code=404, detail="Portfolio data not found")
-        return portfolio
+        return TimedJSONResponse(results)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching portfolio: {e}")
+        logger.error(f"Error searching portfolio: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@api_router.post("/contact", response_model=ContactResponse)
+@api_router.get("/search/suggest", response_model=SearchSuggestions)
+async def suggest_search_terms(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    portfolio: str = Query(DEFAULT_PORTFOLIO, pattern=SLUG_PATTERN)
+):
+    """Autocomplete for the search box: indexed terms beginning with the last word of ``q``"""
+    try:
+        suggestions = await PortfolioService.suggest(q, limit, portfolio)
+        if suggestions is None:
+            raise HTTPException(status_code=404, detail="Portfolio data not found")
+        return TimedJSONResponse(suggestions)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error suggesting search terms: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@api_router.post(
+    "/contact", response_model=ContactResponse, dependencies=[Depends(rate_limit(contact_limiter))]
+)
 async def submit_contact_form(submission: ContactSubmissionCreate, request: Request):
     """Handle contact form submissions"""
     try:
         # Get client IP and user agent
-        client_ip = request.client.host if request.client else None
+        ip_address = client_ip(request)
         user_agent = request.headers.get("user-agent")
+        idempotency_key = request.headers.get("idempotency-key")
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
         
         # Process the submission
-        response = await PortfolioService.submit_contact_form(
-            submission,
-            ip_address=client_ip,
-            user_agent=user_agent
-        )
+        try:
+            response = await PortfolioService.submit_contact_form(
+                submission,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                idempotency_key=idempotency_key
+            )
+        except IdempotencyKeyReused:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different submission")
         
         if not response.success:
             raise HTTPException(status_code=400, detail=response.message)
             
-        return response
+        return TimedJSONResponse(response)
         
     except HTTPException:
         raise
@@ -103,53 +320,172 @@ async def submit_contact_form(submission: ContactSubmissionCreate, request: Requ
         logger.error(f"Error processing contact form: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@api_router.get("/contact/submissions")
-async def get_contact_submissions(limit: int = 50):
-    """Get recent contact submissions (for admin use)"""
+@api_router.get("/contact/submissions", response_model=ContactSubmissionPage)
+async def get_contact_submissions(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    company: Optional[str] = None,
+    include_message: bool = False,
+    portfolio: Optional[str] = None
+):
+    """Get contact submissions newest first, one keyset page at a time (for admin use)"""
     try:
-        submissions = await database.get_contact_submissions(limit)
-        return {"submissions": submissions, "count": len(submissions)}
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        
+        filters = {"status": status, "start": start, "end": end, "company": company, "portfolio": portfolio}
+        (submissions, has_more), (estimate, lower_bound) = await asyncio.gather(
+            database.get_contact_submissions(
+                limit, after=after, include_message=include_message, **filters
+            ),
+            database.estimate_contact_submissions(**filters)
+        )
+        next_cursor = None
+        if has_more:
+            last = submissions[-1]
+            next_cursor = encode_cursor(last.timestamp, last.id)
+        # Built from trusted storage output and returned as-is, skipping response_model validation
+        return TimedJSONResponse(ContactSubmissionPage.model_construct(
+            submissions=submissions,
+            count=len(submissions),
+            nextCursor=next_cursor,
+            totalEstimate=estimate,
+            totalIsLowerBound=lower_bound
+        ))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching contact submissions: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.patch(
+    "/contact/submissions/status", response_model=BulkStatusUpdateResult, dependencies=[Depends(require_admin)]
+)
+async def update_contact_submission_statuses(update: BulkStatusUpdate):
+    """Change the status of many submissions at once, by id or by filter (for admin use)"""
+    try:
+        return await PortfolioService.update_submission_statuses(update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error updating submission statuses: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 # Analytics endpoints (optional)
-@api_router.post("/analytics/page-view")
+@api_router.post("/analytics/page-view", dependencies=[Depends(rate_limit(page_view_limiter))])
 async def log_page_view(page_view_data: PageViewCreate, request: Request):
     """Log a page view for analytics"""
     try:
-        client_ip = request.client.host if request.client else None
+        if await PortfolioService.get_portfolio(page_view_data.portfolio) is None:
+            raise HTTPException(status_code=400, detail="Unknown portfolio")
+        
         user_agent = request.headers.get("user-agent")
         
         page_view = PageView(
-            **page_view_data.dict(),
-            ipAddress=client_ip,
+            **page_view_data.model_dump(),
+            ipAddress=client_ip(request),
             userAgent=user_agent
         )
         
-        success = await database.log_page_view(page_view)
-        if success:
-            return {"success": True, "message": "Page view logged"}
+        accepted = await page_view_buffer.submit(page_view)
+        if accepted:
+            return TimedJSONResponse({"success": True, "message": "Page view accepted"})
         else:
-            raise HTTPException(status_code=500, detail="Failed to log page view")
+            raise HTTPException(
+                status_code=503,
+                detail="Analytics ingestion is busy, please retry",
+                headers={"Retry-After": "1"}
+            )
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error logging page view: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @api_router.get("/analytics/summary")
-async def get_analytics_summary(days: int = 30):
-    """Get analytics summary"""
+async def get_analytics_summary(days: int = 30, portfolio: Optional[str] = None):
+    """Get analytics summary, across all portfolios or for one"""
     try:
-        summary = await database.get_analytics_summary(days)
-        return summary
+        summary = await AnalyticsService.summary(days, portfolio)
+        return TimedJSONResponse(summary)
     except Exception as e:
         logger.error(f"Error fetching analytics summary: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.get("/analytics/query")
+async def query_analytics(
+    windows: str = "7,30,90",
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    top: int = Query(10, ge=1, le=100),
+    portfolio: Optional[str] = None
+):
+    """Views, contacts, top pages and referrers for several day windows, plus a time series"""
+    try:
+        days = [int(part) for part in windows.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="windows must be comma-separated day counts")
+    if not days or len(days) > 5 or any(d < 1 or d > 366 for d in days):
+        raise HTTPException(status_code=400, detail="Give 1-5 windows of 1-366 days")
+    try:
+        return TimedJSONResponse(await AnalyticsService.query(days, bucket, top, portfolio))
+    except Exception as e:
+        logger.error(f"Error querying analytics: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Export endpoints
+def export_response(docs, fields, format: str, name: str) -> StreamingResponse:
+    """Stream documents to the client without materializing them"""
+    body = csv_stream(docs, fields) if format == "csv" else ndjson_stream(docs)
+    filename = f"{name}-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/export/page-views")
+async def export_page_views(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = Query(1000, ge=1, le=10000),
+    portfolio: Optional[str] = None
+):
+    """Stream raw page views as NDJSON or CSV (for admin use), ending with a
+    trailer that says whether the export is complete (see export.py)"""
+    docs = database.iter_page_views(start=start, end=end, batch_size=batch_size, portfolio=portfolio)
+    return export_response(docs, PAGE_VIEW_FIELDS, format, "page-views")
+
+@api_router.get("/export/contact-submissions")
+async def export_contact_submissions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=10000),
+    portfolio: Optional[str] = None
+):
+    """Stream raw contact submissions as NDJSON or CSV (for admin use), ending
+    with a trailer that says whether the export is complete (see export.py)"""
+    docs = database.iter_contact_submissions(
+        start=start, end=end, status=status, batch_size=batch_size, portfolio=portfolio
+    )
+    return export_response(docs, CONTACT_SUBMISSION_FIELDS, format, "contact-submissions")
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -157,8 +493,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Retry-After"],
 )
 
+# Outermost, so latency covers everything below it
+app.add_middleware(MetricsMiddleware)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
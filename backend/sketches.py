@@ -0,0 +1,223 @@
+import hashlib
+import heapq
+import math
+import zlib
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from models import PageView
+
+# Key under which the sketches of every portfolio are also merged, so that
+# site-wide queries read one sketch per day however many portfolios there
+# are; never a valid slug
+ALL_PORTFOLIOS = "*"
+
+# 2^12 one-byte registers: 4 KiB per day uncompressed, ~1.6% standard error
+HLL_PRECISION = 12
+
+# Referrers tracked per sketch; counts are exact while fewer distinct ones are seen
+HEAVY_HITTER_CAPACITY = 64
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Distinct-count estimator in a fixed number of registers.
+
+    Each value is hashed once; its first ``precision`` bits choose a
+    register, which keeps the longest run of leading zeros seen in the
+    rest. Merging takes the register-wise maximum, so sketches of
+    different days or workers combine into the sketch of their union.
+    """
+
+    def __init__(self, registers: Optional[bytes] = None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(registers or bytes(1 << precision))
+
+    def add(self, value: str):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, h: int):
+        """Add a value by its 64-bit hash, for values that go into several sketches"""
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Can't merge HyperLogLogs of different precision")
+        # Register-wise max over all registers at once, each one a byte lane
+        # of a big integer. Registers stay below 128, so (a | 0x80) - b
+        # never borrows across lanes and keeps a lane's top bit iff a >= b.
+        m = len(self.registers)
+        high = int.from_bytes(b"\x80" * m, "big")
+        a = int.from_bytes(self.registers, "big")
+        b = int.from_bytes(other.registers, "big")
+        keep_a = (((a | high) - b) & high) >> 7
+        keep_a *= 0xFF
+        merged = (a & keep_a) | (b & ~keep_a)
+        return HyperLogLog(merged.to_bytes(m, "big"), self.precision)
+
+    def count(self) -> int:
+        registers = bytes(self.registers)
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        # Histogram of register values at C speed, stopping once every register is counted
+        harmonic, seen, zeros = 0.0, 0, registers.count(0)
+        for rank in range(65):
+            n = registers.count(rank) if rank else zeros
+            harmonic += n * 2.0 ** -rank
+            seen += n
+            if seen == m:
+                break
+        estimate = alpha * m * m / harmonic
+        if estimate <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting over the empty registers
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        # Registers of quiet days are mostly zero and compress well
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers), 1)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        raw = zlib.decompress(data)
+        return cls(raw[1:], raw[0])
+
+
+class SpaceSaving:
+    """Top-k counter over a stream, in ``capacity`` slots (Metwally et al.).
+
+    A new item takes over the slot of the current minimum and inherits its
+    count as ``error``, so every count is an overestimate by at most its
+    error and any item more frequent than total/capacity is kept. Sketches
+    merge by summing counts; an item missing from a full sketch is charged
+    that sketch's minimum, which keeps both guarantees.
+    """
+
+    def __init__(self, capacity: int = HEAVY_HITTER_CAPACITY, counters: Optional[Dict[str, Tuple[int, int]]] = None):
+        self.capacity = capacity
+        # item -> (count, error)
+        self.counters: Dict[str, Tuple[int, int]] = dict(counters or {})
+
+    def add(self, item: str, n: int = 1):
+        if item in self.counters:
+            count, error = self.counters[item]
+            self.counters[item] = (count + n, error)
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = (n, 0)
+        else:
+            victim = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[item] = (floor + n, floor)
+
+    @classmethod
+    def from_counts(cls, counts: Counter, capacity: int = HEAVY_HITTER_CAPACITY) -> "SpaceSaving":
+        """Summarize exact counts: the top ``capacity`` are kept exactly, and
+        every dropped item counted at most the smallest kept count"""
+        return cls(capacity, {item: (n, 0) for item, n in counts.most_common(capacity)})
+
+    def _floor(self) -> int:
+        """Upper bound on the count of any item this sketch doesn't hold"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        own_floor, other_floor = self._floor(), other._floor()
+        missing = (other_floor, other_floor)
+        merged = {}
+        for item, (count, error) in self.counters.items():
+            other_count, other_error = other.counters.get(item, missing)
+            merged[item] = (count + other_count, error + other_error)
+        for item, (count, error) in other.counters.items():
+            if item not in merged:
+                merged[item] = (count + own_floor, error + own_floor)
+        capacity = max(self.capacity, other.capacity)
+        if len(merged) > capacity:
+            merged = dict(heapq.nlargest(capacity, merged.items(), key=lambda kv: kv[1][0]))
+        return SpaceSaving(capacity, merged)
+
+    def top(self, n: int) -> List[Tuple[str, int, int]]:
+        """The ``n`` items with the highest counts, as (item, count, error)"""
+        ranked = sorted(self.counters.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:n]]
+
+    def to_list(self) -> List[list]:
+        return [[item, count, error] for item, (count, error) in self.counters.items()]
+
+    @classmethod
+    def from_list(cls, rows: Iterable[list], capacity: int = HEAVY_HITTER_CAPACITY) -> "SpaceSaving":
+        return cls(capacity, {item: (count, error) for item, count, error in rows})
+
+
+class TrafficSketch:
+    """Unique visitors and top referrers of one portfolio on one day, or of
+    any union of those once merged"""
+
+    def __init__(self, visitors: Optional[HyperLogLog] = None, referrers: Optional[SpaceSaving] = None):
+        self.visitors = visitors or HyperLogLog()
+        self.referrers = referrers or SpaceSaving()
+
+    def merge(self, other: "TrafficSketch") -> "TrafficSketch":
+        return TrafficSketch(self.visitors.merge(other.visitors), self.referrers.merge(other.referrers))
+
+    def to_document(self) -> dict:
+        return {"visitors": self.visitors.to_bytes(), "referrers": self.referrers.to_list()}
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "TrafficSketch":
+        return cls(HyperLogLog.from_bytes(doc["visitors"]), SpaceSaving.from_list(doc["referrers"]))
+
+
+def merge_all(sketches: Iterable[TrafficSketch]) -> TrafficSketch:
+    merged = TrafficSketch()
+    for sketch in sketches:
+        merged = merged.merge(sketch)
+    return merged
+
+
+def visitor_key(page_view: PageView) -> Optional[str]:
+    """What tells visitors apart: address and browser, as no cookie is set"""
+    if not page_view.ipAddress and not page_view.userAgent:
+        return None
+    return f"{page_view.ipAddress or ''}\0{page_view.userAgent or ''}"
+
+
+@lru_cache(maxsize=4096)
+def referrer_host(referrer: Optional[str]) -> Optional[str]:
+    """Referring site without path or query, which would split one source into many"""
+    if not referrer:
+        return None
+    host = urlsplit(referrer).netloc.lower()
+    return host or referrer
+
+
+def sketch_page_views(page_views: List[PageView]) -> Dict[Tuple[str, datetime], TrafficSketch]:
+    """Sketch a batch of page views per (portfolio, day), plus per (ALL_PORTFOLIOS, day)"""
+    # Imported here: storage imports this module for its types
+    from storage import day_start
+
+    visitors: Dict[Tuple[str, datetime], HyperLogLog] = {}
+    referrers: Dict[Tuple[str, datetime], Counter] = {}
+    for page_view in page_views:
+        day = day_start(page_view.timestamp)
+        visitor = visitor_key(page_view)
+        visitor_hash = hash64(visitor) if visitor else None
+        host = referrer_host(page_view.referrer)
+        for key in ((page_view.portfolio, day), (ALL_PORTFOLIOS, day)):
+            if key not in visitors:
+                visitors[key], referrers[key] = HyperLogLog(), Counter()
+            if visitor_hash is not None:
+                visitors[key].add_hash(visitor_hash)
+            if host:
+                referrers[key][host] += 1
+    return {key: TrafficSketch(hll, SpaceSaving.from_counts(referrers[key])) for key, hll in visitors.items()}
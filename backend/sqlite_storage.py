@@ -0,0 +1,699 @@
+import aiosqlite
+import asyncio
+from storage import StorageBackend, COUNT_ESTIMATE_CAP, day_start, summary_result
+from models import DEFAULT_PORTFOLIO, PortfolioData, ContactSubmission, ContactSubmissionSummary, PageView
+from metrics import timed_operation
+from sketches import TrafficSketch, referrer_host, sketch_page_views
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, List, Tuple
+import json
+import os
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Timestamps are stored as fixed-width text so string order is time order
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    slug TEXT PRIMARY KEY,
+    doc TEXT NOT NULL,
+    revision TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contact_submissions (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    company TEXT,
+    message TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    source TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ipAddress TEXT,
+    userAgent TEXT,
+    portfolio TEXT NOT NULL DEFAULT 'default'
+);
+CREATE INDEX IF NOT EXISTS contact_timestamp_id ON contact_submissions (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS contact_status_timestamp_id ON contact_submissions (status, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS contact_portfolio_timestamp_id ON contact_submissions (portfolio, timestamp DESC, id DESC);
+CREATE TABLE IF NOT EXISTS page_views (
+    id TEXT PRIMARY KEY,
+    page TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    ipAddress TEXT,
+    userAgent TEXT,
+    referrer TEXT,
+    portfolio TEXT NOT NULL DEFAULT 'default'
+);
+CREATE INDEX IF NOT EXISTS page_view_timestamp ON page_views (timestamp);
+CREATE INDEX IF NOT EXISTS page_view_page_timestamp ON page_views (page, timestamp);
+CREATE INDEX IF NOT EXISTS page_view_portfolio_timestamp ON page_views (portfolio, timestamp);
+CREATE TABLE IF NOT EXISTS page_view_daily (
+    portfolio TEXT NOT NULL,
+    day TEXT NOT NULL,
+    page TEXT NOT NULL,
+    views INTEGER NOT NULL,
+    PRIMARY KEY (portfolio, day, page)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS contact_daily (
+    portfolio TEXT NOT NULL,
+    day TEXT NOT NULL,
+    contacts INTEGER NOT NULL,
+    PRIMARY KEY (portfolio, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS page_view_sketches (
+    portfolio TEXT NOT NULL,
+    day TEXT NOT NULL,
+    visitors BLOB NOT NULL,
+    referrers TEXT NOT NULL,
+    PRIMARY KEY (portfolio, day)
+) WITHOUT ROWID;
+"""
+
+CONTACT_COLUMNS = [
+    "id", "name", "email", "company", "message", "timestamp",
+    "source", "status", "ipAddress", "userAgent", "portfolio",
+]
+PAGE_VIEW_COLUMNS = ["id", "page", "timestamp", "ipAddress", "userAgent", "referrer", "portfolio"]
+
+# Rows per multi-row INSERT, keeping its parameters well under SQLite's
+# limit of 32766 bound variables
+INSERT_CHUNK_ROWS = 1000
+
+def to_text(moment: datetime) -> str:
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+def from_text(value: str) -> datetime:
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+class SQLiteStorage(StorageBackend):
+    """Single-file SQLite storage through aiosqlite, for small single-node deployments.
+
+    The database file is set by SQLITE_PATH. WAL journaling lets readers
+    proceed while a write is in progress. Every coroutine shares the one
+    connection, and so its open transaction: writes take ``_write_lock``
+    for the whole transaction, or a rollback in one coroutine would
+    discard what another had written but not yet committed.
+    """
+
+    name = "sqlite"
+
+    def __init__(self):
+        self.path = None
+        self.conn: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+
+    async def connect(self):
+        """Open the database file"""
+        try:
+            self.path = os.environ.get("SQLITE_PATH", str(Path(__file__).parent / "portfolio.db"))
+            self.conn = await aiosqlite.connect(self.path)
+            self.conn.row_factory = aiosqlite.Row
+            await self.conn.execute("PRAGMA journal_mode=WAL")
+            await self.conn.execute("PRAGMA synchronous=NORMAL")
+            await self.conn.create_function("referrer_host", 1, referrer_host, deterministic=True)
+            # Idempotent and instant, so done here rather than in migrate(),
+            # which startup runs alongside the first portfolio read
+            async with self._transaction():
+                rebuild_rollups = await self._upgrade_schema()
+                await self.conn.executescript(SCHEMA)
+                await self._adopt_single_portfolio()
+            if rebuild_rollups:
+                await self.backfill_rollups()
+            logger.info(f"Successfully opened SQLite database at {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to open SQLite database: {e}")
+            raise
+
+    @asynccontextmanager
+    async def _transaction(self):
+        """Run one write transaction under the write lock: committed at the
+        end of the block, or rolled back if it raises"""
+        async with self._write_lock:
+            try:
+                yield
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
+
+    async def _columns(self, table: str) -> List[str]:
+        rows = await self.conn.execute_fetchall(f"PRAGMA table_info({table})")
+        return [row["name"] for row in rows]
+
+    async def _upgrade_schema(self) -> bool:
+        """Scope tables from before portfolios had slugs to the default portfolio.
+
+        Returns whether the rollups were dropped and need rebuilding.
+        """
+        for table in ("contact_submissions", "page_views"):
+            columns = await self._columns(table)
+            if columns and "portfolio" not in columns:
+                await self.conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN portfolio TEXT NOT NULL DEFAULT '{DEFAULT_PORTFOLIO}'"
+                )
+                logger.info(f"Added portfolio column to {table}")
+        rebuild = False
+        for table in ("page_view_daily", "contact_daily"):
+            # The portfolio is part of their primary key, which can't be altered
+            columns = await self._columns(table)
+            if columns and "portfolio" not in columns:
+                await self.conn.execute(f"DROP TABLE {table}")
+                rebuild = True
+        return rebuild
+
+    async def _adopt_single_portfolio(self):
+        """Move the portfolio from the old single-row table into ``portfolios``"""
+        if not await self._columns("portfolio_data"):
+            return
+        for row in await self.conn.execute_fetchall("SELECT doc FROM portfolio_data"):
+            await self.conn.execute(
+                "INSERT OR IGNORE INTO portfolios (slug, doc, revision) VALUES (?, ?, ?)",
+                (DEFAULT_PORTFOLIO, row["doc"], uuid.uuid4().hex)
+            )
+        await self.conn.execute("DROP TABLE portfolio_data")
+        await self.conn.execute("DROP TABLE IF EXISTS portfolio_revision")
+        logger.info(f"Moved the stored portfolio to slug {DEFAULT_PORTFOLIO!r}")
+
+    async def disconnect(self):
+        if self.conn:
+            await self.conn.close()
+            logger.info("Closed SQLite database")
+
+    @timed_operation
+    async def ping(self) -> float:
+        started = time.perf_counter()
+        await self.conn.execute_fetchall("SELECT 1")
+        return (time.perf_counter() - started) * 1000
+
+    # Portfolio Data Operations
+    @timed_operation
+    async def get_portfolio_data(self, slug: str = DEFAULT_PORTFOLIO) -> Optional[PortfolioData]:
+        """Get the portfolio with this slug"""
+        try:
+            rows = await self.conn.execute_fetchall(
+                "SELECT doc, revision FROM portfolios WHERE slug = ?", (slug,)
+            )
+            if rows:
+                portfolio = PortfolioData.model_validate_json(rows[0]["doc"])
+                portfolio.revision = rows[0]["revision"]
+                return portfolio
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching portfolio data: {e}")
+            return None
+
+    @timed_operation
+    async def upsert_portfolio_data(self, portfolio: PortfolioData) -> bool:
+        """Insert or update the portfolio with ``portfolio.slug``"""
+        try:
+            async with self._transaction():
+                await self.conn.execute(
+                    "INSERT INTO portfolios (slug, doc, revision) VALUES (?, ?, ?) "
+                    "ON CONFLICT (slug) DO UPDATE SET doc = excluded.doc, revision = excluded.revision",
+                    (portfolio.slug, portfolio.model_dump_json(), uuid.uuid4().hex)
+                )
+            self._portfolio_changed(portfolio.slug)
+            logger.info(f"Portfolio data upserted successfully: {portfolio.slug}")
+            return True
+        except Exception as e:
+            logger.error(f"Error upserting portfolio data: {e}")
+            return False
+
+    @timed_operation
+    async def get_portfolio_revisions(self, slugs: List[str]) -> Dict[str, Optional[str]]:
+        """Revision tokens of several portfolios, read without their documents"""
+        try:
+            rows = await self.conn.execute_fetchall(
+                f"SELECT slug, revision FROM portfolios WHERE slug IN ({', '.join('?' for _ in slugs)})",
+                slugs
+            )
+            return {row["slug"]: row["revision"] for row in rows}
+        except Exception as e:
+            logger.error(f"Error fetching portfolio revisions: {e}")
+            return {}
+
+    # Contact Submission Operations
+    @timed_operation
+    async def create_contact_submission(self, submission: ContactSubmission) -> bool:
+        """Create a new contact submission"""
+        try:
+            doc = submission.model_dump()
+            doc["timestamp"] = to_text(submission.timestamp)
+            async with self._transaction():
+                cursor = await self.conn.execute(
+                    f"INSERT INTO contact_submissions ({', '.join(CONTACT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in CONTACT_COLUMNS)}) ON CONFLICT (id) DO NOTHING",
+                    [doc[column] for column in CONTACT_COLUMNS]
+                )
+                created = cursor.rowcount > 0
+                if created:
+                    await self.conn.execute(
+                        "INSERT INTO contact_daily (portfolio, day, contacts) VALUES (?, ?, 1) "
+                        "ON CONFLICT (portfolio, day) DO UPDATE SET contacts = contacts + 1",
+                        (submission.portfolio, to_text(day_start(submission.timestamp)))
+                    )
+            if created:
+                logger.info(f"Contact submission created: {submission.id}")
+            else:
+                logger.info(f"Contact submission already stored: {submission.id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error creating contact submission: {e}")
+            return False
+
+    @staticmethod
+    def _submission_where(
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> Tuple[List[str], list]:
+        clauses, params = [], []
+        if portfolio:
+            clauses.append("portfolio = ?")
+            params.append(portfolio)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(to_text(start))
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(to_text(end))
+        if company:
+            # LIKE is case-insensitive for ASCII, matching the Mongo regex filter
+            escaped = company.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("company LIKE ? ESCAPE '\\'")
+            params.append(f"{escaped}%")
+        return clauses, params
+
+    @staticmethod
+    def _row_to_doc(row: aiosqlite.Row) -> dict:
+        doc = dict(row)
+        doc["timestamp"] = from_text(doc["timestamp"])
+        return doc
+
+    @timed_operation
+    async def get_contact_submissions(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple[datetime, str]] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        include_message: bool = False,
+        portfolio: Optional[str] = None
+    ) -> Tuple[List[ContactSubmissionSummary], bool]:
+        """Get one page of submissions, newest first, starting after a keyset position"""
+        try:
+            clauses, params = self._submission_where(status, start, end, company, portfolio)
+            if after:
+                # Row-value comparison seeks straight to the position in the index
+                clauses.append("(timestamp, id) < (?, ?)")
+                params.extend([to_text(after[0]), after[1]])
+            columns = CONTACT_COLUMNS if include_message else [c for c in CONTACT_COLUMNS if c != "message"]
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = await self.conn.execute_fetchall(
+                f"SELECT {', '.join(columns)} FROM contact_submissions {where} "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                [*params, limit + 1]
+            )
+            # Rows were validated when written; skip validating them again
+            submissions = [ContactSubmissionSummary.model_construct(**self._row_to_doc(row)) for row in rows]
+            return submissions[:limit], len(submissions) > limit
+        except Exception as e:
+            logger.error(f"Error fetching contact submissions: {e}")
+            return [], False
+
+    @timed_operation
+    async def estimate_contact_submissions(
+        self,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> Tuple[Optional[int], bool]:
+        """Count matching submissions, stopping at COUNT_ESTIMATE_CAP"""
+        try:
+            clauses, params = self._submission_where(status, start, end, company, portfolio)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = await self.conn.execute_fetchall(
+                f"SELECT COUNT(*) AS n FROM (SELECT 1 FROM contact_submissions {where} LIMIT ?)",
+                [*params, COUNT_ESTIMATE_CAP]
+            )
+            count = rows[0]["n"]
+            return count, count >= COUNT_ESTIMATE_CAP
+        except Exception as e:
+            logger.error(f"Error estimating contact submissions: {e}")
+            return None, False
+
+    async def _iter_rows(self, sql: str, params: list, batch_size: int) -> AsyncIterator[dict]:
+        async with self.conn.execute(sql, params) as cursor:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield self._row_to_doc(row)
+
+    @timed_operation
+    async def iter_contact_submissions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[str] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream submission rows oldest first, batch_size at a time"""
+        clauses, params = self._submission_where(status, start, end, portfolio=portfolio)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(CONTACT_COLUMNS)} FROM contact_submissions {where} ORDER BY timestamp, id"
+        async for doc in self._iter_rows(sql, params, batch_size):
+            yield doc
+
+    async def _delete_range(self, table: str, start: datetime, end: datetime, limit: int) -> int:
+        async with self._transaction():
+            cursor = await self.conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} WHERE timestamp >= ? AND timestamp < ? LIMIT ?)",
+                (to_text(start), to_text(end), limit)
+            )
+        return cursor.rowcount
+
+    async def _count_range(self, table: str, start: datetime, end: datetime) -> int:
+        rows = await self.conn.execute_fetchall(
+            f"SELECT COUNT(*) AS n FROM {table} WHERE timestamp >= ? AND timestamp < ?", (to_text(start), to_text(end))
+        )
+        return rows[0]["n"]
+
+    @timed_operation
+    async def count_contact_submissions(self, start: datetime, end: datetime) -> int:
+        return await self._count_range("contact_submissions", start, end)
+
+    @timed_operation
+    async def delete_contact_submissions(self, start: datetime, end: datetime, limit: int) -> int:
+        return await self._delete_range("contact_submissions", start, end, limit)
+
+    @timed_operation
+    async def update_submission_status(self, submission_id: str, status: str) -> bool:
+        """Update contact submission status"""
+        try:
+            async with self._transaction():
+                cursor = await self.conn.execute(
+                    "UPDATE contact_submissions SET status = ? WHERE id = ? AND status != ?",
+                    (status, submission_id, status)
+                )
+            return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Error updating submission status: {e}")
+            return False
+
+    @timed_operation
+    async def get_submission_statuses(self, submission_ids: List[str]) -> Dict[str, str]:
+        statuses = {}
+        # Chunked to stay under SQLite's limit on bound parameters
+        for i in range(0, len(submission_ids), 500):
+            chunk = submission_ids[i:i + 500]
+            rows = await self.conn.execute_fetchall(
+                f"SELECT id, status FROM contact_submissions WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            statuses.update((row["id"], row["status"]) for row in rows)
+        return statuses
+
+    @timed_operation
+    async def set_submission_statuses(self, changes: List[Tuple[str, str, str]]) -> int:
+        if not changes:
+            return 0
+        async with self._transaction():
+            cursor = await self.conn.executemany(
+                "UPDATE contact_submissions SET status = ? WHERE id = ? AND status = ?",
+                [(status, submission_id, expected) for submission_id, expected, status in changes]
+            )
+        return cursor.rowcount
+
+    @timed_operation
+    async def set_matching_submission_statuses(
+        self,
+        status: str,
+        from_statuses: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> int:
+        clauses, params = self._submission_where(None, start, end, company, portfolio)
+        clauses.append(f"status IN ({', '.join('?' * len(from_statuses))})")
+        params.extend(from_statuses)
+        async with self._transaction():
+            cursor = await self.conn.execute(
+                f"UPDATE contact_submissions SET status = ? WHERE {' AND '.join(clauses)}", (status, *params)
+            )
+        return cursor.rowcount
+
+    # Analytics Operations
+    @timed_operation
+    async def log_page_views(self, page_views: List[PageView]) -> bool:
+        """Log a batch of page views in one transaction.
+
+        Only views whose insert took effect are added to the rollups and
+        sketches, so a view stored by an earlier attempt isn't counted twice.
+        """
+        try:
+            rows = []
+            for page_view in page_views:
+                doc = page_view.model_dump()
+                doc["timestamp"] = to_text(page_view.timestamp)
+                rows.append([doc[column] for column in PAGE_VIEW_COLUMNS])
+            by_id = {page_view.id: page_view for page_view in page_views}
+            async with self._transaction():
+                inserted = []
+                for i in range(0, len(rows), INSERT_CHUNK_ROWS):
+                    chunk = rows[i:i + INSERT_CHUNK_ROWS]
+                    placeholders = ", ".join(f"({', '.join('?' for _ in PAGE_VIEW_COLUMNS)})" for _ in chunk)
+                    returned = await self.conn.execute_fetchall(
+                        f"INSERT OR IGNORE INTO page_views ({', '.join(PAGE_VIEW_COLUMNS)}) "
+                        f"VALUES {placeholders} RETURNING id",
+                        [value for row in chunk for value in row]
+                    )
+                    inserted.extend(by_id[row["id"]] for row in returned)
+                counts = Counter((pv.portfolio, to_text(day_start(pv.timestamp)), pv.page) for pv in inserted)
+                await self.conn.executemany(
+                    "INSERT INTO page_view_daily (portfolio, day, page, views) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (portfolio, day, page) DO UPDATE SET views = views + excluded.views",
+                    [(*key, n) for key, n in counts.items()]
+                )
+                # Once the insert above has started the transaction, SQLite's
+                # file lock keeps other processes from changing a sketch
+                # between reading and rewriting it; _write_lock keeps out
+                # other coroutines of this one
+                await self._merge_sketches(sketch_page_views(inserted))
+            return True
+        except Exception as e:
+            logger.error(f"Error logging {len(page_views)} page views: {e}")
+            return False
+
+    async def _merge_sketches(self, sketches: Dict[Tuple[str, datetime], TrafficSketch]):
+        for (portfolio, day), sketch in sketches.items():
+            rows = await self.conn.execute_fetchall(
+                "SELECT visitors, referrers FROM page_view_sketches WHERE portfolio = ? AND day = ?",
+                (portfolio, to_text(day))
+            )
+            if rows:
+                sketch = self._row_to_sketch(rows[0]).merge(sketch)
+            doc = sketch.to_document()
+            await self.conn.execute(
+                "INSERT INTO page_view_sketches (portfolio, day, visitors, referrers) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (portfolio, day) DO UPDATE SET "
+                "visitors = excluded.visitors, referrers = excluded.referrers",
+                (portfolio, to_text(day), doc["visitors"], json.dumps(doc["referrers"]))
+            )
+
+    @staticmethod
+    def _row_to_sketch(row: aiosqlite.Row) -> TrafficSketch:
+        return TrafficSketch.from_document({"visitors": row["visitors"], "referrers": json.loads(row["referrers"])})
+
+    @timed_operation
+    async def load_traffic_sketches(self, since: datetime, portfolio: str) -> Dict[datetime, TrafficSketch]:
+        rows = await self.conn.execute_fetchall(
+            "SELECT day, visitors, referrers FROM page_view_sketches WHERE portfolio = ? AND day >= ?",
+            (portfolio, to_text(since))
+        )
+        return {from_text(row["day"]): self._row_to_sketch(row) for row in rows}
+
+    @timed_operation
+    async def merge_traffic_sketches(self, sketches: Dict[Tuple[str, datetime], TrafficSketch]) -> bool:
+        try:
+            async with self._transaction():
+                await self._merge_sketches(sketches)
+            return True
+        except Exception as e:
+            logger.error(f"Error merging traffic sketches: {e}")
+            return False
+
+    async def clear_traffic_sketches(self):
+        async with self._transaction():
+            await self.conn.execute("DELETE FROM page_view_sketches")
+
+    @timed_operation
+    async def iter_page_views(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream page view rows oldest first, batch_size at a time"""
+        clauses, params = self._submission_where(start=start, end=end, portfolio=portfolio)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(PAGE_VIEW_COLUMNS)} FROM page_views {where} ORDER BY timestamp, id"
+        async for doc in self._iter_rows(sql, params, batch_size):
+            yield doc
+
+    @timed_operation
+    async def delete_page_views(self, start: datetime, end: datetime, limit: int) -> int:
+        return await self._delete_range("page_views", start, end, limit)
+
+    @timed_operation
+    async def count_page_views(self, start: datetime, end: datetime) -> int:
+        return await self._count_range("page_views", start, end)
+
+    @timed_operation
+    async def backfill_rollups(self) -> dict:
+        """Rebuild the daily counters of the days that still have raw rows"""
+        async with self._transaction():
+            await self.conn.execute(
+                "DELETE FROM page_view_daily WHERE (portfolio, day) IN "
+                "(SELECT DISTINCT portfolio, substr(timestamp, 1, 10) || 'T00:00:00.000000' FROM page_views)"
+            )
+            await self.conn.execute(
+                "INSERT INTO page_view_daily (portfolio, day, page, views) "
+                "SELECT portfolio, substr(timestamp, 1, 10) || 'T00:00:00.000000', page, COUNT(*) "
+                "FROM page_views GROUP BY 1, 2, 3"
+            )
+            await self.conn.execute(
+                "DELETE FROM contact_daily WHERE (portfolio, day) IN "
+                "(SELECT DISTINCT portfolio, substr(timestamp, 1, 10) || 'T00:00:00.000000' FROM contact_submissions)"
+            )
+            await self.conn.execute(
+                "INSERT INTO contact_daily (portfolio, day, contacts) "
+                "SELECT portfolio, substr(timestamp, 1, 10) || 'T00:00:00.000000', COUNT(*) "
+                "FROM contact_submissions GROUP BY 1, 2"
+            )
+        page_days = (await self.conn.execute_fetchall("SELECT COUNT(*) AS n FROM page_view_daily"))[0]["n"]
+        contact_days = (await self.conn.execute_fetchall("SELECT COUNT(*) AS n FROM contact_daily"))[0]["n"]
+        logger.info(f"Rollups backfilled: {page_days} page-days, {contact_days} contact-days")
+        return {"pageDays": page_days, "contactDays": contact_days}
+
+    @staticmethod
+    def _portfolio_scope(portfolio: Optional[str]) -> Tuple[str, tuple]:
+        """Extra WHERE condition and parameters limiting a query to one portfolio"""
+        return ("AND portfolio = ?", (portfolio,)) if portfolio else ("", ())
+
+    @timed_operation
+    async def get_analytics_summary(self, days: int = 30, portfolio: Optional[str] = None) -> dict:
+        """Get analytics summary for the last N days from the daily rollups"""
+        try:
+            cutoff_day = to_text(day_start(datetime.utcnow() - timedelta(days=days)))
+            scope, scope_params = self._portfolio_scope(portfolio)
+            pages = await self.conn.execute_fetchall(
+                f"SELECT page, SUM(views) AS views FROM page_view_daily WHERE day >= ? {scope} "
+                "GROUP BY page ORDER BY views DESC",
+                (cutoff_day, *scope_params)
+            )
+            contacts = await self.conn.execute_fetchall(
+                f"SELECT COALESCE(SUM(contacts), 0) AS n FROM contact_daily WHERE day >= ? {scope}",
+                (cutoff_day, *scope_params)
+            )
+            return summary_result(
+                days,
+                sum(row["views"] for row in pages),
+                contacts[0]["n"],
+                [{"page": row["page"], "views": row["views"]} for row in pages[:10]]
+            )
+        except Exception as e:
+            logger.error(f"Error getting analytics summary: {e}")
+            return {}
+
+    @timed_operation
+    async def page_view_window_stats(
+        self, windows: List[int], bucket: str, top: int, portfolio: Optional[str] = None
+    ) -> dict:
+        """Per-window stats and a time series over the widest window"""
+        try:
+            now = datetime.utcnow()
+            scope, scope_params = self._portfolio_scope(portfolio)
+            cutoffs = {days: to_text(now - timedelta(days=days)) for days in windows}
+            oldest = min(cutoffs.values())
+            # Hour buckets keep "YYYY-MM-DDTHH", day buckets "YYYY-MM-DD"
+            prefix = 13 if bucket == "hour" else 10
+            series = await self.conn.execute_fetchall(
+                f"SELECT substr(timestamp, 1, {prefix}) AS bucket, COUNT(*) AS views "
+                f"FROM page_views WHERE timestamp >= ? {scope} GROUP BY 1 ORDER BY 1",
+                (oldest, *scope_params)
+            )
+            stats = {}
+            for days, cutoff in cutoffs.items():
+                total = await self.conn.execute_fetchall(
+                    f"SELECT COUNT(*) AS n FROM page_views WHERE timestamp >= ? {scope}", (cutoff, *scope_params)
+                )
+                pages = await self.conn.execute_fetchall(
+                    f"SELECT page, COUNT(*) AS views FROM page_views WHERE timestamp >= ? {scope} "
+                    "GROUP BY page ORDER BY views DESC LIMIT ?",
+                    (cutoff, *scope_params, top)
+                )
+                referrers = await self.conn.execute_fetchall(
+                    "SELECT referrer_host(referrer) AS referrer, COUNT(*) AS views FROM page_views "
+                    f"WHERE timestamp >= ? {scope} AND referrer IS NOT NULL AND referrer != '' "
+                    "GROUP BY 1 ORDER BY views DESC LIMIT ?",
+                    (cutoff, *scope_params, top)
+                )
+                stats[days] = {
+                    "totalViews": total[0]["n"],
+                    "topPages": [{"page": row["page"], "views": row["views"]} for row in pages],
+                    "topReferrers": [
+                        {"referrer": row["referrer"], "views": row["views"]} for row in referrers
+                    ]
+                }
+            bucket_format = "%Y-%m-%dT%H" if bucket == "hour" else "%Y-%m-%d"
+            return {
+                "windows": stats,
+                "series": [
+                    {"start": datetime.strptime(row["bucket"], bucket_format), "views": row["views"]}
+                    for row in series
+                ]
+            }
+        except Exception as e:
+            logger.error(f"Error computing page view window stats: {e}")
+            return {}
+
+    @timed_operation
+    async def contact_window_stats(self, windows: List[int], portfolio: Optional[str] = None) -> Dict[int, int]:
+        """Submission counts per window in one query"""
+        try:
+            now = datetime.utcnow()
+            scope, scope_params = self._portfolio_scope(portfolio)
+            cutoffs = [to_text(now - timedelta(days=days)) for days in windows]
+            columns = ", ".join(
+                f"SUM(CASE WHEN timestamp >= ? THEN 1 ELSE 0 END) AS w{i}" for i in range(len(windows))
+            )
+            rows = await self.conn.execute_fetchall(
+                f"SELECT {columns} FROM contact_submissions WHERE timestamp >= ? {scope}",
+                [*cutoffs, min(cutoffs), *scope_params]
+            )
+            return {days: rows[0][f"w{i}"] or 0 for i, days in enumerate(windows)}
+        except Exception as e:
+            logger.error(f"Error computing contact window stats: {e}")
+            return {}
@@ -0,0 +1,319 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import logging
+
+from models import DEFAULT_PORTFOLIO, PortfolioData, ContactSubmission, ContactSubmissionSummary, PageView
+from cache import portfolio_cache
+from metrics import timed_operation
+from sketches import ALL_PORTFOLIOS, TrafficSketch, merge_all, sketch_page_views
+
+logger = logging.getLogger(__name__)
+
+# Filtered counts stop here; beyond it the total is reported as a lower bound
+COUNT_ESTIMATE_CAP = 1000
+
+def day_start(moment: datetime) -> datetime:
+    """Truncate a timestamp to midnight (UTC), the granularity of the rollups"""
+    return datetime(moment.year, moment.month, moment.day)
+
+def bucket_start(moment: datetime, bucket: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day"""
+    if bucket == "hour":
+        return datetime(moment.year, moment.month, moment.day, moment.hour)
+    return day_start(moment)
+
+def summary_result(days: int, total_views: int, total_contacts: int, top_pages: List[dict]) -> dict:
+    """Shape of the /api/analytics/summary response, shared by every backend"""
+    return {
+        "totalViews": total_views,
+        "totalContacts": total_contacts,
+        "topPages": top_pages[:10],
+        "period": f"Last {days} days"
+    }
+
+class StorageBackend(ABC):
+    """Every storage operation the API needs.
+
+    Portfolios are keyed by slug. Contact submissions and page views carry
+    the slug of the portfolio they belong to, and every read of them takes
+    an optional ``portfolio`` filter; ``None`` spans all portfolios.
+
+    Backends follow the conventions of the original Mongo implementation:
+    read and write operations log failures and return ``None``, ``False``,
+    ``[]`` or ``{}`` rather than raising, while lifecycle and maintenance
+    methods (connect, migrate, backfill_rollups) raise.
+    """
+
+    name = "abstract"
+
+    # Lifecycle
+    @abstractmethod
+    async def connect(self):
+        """Open the connection to the store"""
+
+    @abstractmethod
+    async def disconnect(self):
+        """Close the connection to the store"""
+
+    async def migrate(self):
+        """Bring indexes and schema up to date"""
+
+    async def warm_up(self):
+        """Open connections ahead of traffic"""
+
+    @abstractmethod
+    async def ping(self) -> float:
+        """Round-trip a trivial command; returns latency in milliseconds"""
+
+    def pool_snapshot(self) -> dict:
+        return {}
+
+    async def readiness(self) -> dict:
+        """Check the store answers and report connection statistics"""
+        try:
+            latency = await self.ping()
+            return {"ready": True, "backend": self.name, "pingMs": round(latency, 2), "pool": self.pool_snapshot()}
+        except Exception as e:
+            logger.warning(f"Readiness ping failed: {e}")
+            return {"ready": False, "backend": self.name, "error": type(e).__name__, "pool": self.pool_snapshot()}
+
+    def _portfolio_changed(self, slug: str):
+        """Called by backends after a successful portfolio write"""
+        portfolio_cache.invalidate(slug)
+
+    # Portfolio Data Operations
+    @abstractmethod
+    async def get_portfolio_data(self, slug: str = DEFAULT_PORTFOLIO) -> Optional[PortfolioData]:
+        """Get the portfolio with this slug, including its revision token"""
+
+    @abstractmethod
+    async def upsert_portfolio_data(self, portfolio: PortfolioData) -> bool:
+        """Insert or update the portfolio with ``portfolio.slug``, giving it a new revision token"""
+
+    @abstractmethod
+    async def get_portfolio_revisions(self, slugs: List[str]) -> Dict[str, Optional[str]]:
+        """Revision tokens of several portfolios in one query, without reading the documents.
+
+        Slugs with no portfolio are left out; a portfolio written before
+        revision tokens maps to ``None``. Returns ``{}`` if the store could
+        not be reached.
+        """
+
+    def watch_portfolio(self) -> AsyncIterator[Optional[Tuple[str, Optional[str]]]]:
+        """Yield ``(slug, revision)`` after every portfolio write from any process.
+
+        ``None`` is yielded whenever callers should re-check every portfolio
+        they hold: once following (from then on no write is missed) and for
+        changes that don't say which portfolio they touched. Raises
+        NotImplementedError when the store can't push changes, in which case
+        callers poll ``get_portfolio_revisions`` instead.
+        """
+        raise NotImplementedError(f"{self.name} storage can't push portfolio changes")
+
+    # Contact Submission Operations
+    @abstractmethod
+    async def create_contact_submission(self, submission: ContactSubmission) -> bool:
+        """Create a new contact submission and count it in the daily rollups.
+
+        A submission whose id is already stored counts as created (and is not
+        counted again), so the contact queue can safely redeliver.
+        """
+
+    @abstractmethod
+    async def get_contact_submissions(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple[datetime, str]] = None,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        include_message: bool = False,
+        portfolio: Optional[str] = None
+    ) -> Tuple[List[ContactSubmissionSummary], bool]:
+        """Get one page of submissions ordered by (timestamp, id) descending,
+        starting after a keyset position. Returns the page and whether more follow.
+        """
+
+    @abstractmethod
+    async def estimate_contact_submissions(
+        self,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> Tuple[Optional[int], bool]:
+        """Estimate matching submissions; the flag marks the count as a lower bound"""
+
+    @abstractmethod
+    def iter_contact_submissions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        status: Optional[str] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream raw submission documents oldest first"""
+
+    @abstractmethod
+    async def count_contact_submissions(self, start: datetime, end: datetime) -> int:
+        """Number of submissions timestamped in [start, end). Raises on failure."""
+
+    @abstractmethod
+    async def delete_contact_submissions(self, start: datetime, end: datetime, limit: int) -> int:
+        """Delete up to ``limit`` submissions timestamped in [start, end); returns how many.
+
+        The daily rollups keep counting them. Raises on failure.
+        """
+
+    @abstractmethod
+    async def update_submission_status(self, submission_id: str, status: str) -> bool:
+        """Update contact submission status"""
+
+    @abstractmethod
+    async def get_submission_statuses(self, submission_ids: List[str]) -> Dict[str, str]:
+        """Current status of each of the given submissions that exists. Raises on failure."""
+
+    @abstractmethod
+    async def set_submission_statuses(self, changes: List[Tuple[str, str, str]]) -> int:
+        """Apply (id, expected status, new status) changes in one unordered write.
+
+        A change only applies while the submission is still in the expected
+        status. Returns how many applied; raises on failure.
+        """
+
+    @abstractmethod
+    async def set_matching_submission_statuses(
+        self,
+        status: str,
+        from_statuses: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company: Optional[str] = None,
+        portfolio: Optional[str] = None
+    ) -> int:
+        """Move every matching submission in one of ``from_statuses`` to ``status``.
+
+        Returns how many changed; raises on failure.
+        """
+
+    # Analytics Operations
+    @timed_operation
+    async def log_page_view(self, page_view: PageView) -> bool:
+        """Log a page view for analytics"""
+        return await self.log_page_views([page_view])
+
+    @abstractmethod
+    async def log_page_views(self, page_views: List[PageView]) -> bool:
+        """Log a batch of page views and add them to the daily rollups and sketches"""
+
+    @abstractmethod
+    def iter_page_views(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 1000,
+        portfolio: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """Stream raw page view documents oldest first"""
+
+    @abstractmethod
+    async def count_page_views(self, start: datetime, end: datetime) -> int:
+        """Number of raw page views that ``delete_page_views`` over [start, end) would remove.
+
+        Raises on failure.
+        """
+
+    @abstractmethod
+    async def delete_page_views(self, start: datetime, end: datetime, limit: int) -> int:
+        """Delete up to about ``limit`` raw page views timestamped in [start, end); returns how many.
+
+        The daily rollups and traffic sketches keep counting them. Raises on failure.
+        """
+
+    @abstractmethod
+    async def backfill_rollups(self) -> dict:
+        """Rebuild the daily counters from raw page views and contacts.
+
+        Only the days (per portfolio) that still have raw records are
+        rebuilt; the counters of days whose records were archived and
+        deleted are left as they are.
+        """
+
+    async def bucket_page_views(self, drop_source: bool = False) -> dict:
+        """Move raw page views into the bucketed layout (PAGE_VIEW_STORAGE=buckets).
+
+        Raises NotImplementedError when the store has a single layout.
+        """
+        raise NotImplementedError(f"{self.name} storage has a single page view layout")
+
+    @abstractmethod
+    async def load_traffic_sketches(self, since: datetime, portfolio: str) -> Dict[datetime, TrafficSketch]:
+        """Daily traffic sketches of ``portfolio`` (or ALL_PORTFOLIOS) from the day ``since`` on, by day.
+
+        Raises on failure, unlike the other reads, so callers can tell an
+        empty window from an unreachable store.
+        """
+
+    @abstractmethod
+    async def merge_traffic_sketches(self, sketches: Dict[Tuple[str, datetime], TrafficSketch]) -> bool:
+        """Merge sketches keyed by (portfolio, day) into the stored ones"""
+
+    @abstractmethod
+    async def clear_traffic_sketches(self):
+        """Delete every stored traffic sketch"""
+
+    @timed_operation
+    async def get_traffic_sketch(self, days: int, portfolio: Optional[str] = None) -> Optional[TrafficSketch]:
+        """Unique visitors and top referrers over the last N days, merged from
+        one sketch per day whatever the traffic; ``None`` on failure"""
+        try:
+            since = day_start(datetime.utcnow() - timedelta(days=days))
+            sketches = await self.load_traffic_sketches(since, portfolio or ALL_PORTFOLIOS)
+            return merge_all(sketches.values())
+        except Exception as e:
+            logger.error(f"Error loading traffic sketches: {e}")
+            return None
+
+    async def rebuild_traffic_sketches(self, batch_size: int = 10000) -> dict:
+        """Recompute every traffic sketch from the raw page views"""
+        await self.clear_traffic_sketches()
+        batch, views = [], 0
+        async for doc in self.iter_page_views(batch_size=batch_size):
+            batch.append(PageView.model_construct(**doc))
+            if len(batch) >= batch_size:
+                await self._merge_or_raise(batch)
+                views += len(batch)
+                batch = []
+        if batch:
+            await self._merge_or_raise(batch)
+            views += len(batch)
+        logger.info(f"Traffic sketches rebuilt from {views} page views")
+        return {"pageViews": views}
+
+    async def _merge_or_raise(self, page_views: List[PageView]):
+        if not await self.merge_traffic_sketches(sketch_page_views(page_views)):
+            raise RuntimeError("traffic sketches could not be stored")
+
+    @abstractmethod
+    async def get_analytics_summary(self, days: int = 30, portfolio: Optional[str] = None) -> dict:
+        """Get analytics summary for the last N days from the daily rollups"""
+
+    @abstractmethod
+    async def page_view_window_stats(
+        self, windows: List[int], bucket: str, top: int, portfolio: Optional[str] = None
+    ) -> dict:
+        """Per-window page view stats and a time series over the widest window.
+
+        Returns ``{"windows": {days: {"totalViews", "topPages", "topReferrers"}},
+        "series": [{"start": datetime, "views": n}]}``, or ``{}`` on failure.
+        Referrers are counted by host, as ``sketches.referrer_host`` gives it,
+        like the summary's.
+        """
+
+    @abstractmethod
+    async def contact_window_stats(self, windows: List[int], portfolio: Optional[str] = None) -> Dict[int, int]:
+        """Submission counts per window, or ``{}`` on failure"""
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Load-generation benchmark for Sudhanshu's Portfolio backend
+Drives weighted scenarios concurrently and reports RPS and p50/p95/p99 per endpoint
+
+Usage:
+    # In-process against the ASGI app with the in-memory storage backend
+    python backend_benchmark.py --duration 30 --concurrency 50 --json results.json
+
+    # In-process against a local Mongo (MONGO_URL / DB_NAME from backend/.env)
+    python backend_benchmark.py --storage mongo
+
+    # Against a running server, e.g. a local uvicorn
+    python backend_benchmark.py --url http://localhost:8001 --duration 30
+
+    # Compare with an earlier run
+    python backend_benchmark.py --compare baseline.json
+
+    # Per-operation CPU cost of the response serialization paths
+    python backend_benchmark.py --micro
+
+    # Cold-start time, per lifespan phase, over 10 fresh processes
+    python backend_benchmark.py --startup 10 --storage sqlite
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+# Scenario name -> default weight (share of requests)
+DEFAULT_WEIGHTS = {
+    "portfolio": 70,
+    "portfolio_revalidate": 10,
+    "page_view": 15,
+    "contact": 1,
+    "analytics_summary": 4,
+}
+
+PAGES = ["/", "/#about", "/#experience", "/#projects", "/#skills", "/#contact"]
+REFERRERS = ["https://www.google.com/", "https://www.linkedin.com/", None]
+
+
+class Scenario:
+    """One kind of request the load generator can issue"""
+
+    def __init__(self, name: str, method: str, path: str, body=None, headers=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers or {}
+
+    def build(self, state: dict) -> dict:
+        body = self.body(state) if callable(self.body) else self.body
+        headers = self.headers(state) if callable(self.headers) else self.headers
+        return {"method": self.method, "url": self.path, "json": body, "headers": headers}
+
+
+def build_scenarios() -> Dict[str, Scenario]:
+    return {
+        "portfolio": Scenario("portfolio", "GET", "/api/portfolio", headers={"Accept-Encoding": "gzip, br"}),
+        "portfolio_section": Scenario(
+            "portfolio_section", "GET", "/api/portfolio/personal", headers={"Accept-Encoding": "gzip, br"}
+        ),
+        "portfolio_revalidate": Scenario(
+            "portfolio_revalidate", "GET", "/api/portfolio",
+            headers=lambda state: {"If-None-Match": state.get("etag", '"none"'), "Accept-Encoding": "gzip, br"}
+        ),
+        "page_view": Scenario(
+            "page_view", "POST", "/api/analytics/page-view",
+            body=lambda state: {"page": random.choice(PAGES), "referrer": random.choice(REFERRERS)}
+        ),
+        "contact": Scenario(
+            "contact", "POST", "/api/contact",
+            body=lambda state: {
+                "name": "Load Test",
+                "email": "load.test@example.com",
+                "company": "Benchmark Inc",
+                "message": f"Benchmark message {random.getrandbits(64):x} - please ignore."
+            }
+        ),
+        "analytics_summary": Scenario("analytics_summary", "GET", "/api/analytics/summary?days=30"),
+        "search": Scenario("search", "GET", "/api/search?q=power%20bi&prefix=true"),
+    }
+
+
+def parse_weights(spec: Optional[str]) -> Dict[str, int]:
+    if not spec:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class LoadGenerator:
+    def __init__(self, client: httpx.AsyncClient, weights: Dict[str, int], concurrency: int,
+                 duration: float, max_requests: Optional[int]):
+        self.client = client
+        self.scenarios = build_scenarios()
+        unknown = set(weights) - set(self.scenarios)
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {sorted(unknown)}")
+        self.names = [name for name, weight in weights.items() if weight > 0]
+        self.weights = [weights[name] for name in self.names]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.latencies: Dict[str, List[float]] = {name: [] for name in self.names}
+        self.statuses: Dict[str, Dict[str, int]] = {name: {} for name in self.names}
+        self.errors: Dict[str, int] = {name: 0 for name in self.names}
+        self.state = {}
+        self.issued = 0
+
+    async def prime(self):
+        """Fetch the portfolio once so revalidation requests carry a real ETag"""
+        response = await self.client.get("/api/portfolio", headers={"Accept-Encoding": "gzip, br"})
+        if "etag" in response.headers:
+            self.state["etag"] = response.headers["etag"]
+
+    async def worker(self, deadline: float):
+        while time.perf_counter() < deadline:
+            if self.max_requests is not None:
+                if self.issued >= self.max_requests:
+                    return
+                self.issued += 1
+            name = random.choices(self.names, self.weights)[0]
+            request = self.scenarios[name].build(self.state)
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(**request)
+                elapsed = time.perf_counter() - started
+                status = str(response.status_code)
+                self.statuses[name][status] = self.statuses[name].get(status, 0) + 1
+                if response.status_code >= 400:
+                    self.errors[name] += 1
+                self.latencies[name].append(elapsed)
+            except httpx.HTTPError:
+                self.errors[name] += 1
+
+    async def run(self) -> dict:
+        await self.prime()
+        started = time.perf_counter()
+        deadline = started + self.duration
+        await asyncio.gather(*(self.worker(deadline) for _ in range(self.concurrency)))
+        wall = time.perf_counter() - started
+        return self.report(wall)
+
+    def report(self, wall: float) -> dict:
+        endpoints = {}
+        all_latencies = []
+        for name in self.names:
+            values = sorted(self.latencies[name])
+            all_latencies.extend(values)
+            endpoints[name] = self.summarize(values, wall, self.errors[name])
+            endpoints[name]["statuses"] = self.statuses[name]
+        overall = self.summarize(sorted(all_latencies), wall, sum(self.errors.values()))
+        return {"wallSeconds": round(wall, 3), "overall": overall, "endpoints": endpoints}
+
+    @staticmethod
+    def summarize(values: List[float], wall: float, errors: int) -> dict:
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "rps": round(len(values) / wall, 1) if wall else 0.0,
+            "p50Ms": round(percentile(values, 50) * 1000, 3),
+            "p95Ms": round(percentile(values, 95) * 1000, 3),
+            "p99Ms": round(percentile(values, 99) * 1000, 3),
+            "maxMs": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+
+
+async def run_in_process(args, weights) -> dict:
+    """Drive the ASGI app directly, running its lifespan around the load"""
+    # Must be set before the backend modules build the global database
+    os.environ["STORAGE_BACKEND"] = args.storage
+    # Every simulated client shares one address; keep the limiters in the path but out of the way
+    os.environ.setdefault("RATE_LIMIT_CONTACT", "1000000/1")
+    os.environ.setdefault("RATE_LIMIT_PAGE_VIEW", "1000000/1")
+    # A fresh contact queue, so seeded messages aren't deduped against an earlier run
+    os.environ.setdefault("CONTACT_QUEUE_PATH", os.path.join(tempfile.mkdtemp(), "contact_queue.db"))
+    sys.path.insert(0, str(BACKEND_DIR))
+    from server import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            generator = LoadGenerator(client, weights, args.concurrency, args.duration, args.requests)
+            return await generator.run()
+
+
+async def run_remote(args, weights) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        generator = LoadGenerator(client, weights, args.concurrency, args.duration, args.requests)
+        return await generator.run()
+
+
+def time_per_call(func, min_seconds: float = 0.2, repeats: int = 5) -> float:
+    """Best-of-N seconds per call, with enough calls per run to be measurable"""
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        if time.perf_counter() - started >= min_seconds / repeats:
+            break
+        calls *= 2
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best
+
+
+def run_micro(args) -> dict:
+    """Time the old and new serialization paths for typical payloads, without I/O"""
+    os.environ["STORAGE_BACKEND"] = "memory"
+    sys.path.insert(0, str(BACKEND_DIR))
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from export import encode_line, _json_default
+    from metrics import TimedJSONResponse
+    from models import ContactSubmission, ContactSubmissionPage, ContactSubmissionSummary
+
+    docs = [
+        ContactSubmission(
+            name=f"Visitor {i}", email=f"visitor{i}@example.com", company="Benchmark Inc",
+            message="I would like to talk about a product leadership role. " * 4,
+            ipAddress="203.0.113.7", userAgent="Mozilla/5.0 (benchmark)"
+        ).model_dump()
+        for i in range(args.micro_rows)
+    ]
+    for doc in docs:
+        doc.pop("message")
+    now = datetime.utcnow()
+    analytics = {
+        "generatedAt": now,
+        "bucket": "day",
+        "windows": [
+            {"days": days, "totalViews": 1000 * days, "totalContacts": days,
+             "topPages": [{"page": page, "views": 100} for page in PAGES],
+             "topReferrers": [{"referrer": "https://www.google.com/", "views": 50}]}
+            for days in (7, 30, 90)
+        ],
+        "series": [{"start": now, "views": day} for day in range(90)],
+    }
+
+    def page_validated():
+        # Constructor per document, then FastAPI's response_model round trip
+        page = ContactSubmissionPage(
+            submissions=[ContactSubmissionSummary(**doc) for doc in docs],
+            count=len(docs), nextCursor=None, totalEstimate=len(docs), totalIsLowerBound=False
+        )
+        return JSONResponse(jsonable_encoder(ContactSubmissionPage.model_validate(page.model_dump()))).body
+
+    def page_trusted():
+        page = ContactSubmissionPage.model_construct(
+            submissions=[ContactSubmissionSummary.model_construct(**doc) for doc in docs],
+            count=len(docs), nextCursor=None, totalEstimate=len(docs), totalIsLowerBound=False
+        )
+        return TimedJSONResponse(page).body
+
+    pairs = {
+        f"contact_page_{args.micro_rows}": (page_validated, page_trusted),
+        "analytics_query": (
+            lambda: JSONResponse(jsonable_encoder(analytics)).body,
+            lambda: TimedJSONResponse(analytics).body,
+        ),
+        f"ndjson_{args.micro_rows}_rows": (
+            lambda: b"".join(
+                (json.dumps(doc, default=_json_default, separators=(",", ":")) + "\n").encode() for doc in docs
+            ),
+            lambda: b"".join(encode_line(doc) for doc in docs),
+        ),
+    }
+    results = {}
+    for name, (before, after) in pairs.items():
+        before_us = time_per_call(before) * 1e6
+        after_us = time_per_call(after) * 1e6
+        results[name] = {
+            "beforeUs": round(before_us, 1),
+            "afterUs": round(after_us, 1),
+            "speedup": round(before_us / after_us, 2) if after_us else None,
+        }
+    return {"micro": results}
+
+
+def print_micro(result: dict):
+    print("=" * 78)
+    print("SERIALIZATION MICROBENCHMARK (CPU per operation)")
+    print("=" * 78)
+    print(f"{'payload':<26}{'before us':>14}{'after us':>14}{'speedup':>10}")
+    for name, stats in result["micro"].items():
+        print(f"{name:<26}{stats['beforeUs']:>14}{stats['afterUs']:>14}{stats['speedup']:>9}x")
+
+
+async def measure_startup_child(storage: str) -> dict:
+    """Import the app and run its startup once; called in a fresh process"""
+    os.environ["STORAGE_BACKEND"] = storage
+    sys.path.insert(0, str(BACKEND_DIR))
+    started = time.perf_counter()
+    from server import app
+    imported = time.perf_counter() - started
+    async with app.router.lifespan_context(app):
+        timings = dict(app.state.startup_timings)
+    return {"import": imported, **timings}
+
+
+def run_startup(args) -> dict:
+    """Boot the app in fresh processes and report each phase's median and max"""
+    workdir = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        "CONTACT_QUEUE_PATH": os.path.join(workdir, "contact_queue.db"),
+        "STATIC_RENDER_DIR": os.path.join(workdir, "static_render"),
+        "SQLITE_PATH": os.path.join(workdir, "portfolio.db"),
+    }
+    runs: List[dict] = []
+    for _ in range(args.startup):
+        output = subprocess.check_output(
+            [sys.executable, __file__, "--startup-child", "--storage", args.storage],
+            env=env, text=True, stderr=subprocess.DEVNULL
+        )
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    phases = {}
+    for name in runs[0]:
+        values = sorted(run[name] for run in runs)
+        phases[name] = {
+            "medianMs": round(percentile(values, 50) * 1000, 2),
+            "maxMs": round(values[-1] * 1000, 2),
+        }
+    # The first boot seeds a fresh store; later ones find existing data
+    return {"storage": args.storage, "runs": len(runs), "firstRunMs": round(runs[0]["total"] * 1000, 2),
+            "phases": phases}
+
+
+def print_startup(result: dict):
+    print("=" * 78)
+    print(f"STARTUP ({result['storage']}, {result['runs']} processes, "
+          f"first boot {result['firstRunMs']} ms)")
+    print("=" * 78)
+    print(f"{'phase':<22}{'median ms':>14}{'max ms':>14}")
+    for name, stats in result["phases"].items():
+        print(f"{name:<22}{stats['medianMs']:>14}{stats['maxMs']:>14}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: dict):
+    print("=" * 78)
+    print(f"BENCHMARK RESULTS ({result['target']}, concurrency {result['concurrency']}, "
+          f"{result['wallSeconds']}s)")
+    print("=" * 78)
+    print(f"{'endpoint':<22}{'reqs':>8}{'errs':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(result["endpoints"].items()) + [("OVERALL", result["overall"])]
+    for name, stats in rows:
+        print(f"{name:<22}{stats['requests']:>8}{stats['errors']:>7}{stats['rps']:>10}"
+              f"{stats['p50Ms']:>10}{stats['p95Ms']:>10}{stats['p99Ms']:>10}")
+
+
+def print_comparison(result: dict, baseline: dict):
+    print("\nCOMPARED WITH", baseline.get("revision") or "baseline")
+    print(f"{'endpoint':<22}{'rps':>14}{'p50 ms':>16}{'p99 ms':>16}")
+    rows = list(result["endpoints"].items()) + [("OVERALL", result["overall"])]
+    for name, stats in rows:
+        before = baseline["overall"] if name == "OVERALL" else baseline["endpoints"].get(name)
+        if not before:
+            continue
+
+        def delta(key):
+            if not before[key]:
+                return "n/a"
+            return f"{(stats[key] - before[key]) / before[key] * 100:+.1f}%"
+
+        print(f"{name:<22}{delta('rps'):>14}{delta('p50Ms'):>16}{delta('p99Ms'):>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the portfolio backend")
+    parser.add_argument("--url", help="Base URL of a running server; omit to run in-process")
+    parser.add_argument("--storage", default=os.environ.get("STORAGE_BACKEND", "memory"),
+                        choices=["memory", "sqlite", "mongo"],
+                        help="Storage backend for in-process runs (default memory)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run (default 10)")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients (default 20)")
+    parser.add_argument("--weights", help="Scenario weights, e.g. portfolio=80,page_view=20")
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for scenario selection")
+    parser.add_argument("--micro", action="store_true",
+                        help="Time serialization paths in isolation instead of generating load")
+    parser.add_argument("--micro-rows", type=int, default=50,
+                        help="Documents per payload in the microbenchmark (default 50)")
+    parser.add_argument("--startup", type=int, metavar="N",
+                        help="Time application startup over N fresh processes instead of generating load")
+    parser.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_child:
+        print(json.dumps(asyncio.run(measure_startup_child(args.storage))))
+        return
+
+    if args.micro or args.startup:
+        result = run_micro(args) if args.micro else run_startup(args)
+        result.update({"revision": git_revision(), "timestamp": datetime.now().isoformat()})
+        (print_micro if args.micro else print_startup)(result)
+        if args.json_path:
+            with open(args.json_path, "w") as f:
+                json.dump(result, f, indent=2)
+            print(f"\nResults written to {args.json_path}")
+        return
+
+    random.seed(args.seed)
+    weights = parse_weights(args.weights)
+    runner = run_remote if args.url else run_in_process
+    result = asyncio.run(runner(args, weights))
+    result.update({
+        "target": args.url or f"in-process/{args.storage}",
+        "concurrency": args.concurrency,
+        "weights": weights,
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(),
+    })
+
+    print_report(result)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The backend is a flat set of modules; configure it before any is imported,
+# since several read their settings at import time
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+SCRATCH_DIR = Path(tempfile.mkdtemp(prefix="portfolio-tests-"))
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["CONTACT_QUEUE_PATH"] = str(SCRATCH_DIR / "contact_queue.db")
+os.environ["STATIC_RENDER_DIR"] = str(SCRATCH_DIR / "static_render")
+os.environ["ARCHIVE_DIR"] = str(SCRATCH_DIR / "archive")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["CACHE_COHERENCE"] = "off"
+os.environ["PAGE_VIEW_FLUSH_INTERVAL"] = "0.01"
+os.environ["ADMIN_TOKEN"] = "test-admin-token"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def database():
+    """The global in-memory store, emptied for each test"""
+    from cache import portfolio_cache
+    from database import database
+
+    database.__init__()
+    for slug in portfolio_cache.keys():
+        portfolio_cache.invalidate(slug)
+    return database
+
+
+@pytest.fixture
+async def client(database):
+    """HTTP client for the app, run through its startup and shutdown"""
+    import httpx
+    from server import app
+
+    # A fresh queue file per test, so dedupe keys don't leak between them
+    os.environ["CONTACT_QUEUE_PATH"] = str(SCRATCH_DIR / f"contact_queue-{os.urandom(4).hex()}.db")
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            yield http
@@ -0,0 +1,165 @@
+import asyncio
+import json
+
+import pytest
+
+from models import PORTFOLIO_SECTIONS
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(check, timeout: float = 2.0):
+    """Poll ``check`` until it returns something truthy; for background writers"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        result = await check()
+        if result or asyncio.get_running_loop().time() > deadline:
+            return result
+        await asyncio.sleep(0.02)
+
+
+async def test_liveness_and_readiness(client):
+    response = await client.get("/api/")
+    assert response.status_code == 200
+    assert response.json()["status"] == "healthy"
+
+    response = await client.get("/api/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+
+
+async def test_readiness_reports_503_when_the_store_is_down(client, database, monkeypatch):
+    async def failing_ping():
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(database, "ping", failing_ping)
+    response = await client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+
+async def test_portfolio_is_served_with_etag_and_revalidated(client):
+    response = await client.get("/api/portfolio", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.json()["slug"] == "default"
+    etag = response.headers["etag"]
+    assert "Server-Timing" in response.headers
+
+    response = await client.get("/api/portfolio", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+async def test_sections_and_sparse_fieldsets(client):
+    full = (await client.get("/api/portfolio")).json()
+    for section in PORTFOLIO_SECTIONS:
+        response = await client.get(f"/api/portfolio/{section}")
+        assert response.status_code == 200
+        assert response.json() == full[section]
+
+    response = await client.get("/api/portfolio", params={"fields": "personal,skills"})
+    assert set(response.json()) == {"personal", "skills"}
+    response = await client.get("/api/portfolio", params={"fields": "nope"})
+    assert response.status_code == 400
+
+
+async def test_portfolios_are_kept_apart_by_slug(client, database):
+    from portfolio_service import load_seed
+
+    other = load_seed(slug="other")
+    other.personal.name = "Someone Else"
+    assert await database.upsert_portfolio_data(other)
+
+    assert (await client.get("/api/portfolio/other/personal")).json()["name"] == "Someone Else"
+    assert (await client.get("/api/portfolio/personal")).json()["name"] != "Someone Else"
+    assert (await client.get("/api/portfolio/missing")).status_code == 404
+
+
+async def test_static_site_is_rendered(client):
+    response = await client.get("/api/site")
+    assert response.status_code == 200
+    assert response.text.startswith("<!DOCTYPE html>")
+    canonical = response.headers["link"].split(">")[0].lstrip("<")
+    assert (await client.get(canonical)).text == response.text
+
+
+async def test_search_and_suggest(client):
+    results = (await client.get("/api/search", params={"q": "product"})).json()
+    assert results["total"] > 0
+    assert all("<mark>" in hit["snippet"].lower() or hit["snippet"] for hit in results["hits"])
+    suggestions = (await client.get("/api/search/suggest", params={"q": "prod"})).json()
+    assert any(s["term"].lower().startswith("prod") for s in suggestions["suggestions"])
+
+
+async def test_contact_submission_is_queued_stored_and_deduplicated(client, database):
+    form = {"name": "Ada", "email": "ada@example.com", "message": "Hello, let's talk about a role."}
+    first = (await client.post("/api/contact", json=form)).json()
+    again = (await client.post("/api/contact", json=form)).json()
+    assert first["success"] and again["success"]
+    assert again["submissionId"] == first["submissionId"]
+
+    async def stored():
+        return (await client.get("/api/contact/submissions")).json()["submissions"]
+
+    submissions = await eventually(stored)
+    assert [s["id"] for s in submissions] == [first["submissionId"]]
+
+
+async def test_page_views_feed_the_summary_query_and_export(client):
+    for page in ("home", "home", "projects"):
+        response = await client.post(
+            "/api/analytics/page-view", json={"page": page, "referrer": "https://www.google.com/search?q=x"}
+        )
+        assert response.status_code == 200
+
+    async def summary():
+        body = (await client.get("/api/analytics/summary", params={"days": 7})).json()
+        return body if body["totalViews"] == 3 else None
+
+    body = await eventually(summary)
+    assert body["topPages"][0] == {"page": "home", "views": 2}
+    assert body["uniqueVisitors"] == 1
+
+    query = (await client.get("/api/analytics/query", params={"windows": "1,7"})).json()
+    assert [window["totalViews"] for window in query["windows"]] == [3, 3]
+    # Both count referrers by host
+    assert query["windows"][0]["topReferrers"] == body["topReferrers"] == [{"referrer": "www.google.com", "views": 3}]
+
+    export = await client.get("/api/export/page-views", params={"format": "ndjson"})
+    *rows, trailer = [json.loads(line) for line in export.text.splitlines()]
+    assert sorted(row["page"] for row in rows) == ["home", "home", "projects"]
+    assert trailer == {"_export": {"complete": True, "count": 3}}
+    csv = await client.get("/api/export/page-views", params={"format": "csv"})
+    lines = csv.text.splitlines()
+    assert lines[0].startswith("id,portfolio,page,timestamp")
+    assert len(lines) == 5
+    assert lines[-1] == "#export complete,count=3"
+
+
+async def test_metrics_count_requests_by_route(client):
+    await client.get("/api/portfolio")
+    metrics = (await client.get("/metrics")).text
+    assert 'route="/api/portfolio"' in metrics
+    assert "_bucket{" in metrics
+
+
+async def test_page_view_for_unknown_portfolio_is_rejected(client):
+    response = await client.post("/api/analytics/page-view", json={"page": "home", "portfolio": "missing"})
+    assert response.status_code == 400
+
+
+async def test_fieldsets_use_lighter_compression_than_the_full_body(client, monkeypatch):
+    import responses
+
+    levels = []
+    real_init = responses.RenderedBody.__init__
+
+    def init(self, body, levels_=responses.PRECOMPRESSED_LEVELS):
+        levels.append(levels_)
+        real_init(self, body, levels_)
+
+    monkeypatch.setattr(responses.RenderedBody, "__init__", init)
+    headers = {"Accept-Encoding": "br, gzip"}
+    assert (await client.get("/api/portfolio", headers=headers)).status_code == 200
+    assert (await client.get("/api/portfolio", params={"fields": "personal"}, headers=headers)).status_code == 200
+    assert (await client.get("/api/portfolio/skills", headers=headers)).status_code == 200
+    assert levels == [responses.PRECOMPRESSED_LEVELS, responses.ADHOC_LEVELS, responses.PRECOMPRESSED_LEVELS]
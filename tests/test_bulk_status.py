@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+
+from models import ContactSubmission
+
+pytestmark = pytest.mark.anyio
+
+URL = "/api/contact/submissions/status"
+
+
+@pytest.fixture
+def client(client):
+    """Client sending the admin token configured in conftest"""
+    client.headers["Authorization"] = "Bearer test-admin-token"
+    return client
+
+
+async def create(database, status="new", company=None):
+    submission = ContactSubmission(
+        name="Ada", email="ada@example.com", message="A message long enough",
+        company=company, status=status, timestamp=datetime(2024, 5, 1)
+    )
+    await database.create_contact_submission(submission)
+    return submission.id
+
+
+async def statuses(database, ids):
+    return await database.get_submission_statuses(ids)
+
+
+async def test_updates_by_id_report_each_outcome(client, database):
+    new, replied, read = await create(database), await create(database, "replied"), await create(database, "read")
+    response = await client.patch(URL, json={"updates": [
+        {"id": new, "status": "read"},
+        {"id": replied, "status": "new"},
+        {"id": read, "status": "read"},
+        {"id": "missing", "status": "spam"},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 1
+    assert [(r["outcome"], r["previousStatus"]) for r in body["results"]] == [
+        ("updated", "new"), ("invalid_transition", "replied"), ("unchanged", "read"), ("not_found", None)
+    ]
+    assert await statuses(database, [new, replied]) == {new: "read", replied: "replied"}
+
+
+async def test_concurrent_change_is_reported_as_conflict(client, database, monkeypatch):
+    submission_id = await create(database)
+    real_set = database.set_submission_statuses
+
+    async def changed_meanwhile(changes):
+        await database.update_submission_status(submission_id, "spam")
+        return await real_set(changes)
+
+    monkeypatch.setattr(database, "set_submission_statuses", changed_meanwhile)
+    body = (await client.patch(URL, json={"updates": [{"id": submission_id, "status": "archived"}]})).json()
+    assert body["updated"] == 0
+    assert body["results"][0]["outcome"] == "conflict"
+    assert await statuses(database, [submission_id]) == {submission_id: "spam"}
+
+
+async def test_filter_moves_only_submissions_that_may_transition(client, database):
+    acme_new = await create(database, company="Acme")
+    acme_replied = await create(database, "replied", company="Acme")
+    acme_spam = await create(database, "spam", company="Acme")
+    other = await create(database, company="Other")
+
+    body = (await client.patch(URL, json={"filter": {"company": "Acme"}, "status": "archived"})).json()
+    assert body["updated"] == 2
+    assert await statuses(database, [acme_new, acme_replied, acme_spam, other]) == {
+        acme_new: "archived", acme_replied: "archived", acme_spam: "spam", other: "new"
+    }
+
+    response = await client.patch(URL, json={"filter": {"status": "spam"}, "status": "archived"})
+    assert response.status_code == 400
+
+
+async def test_empty_filter_needs_all(client, database):
+    first, second = await create(database), await create(database)
+
+    response = await client.patch(URL, json={"filter": {}, "status": "read"})
+    assert response.status_code == 422
+    assert await statuses(database, [first, second]) == {first: "new", second: "new"}
+
+    response = await client.patch(URL, json={"filter": {"all": True}, "status": "read"})
+    assert response.json()["updated"] == 2
+
+
+async def test_malformed_updates_are_rejected(client, database):
+    submission_id = await create(database)
+    for body in (
+        {"updates": [{"id": submission_id, "status": "deleted"}]},
+        {"updates": [{"id": submission_id, "status": "read"}] * 2},
+        {"updates": [{"id": submission_id, "status": "read"}], "filter": {"all": True}, "status": "read"},
+        {"status": "read"},
+    ):
+        assert (await client.patch(URL, json=body)).status_code == 422
+
+
+async def test_status_changes_need_the_admin_token(client, database, monkeypatch):
+    submission_id = await create(database)
+    body = {"filter": {"all": True}, "status": "spam"}
+
+    del client.headers["Authorization"]
+    assert (await client.patch(URL, json=body)).status_code == 401
+    response = await client.patch(URL, json=body, headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+    import auth
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", None)
+    response = await client.patch(URL, json=body, headers={"Authorization": "Bearer test-admin-token"})
+    assert response.status_code == 403
+    assert await statuses(database, [submission_id]) == {submission_id: "new"}
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from cache import TTLCache, VersionedCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = VersionedCache("test")
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(cache.get("key", loader) for _ in range(10)))
+    assert results == ["value"] * 10
+    assert calls == 1
+    assert await cache.get("key", loader) == "value"
+    assert calls == 1
+
+
+async def test_load_invalidated_midway_is_returned_but_not_stored():
+    cache = VersionedCache("test")
+    release = asyncio.Event()
+
+    async def slow_loader():
+        await release.wait()
+        return "stale"
+
+    pending = asyncio.ensure_future(cache.get("key", slow_loader))
+    await asyncio.sleep(0)
+    cache.invalidate("key")
+    release.set()
+    assert await pending == "stale"
+    assert cache.peek("key") is None
+
+    async def fresh_loader():
+        return "fresh"
+
+    assert await cache.get("key", fresh_loader) == "fresh"
+
+
+async def test_misses_are_not_cached():
+    cache = VersionedCache("test")
+    values = iter([None, "created"])
+
+    async def loader():
+        return next(values)
+
+    assert await cache.get("key", loader) is None
+    assert await cache.get("key", loader) == "created"
+
+
+async def test_invalidation_notifies_listeners():
+    cache = VersionedCache("test")
+    seen = []
+    cache.subscribe(lambda key, version: seen.append((key, version)))
+    cache.invalidate("a")
+    cache.invalidate("b")
+    assert seen == [("a", 1), ("b", 2)]
+
+
+async def test_least_recently_used_entries_are_evicted_over_budget():
+    cache = VersionedCache("test", max_bytes=250)
+
+    def loader(value):
+        async def load():
+            return value
+        return load
+
+    await cache.get("a", loader("x" * 100))
+    await cache.get("b", loader("y" * 100))
+    await cache.get("a", loader("unused"))  # a is now the most recent
+    await cache.get("c", loader("z" * 100))
+    assert sorted(cache.keys()) == ["a", "c"]
+    assert cache.bytes == 200
+
+
+async def test_derived_values_count_towards_the_budget():
+    cache = VersionedCache("test", max_bytes=1000)
+
+    async def load():
+        return "x" * 100
+
+    entry = await cache.get_entry("a", load)
+    assert entry.derive("upper", str.upper) == "X" * 100
+    assert cache.bytes == 200
+
+
+async def test_derived_values_in_a_group_are_capped():
+    cache = VersionedCache("test", max_bytes=1000)
+
+    async def load():
+        return "x" * 10
+
+    entry = await cache.get_entry("a", load)
+    for n in (1, 2, 3):
+        entry.derive(("repeat", n), lambda value: value * n, group="repeat", limit=2)
+    entry.derive("upper", str.upper)
+    # The oldest of the group made way; values outside it are unaffected
+    assert cache.bytes == 10 + 20 + 30 + 10
+    calls = []
+    entry.derive(("repeat", 1), lambda value: calls.append(1) or value, group="repeat", limit=2)
+    assert calls == [1]
+    assert entry.derive(("repeat", 3), lambda value: calls.append(3), group="repeat", limit=2) == "x" * 30
+    assert calls == [1]
+
+
+async def test_ttl_cache_expires_entries():
+    cache = TTLCache("test", ttl=0.01)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert await cache.get("key", loader) == 1
+    assert await cache.get("key", loader) == 1
+    await asyncio.sleep(0.02)
+    assert await cache.get("key", loader) == 2
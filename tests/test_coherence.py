@@ -0,0 +1,27 @@
+import uuid
+
+import pytest
+
+from cache import portfolio_cache
+from coherence import PortfolioCoherence
+from portfolio_service import cached_entry
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_resync_drops_portfolios_changed_elsewhere(client, database):
+    await client.get("/api/portfolio")
+    entry = portfolio_cache.peek("default")
+    assert entry is not None
+
+    # Nothing changed: the cached copy stays
+    await PortfolioCoherence().resync("poll")
+    assert portfolio_cache.peek("default") is entry
+
+    # Another worker's write changes only the stored revision as far as we can see
+    database.portfolios["default"]["revision"] = uuid.uuid4().hex
+    await PortfolioCoherence().resync("poll")
+    assert portfolio_cache.peek("default") is None
+
+    reloaded = await cached_entry("default")
+    assert reloaded.value.revision == database.portfolios["default"]["revision"]
@@ -0,0 +1,101 @@
+import logging
+
+import pytest
+
+from contact_queue import ContactQueue, IdempotencyKeyReused
+from models import ContactSubmission
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setenv("CONTACT_QUEUE_PATH", str(tmp_path / "queue.db"))
+    monkeypatch.setenv("CONTACT_QUEUE_MAX_ATTEMPTS", "3")
+    queue = ContactQueue()
+    queue.open()
+    yield queue
+    queue._conn.close()
+
+
+async def deliver_due(queue):
+    """Make every job due now and run one delivery attempt"""
+    queue._conn.execute("UPDATE contact_jobs SET available_at = 0")
+    await queue._deliver(*queue._claim())
+
+
+def submission():
+    return ContactSubmission(name="Ada", email="ada@example.com", message="A message long enough")
+
+
+async def test_job_is_dead_lettered_after_max_attempts(queue, database, monkeypatch, caplog):
+    async def unavailable(submission):
+        raise ConnectionError("database went away")
+
+    monkeypatch.setattr(database, "create_contact_submission", unavailable)
+    submission_id, _ = await queue.submit(submission())
+    for _ in range(2):
+        await deliver_due(queue)
+        assert queue.pending() == 1
+    with caplog.at_level(logging.ERROR):
+        await deliver_due(queue)
+    assert (queue.pending(), queue.dead_letters()) == (0, 1)
+    assert "database went away" in caplog.text
+
+    monkeypatch.undo()
+    assert queue.requeue_dead_letters() == 1
+    await deliver_due(queue)
+    assert (queue.pending(), queue.dead_letters()) == (0, 0)
+    stored, _ = await database.get_contact_submissions()
+    assert [s.id for s in stored] == [submission_id]
+
+
+async def test_unreadable_payload_is_dead_lettered_at_once(queue, database):
+    queue._conn.execute(
+        "INSERT INTO contact_jobs (id, payload, available_at) VALUES ('broken', '{\"name\": ', 0)"
+    )
+    await queue._deliver(*queue._claim())
+    assert (queue.pending(), queue.dead_letters()) == (0, 1)
+    error = queue._conn.execute("SELECT error FROM contact_dead_letters").fetchone()[0]
+    assert error.startswith("unreadable payload")
+
+
+async def test_idempotency_keys_are_scoped_to_the_client(queue):
+    first_id, duplicate = await queue.submit(submission(), "key-1", client="1.1.1.1")
+    assert not duplicate
+    assert await queue.submit(submission(), "key-1", client="1.1.1.1") == (first_id, True)
+    other_id, duplicate = await queue.submit(submission(), "key-1", client="2.2.2.2")
+    assert not duplicate and other_id != first_id
+
+
+async def test_reused_key_with_another_body_is_refused(queue):
+    await queue.submit(submission(), "key-1", client="1.1.1.1")
+    changed = ContactSubmission(name="Ada", email="ada@example.com", message="Something else entirely")
+    with pytest.raises(IdempotencyKeyReused):
+        await queue.submit(changed, "key-1", client="1.1.1.1")
+    assert queue.pending() == 1
+
+
+async def test_expired_key_never_loses_a_new_message(queue, database):
+    first_id, _ = await queue.submit(submission(), "key-1", client="1.1.1.1")
+    await deliver_due(queue)
+    queue._conn.execute("UPDATE contact_idempotency SET expires_at = 0")
+    queue._prune()
+
+    later = ContactSubmission(name="Ada", email="ada@example.com", message="A later, different message")
+    second_id, duplicate = await queue.submit(later, "key-1", client="1.1.1.1")
+    assert not duplicate and second_id != first_id
+    await deliver_due(queue)
+    stored, _ = await database.get_contact_submissions()
+    assert {s.id for s in stored} == {first_id, second_id}
+
+
+async def test_reused_key_is_answered_with_422(client):
+    form = {"name": "Ada", "email": "ada@example.com", "message": "Hello, let's talk about a role."}
+    headers = {"Idempotency-Key": "abc"}
+    first = await client.post("/api/contact", json=form, headers=headers)
+    assert first.status_code == 200
+    again = await client.post("/api/contact", json=form, headers=headers)
+    assert again.json()["submissionId"] == first.json()["submissionId"]
+    changed = await client.post("/api/contact", json={**form, "message": "A different message now"}, headers=headers)
+    assert changed.status_code == 422
@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from export import csv_stream, ndjson_stream
+
+pytestmark = pytest.mark.anyio
+
+
+async def failing_after(n):
+    for i in range(n):
+        yield {"id": str(i), "page": "home"}
+    raise ConnectionError("cursor lost")
+
+
+async def collect(stream) -> str:
+    return b"".join([chunk async for chunk in stream]).decode()
+
+
+async def test_ndjson_export_cut_short_says_so():
+    *rows, trailer = [json.loads(line) for line in (await collect(ndjson_stream(failing_after(2)))).splitlines()]
+    assert rows == [{"id": "0", "page": "home"}, {"id": "1", "page": "home"}]
+    assert trailer == {"_export": {"complete": False, "count": 2, "error": "export failed"}}
+
+
+async def test_csv_export_cut_short_says_so():
+    lines = (await collect(csv_stream(failing_after(2), ["id", "page"]))).splitlines()
+    assert lines == ["id,page", "0,home", "1,home", "#export incomplete,count=2,error=export failed"]
+
+
+async def test_empty_export_is_complete():
+    async def nothing():
+        return
+        yield
+
+    assert await collect(ndjson_stream(nothing())) == '{"_export":{"complete":true,"count":0}}\n'
+    assert (await collect(csv_stream(nothing(), ["id"]))).splitlines() == ["id", "#export complete,count=0"]
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from ingest import PageViewBuffer
+from models import PageView
+
+pytestmark = pytest.mark.anyio
+
+
+async def stored_pages(database):
+    return sorted([doc["page"] async for doc in database.iter_page_views()])
+
+
+async def test_views_are_flushed_in_batches(database):
+    buffer = PageViewBuffer()
+    await buffer.start()
+    for page in ("home", "projects", "about"):
+        assert await buffer.submit(PageView(page=page))
+    await asyncio.sleep(0.2)
+    assert await stored_pages(database) == ["about", "home", "projects"]
+    assert buffer.pending == 0
+    await buffer.stop()
+
+
+async def test_stop_writes_out_what_is_buffered(database):
+    buffer = PageViewBuffer()
+    await buffer.start()
+    buffer.flush_interval = 60
+    await buffer.submit(PageView(page="home"))
+    await asyncio.sleep(0.05)
+    await buffer.submit(PageView(page="projects"))
+    # The flusher is parked mid-batch waiting for more; stopping must not hang
+    await asyncio.wait_for(buffer.stop(), 1)
+    assert await stored_pages(database) == ["home", "projects"]
+
+
+def dropped(reason):
+    return REGISTRY.get_sample_value("page_views_dropped_total", {"reason": reason}) or 0
+
+
+def failing_log_page_views(database, failures):
+    real_log_page_views = database.log_page_views
+    calls = []
+
+    async def flaky_log_page_views(page_views):
+        calls.append(len(page_views))
+        if len(calls) <= failures:
+            raise ConnectionError("database went away")
+        return await real_log_page_views(page_views)
+
+    return flaky_log_page_views, calls
+
+
+async def test_a_failed_flush_is_retried_once(database, monkeypatch):
+    flaky_log_page_views, calls = failing_log_page_views(database, failures=1)
+    monkeypatch.setattr(database, "log_page_views", flaky_log_page_views)
+    buffer = PageViewBuffer()
+    await buffer.start()
+    buffer.retry_delay = 0.01
+    before = dropped("flush_failed")
+    await buffer.submit(PageView(page="home"))
+    await asyncio.sleep(0.2)
+    assert calls == [1, 1]
+    assert await stored_pages(database) == ["home"]
+    assert dropped("flush_failed") == before
+    await buffer.stop()
+
+
+async def test_flusher_survives_a_failed_flush(database, monkeypatch):
+    flaky_log_page_views, calls = failing_log_page_views(database, failures=2)
+    monkeypatch.setattr(database, "log_page_views", flaky_log_page_views)
+    buffer = PageViewBuffer()
+    await buffer.start()
+    buffer.retry_delay = 0.01
+    before = dropped("flush_failed")
+    await buffer.submit(PageView(page="lost"))
+    await asyncio.sleep(0.1)
+    await buffer.submit(PageView(page="home"))
+    await asyncio.sleep(0.1)
+    assert not buffer._task.done()
+    assert await stored_pages(database) == ["home"]
+    assert dropped("flush_failed") == before + 1
+    await buffer.stop()
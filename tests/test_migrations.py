@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from migrations import MIGRATIONS, MIGRATIONS_COLLECTION, TTL_INDEX_NAME, Migration, run_migrations, sync_ttl_indexes
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["migrations-test"]
+
+
+def recording(applied):
+    async def apply(db):
+        applied.append(db.name)
+    return apply
+
+
+async def test_migrations_are_applied_once(db):
+    applied = []
+    migrations = [Migration(1, "First", recording(applied)), Migration(2, "Second", recording(applied))]
+    await run_migrations(db, migrations)
+    await run_migrations(db, migrations)
+    assert applied == ["migrations-test", "migrations-test"]
+    statuses = {doc["_id"]: doc["status"] async for doc in db[MIGRATIONS_COLLECTION].find()}
+    assert statuses == {1: "applied", 2: "applied"}
+
+
+async def test_a_claim_whose_lease_ran_out_is_taken_over(db):
+    now = datetime.utcnow()
+    await db[MIGRATIONS_COLLECTION].insert_one({
+        "_id": 1, "status": "running", "owner": "dead-worker",
+        "startedAt": now - timedelta(hours=1), "expiresAt": now - timedelta(minutes=1),
+    })
+    applied = []
+    await run_migrations(db, [Migration(1, "First", recording(applied))])
+    assert applied == ["migrations-test"]
+    doc = await db[MIGRATIONS_COLLECTION].find_one({"_id": 1})
+    assert doc["status"] == "applied"
+    assert doc["owner"] != "dead-worker"
+    assert "expiresAt" not in doc
+
+
+async def test_a_failed_migration_releases_its_claim(db):
+    async def broken(db):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await run_migrations(db, [Migration(1, "Broken", broken)])
+    assert await db[MIGRATIONS_COLLECTION].find_one({"_id": 1}) is None
+
+
+async def test_rollup_backfill_reads_the_database_it_is_given(db):
+    day = datetime(2026, 3, 1)
+    await db.page_views.insert_many([
+        {"id": str(i), "page": "home", "timestamp": day + timedelta(hours=i)} for i in range(3)
+    ])
+    await db.contact_submissions.insert_one({"id": "c", "portfolio": "other", "timestamp": day})
+    backfill = next(m for m in MIGRATIONS if m.version == 2)
+    await backfill.apply(db)
+    assert [
+        (doc["portfolio"], doc["day"], doc["page"], doc["views"])
+        async for doc in db.page_view_daily.find()
+    ] == [("default", day, "home", 3)]
+    assert [(doc["portfolio"], doc["contacts"]) async for doc in db.contact_daily.find()] == [("other", 1)]
+
+
+async def test_ttl_indexes_are_opt_in(db, monkeypatch):
+    await db.page_views.insert_one({"timestamp": datetime.utcnow()})
+    await sync_ttl_indexes(db)
+    assert TTL_INDEX_NAME not in await db.page_views.index_information()
+
+    monkeypatch.setenv("PAGE_VIEW_TTL_DAYS", "30")
+    await sync_ttl_indexes(db)
+    index = (await db.page_views.index_information())[TTL_INDEX_NAME]
+    assert index["expireAfterSeconds"] == 30 * 86400
+    assert TTL_INDEX_NAME not in await db.contact_submissions.index_information()
+
+    monkeypatch.delenv("PAGE_VIEW_TTL_DAYS")
+    await sync_ttl_indexes(db)
+    assert TTL_INDEX_NAME not in await db.page_views.index_information()
+
+
+async def test_bucketed_page_views_expire_by_hour(db, monkeypatch):
+    monkeypatch.setenv("PAGE_VIEW_TTL_DAYS", "7")
+    await db.page_view_buckets.insert_one({"hour": datetime.utcnow()})
+    await sync_ttl_indexes(db, "buckets")
+    index = (await db.page_view_buckets.index_information())[TTL_INDEX_NAME]
+    assert index["key"] == [("hour", -1)]
@@ -0,0 +1,155 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import mongo_storage
+from models import PageView
+from mongo_storage import MongoStorage
+
+pytestmark = pytest.mark.anyio
+
+HOUR = datetime(2026, 3, 1, 10)
+
+
+@pytest.fixture
+def client_options(monkeypatch):
+    """Options each MongoDB client was created with; the clients are mongomock"""
+    options = []
+
+    def client(url, **kwargs):
+        options.append(kwargs)
+        return mongomock_motor.AsyncMongoMockClient()
+
+    monkeypatch.setattr(mongo_storage, "AsyncIOMotorClient", client)
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", f"test-{uuid.uuid4().hex[:8]}")
+    return options
+
+
+@pytest.fixture
+async def mongo(client_options):
+    storage = MongoStorage()
+    await storage.connect()
+    yield storage
+    await storage.disconnect()
+
+
+async def test_pool_is_tuned_from_the_environment(client_options, monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "50")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "5")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "250")
+    storage = MongoStorage()
+    await storage.connect()
+    [options] = client_options
+    assert options["maxPoolSize"] == 50
+    assert options["minPoolSize"] == 5
+    assert options["waitQueueTimeoutMS"] == 250
+    assert options["serverSelectionTimeoutMS"] == 5000
+    assert "maxIdleTimeMS" not in options
+    assert options["event_listeners"] == [storage.pool_stats]
+
+
+async def test_warm_up_pings_once_per_connection(mongo, monkeypatch):
+    monkeypatch.setenv("MONGO_WARMUP_CONNECTIONS", "6")
+    pings = []
+
+    async def ping():
+        pings.append(1)
+        return 0.1
+
+    monkeypatch.setattr(mongo, "ping", ping)
+    await mongo.warm_up()
+    assert len(pings) == 6
+
+
+async def test_readiness_reports_the_pool(mongo):
+    stats = mongo.pool_stats
+    for _ in range(3):
+        stats.connection_created(None)
+    stats.connection_checked_out(None)
+    stats.connection_closed(None)
+    stats.connection_check_out_failed(None)
+    report = await mongo.readiness()
+    assert report["ready"] is True
+    assert report["backend"] == "mongo"
+    assert report["pool"] == {
+        "open": 2, "checkedOut": 1, "idle": 1, "created": 3, "closed": 1, "checkoutFailures": 1
+    }
+
+
+async def test_readiness_fails_when_the_ping_does(mongo, monkeypatch):
+    async def ping():
+        raise TimeoutError("no server")
+
+    monkeypatch.setattr(mongo, "ping", ping)
+    report = await mongo.readiness()
+    assert report == {"ready": False, "backend": "mongo", "error": "TimeoutError", "pool": mongo.pool_snapshot()}
+
+
+@pytest.fixture
+async def bucketed(client_options, monkeypatch):
+    monkeypatch.setenv("PAGE_VIEW_STORAGE", "buckets")
+    monkeypatch.setenv("PAGE_VIEW_BUCKET_SIZE", "3")
+    storage = MongoStorage()
+    await storage.connect()
+    yield storage
+    await storage.disconnect()
+
+
+def views_at(*minutes, page="home", hour=HOUR):
+    return [
+        PageView(page=page, timestamp=hour + timedelta(minutes=m), ipAddress="10.0.0.1", referrer="https://a.example/")
+        for m in minutes
+    ]
+
+
+async def test_views_are_packed_into_hourly_buckets(bucketed):
+    assert await bucketed.log_page_views(views_at(5, 1, 3, 2, 4) + views_at(30, page="about"))
+    assert await bucketed.log_page_views(views_at(70, 0))
+    buckets = [doc async for doc in bucketed.db.page_view_buckets.find().sort([("hour", 1), ("page", 1)])]
+    assert [(b["page"], b["hour"], b["count"]) for b in buckets] == [
+        ("about", HOUR, 1), ("home", HOUR, 3), ("home", HOUR, 3), ("home", HOUR + timedelta(hours=1), 1)
+    ]
+    assert await bucketed.db.page_views.count_documents({}) == 0
+    [daily] = [doc async for doc in bucketed.db.page_view_daily.find({"page": "home"})]
+    assert daily["views"] == 7
+
+
+async def test_bucketed_views_read_back_like_documents(bucketed):
+    await bucketed.log_page_views(views_at(5, 1, 3, 2, 4, 70))
+    start, end = HOUR + timedelta(minutes=2), HOUR + timedelta(hours=1)
+    docs = [doc async for doc in bucketed.iter_page_views(start=start, end=end)]
+    assert [doc["timestamp"].minute for doc in docs] == [2, 3, 4, 5]
+    assert docs[0] == {
+        "portfolio": "default", "page": "home", "timestamp": HOUR + timedelta(minutes=2),
+        "ipAddress": "10.0.0.1", "userAgent": None, "referrer": "https://a.example/"
+    }
+
+
+async def test_bucketed_deletes_cover_whole_hours(bucketed):
+    await bucketed.log_page_views(views_at(5, 10, 70))
+    start, end = HOUR + timedelta(minutes=7), HOUR + timedelta(minutes=8)
+    assert await bucketed.count_page_views(start, end) == 2
+    assert await bucketed.delete_page_views(start, end, 100) == 2
+    assert [doc["timestamp"].minute async for doc in bucketed.iter_page_views()] == [10]
+
+
+async def test_page_views_are_moved_into_buckets(bucketed):
+    await bucketed.db.page_views.insert_many([view.model_dump() for view in views_at(1, 2, 3, 4, 61)])
+    assert await bucketed.bucket_page_views() == {"views": 5, "buckets": 3, "dropped": False}
+    # Re-running replaces the buckets it wrote rather than adding more
+    assert await bucketed.bucket_page_views(drop_source=True) == {"views": 5, "buckets": 3, "dropped": True}
+    assert await bucketed.db.page_view_buckets.count_documents({}) == 3
+    assert await bucketed.db.page_views.count_documents({}) == 0
+    # Migrated buckets are sealed, so new views start buckets of their own
+    await bucketed.log_page_views(views_at(5))
+    assert await bucketed.db.page_view_buckets.count_documents({}) == 4
+    assert len([doc async for doc in bucketed.iter_page_views()]) == 6
+
+
+async def test_moving_into_buckets_needs_the_bucket_layout(mongo):
+    with pytest.raises(ValueError, match="PAGE_VIEW_STORAGE=buckets"):
+        await mongo.bucket_page_views()
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ContactSubmission
+from pagination import decode_cursor, encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(timestamp, "abc")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (timestamp, "abc")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+async def test_keyset_pages_cover_every_submission_once(database):
+    base = datetime(2024, 5, 1)
+    for i in range(25):
+        # Pairs share a timestamp, so the id has to break ties
+        await database.create_contact_submission(ContactSubmission(
+            name="Ada", email="ada@example.com", message="A message long enough",
+            timestamp=base + timedelta(minutes=i // 2)
+        ))
+
+    seen, after = [], None
+    while True:
+        page, has_more = await database.get_contact_submissions(limit=10, after=after)
+        seen.extend(page)
+        if not has_more:
+            break
+        after = (page[-1].timestamp, page[-1].id)
+
+    assert len(seen) == 25
+    assert len({s.id for s in seen}) == 25
+    keys = [(s.timestamp, s.id) for s in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+async def test_submissions_endpoint_pages_with_cursor(client, database):
+    for i in range(3):
+        await database.create_contact_submission(ContactSubmission(
+            name="Ada", email="ada@example.com", message="A message long enough",
+            timestamp=datetime(2024, 5, 1) + timedelta(hours=i)
+        ))
+    first = (await client.get("/api/contact/submissions", params={"limit": 2})).json()
+    assert len(first["submissions"]) == 2 and first["nextCursor"]
+    second = (await client.get("/api/contact/submissions", params={"limit": 2, "cursor": first["nextCursor"]})).json()
+    assert len(second["submissions"]) == 1 and second["nextCursor"] is None
+    response = await client.get("/api/contact/submissions", params={"cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,41 @@
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, parse_limit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable stand-in for time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_parse_limit():
+    assert parse_limit("5/60") == (5, 60.0)
+    assert parse_limit("10") == (10, 1.0)
+    assert parse_limit("off") is None
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    limiter = RateLimiter("test", capacity=3, period=3.0)
+    assert [limiter.acquire("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a") == pytest.approx(1.0)
+    # Other clients have their own bucket
+    assert limiter.acquire("b") == 0.0
+
+    clock[0] += 1.0
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") > 0
+
+
+def test_least_recently_seen_clients_are_evicted(clock):
+    limiter = RateLimiter("test", capacity=1, period=60.0, max_clients=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("c")
+    assert len(limiter._buckets) == 2
+    # "a" was evicted, so its bucket starts full again
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("c") > 0
@@ -0,0 +1,10 @@
+from portfolio_service import load_seed
+from responses import render_json
+
+
+def test_rendered_portfolio_matches_pydantic_json():
+    # ETags are hashes of these bytes, so switching encoders mustn't change them
+    portfolio = load_seed()
+    assert render_json(portfolio).identity == portfolio.model_dump_json().encode()
+    fields = {"personal", "skills"}
+    assert render_json(portfolio, include=fields).identity == portfolio.model_dump_json(include=fields).encode()
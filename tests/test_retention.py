@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import PageView
+from retention import RetentionJob, SegmentManifest, read_archive
+from storage import day_start
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def job(tmp_path):
+    job = RetentionJob()
+    job.archive_dir = tmp_path
+    job.retention_days["page_views"] = 7
+    job.batch_size = 3
+    job.batch_pause = 0
+    return job
+
+
+async def log_views(database, days_ago, count):
+    day = day_start(datetime.utcnow()) - timedelta(days=days_ago)
+    views = [PageView(page="home", timestamp=day + timedelta(minutes=i)) for i in range(count)]
+    await database.log_page_views(views)
+    return views
+
+
+async def stored_page_views(database):
+    return [doc async for doc in database.iter_page_views()]
+
+
+async def test_old_page_views_are_archived_then_deleted(database, job):
+    old = await log_views(database, 10, 4) + await log_views(database, 9, 2)
+    recent = await log_views(database, 1, 3)
+
+    result = await job.run_once()
+    assert result["page_views"] == {"segments": 2, "records": 6, "deleted": 6}
+    assert {doc["id"] for doc in await stored_page_views(database)} == {v.id for v in recent}
+    assert [doc["id"] for doc in read_archive(job.archive_dir, "page_views")] == [v.id for v in old]
+    assert all(s["status"] == "deleted" for s in SegmentManifest(job.archive_dir).segments)
+
+    # Nothing left to do on the next run
+    assert (await job.run_once())["page_views"] == {"segments": 0, "records": 0, "deleted": 0}
+
+
+async def test_interrupted_run_is_finished_without_archiving_twice(database, job, monkeypatch):
+    old = await log_views(database, 10, 5)
+
+    async def interrupted(collection, segment):
+        raise ConnectionError("database went away")
+
+    monkeypatch.setattr(job, "_delete", interrupted)
+    with pytest.raises(ConnectionError):
+        await job.run_once()
+    [segment] = SegmentManifest(job.archive_dir).segments
+    assert segment["status"] == "archived"
+    assert len(await stored_page_views(database)) == 5
+
+    monkeypatch.undo()
+    result = await job.run_once()
+    assert result["page_views"] == {"segments": 0, "records": 0, "deleted": 5}
+    assert await stored_page_views(database) == []
+    [segment] = SegmentManifest(job.archive_dir).segments
+    assert segment["status"] == "deleted"
+    assert [doc["id"] for doc in read_archive(job.archive_dir, "page_views")] == [v.id for v in old]
+
+
+async def test_record_stored_late_in_an_archived_range_is_not_lost(database, job, monkeypatch):
+    old = await log_views(database, 10, 3)
+    late = PageView(page="late", timestamp=old[0].timestamp + timedelta(seconds=30))
+
+    async def interrupted(collection, segment):
+        raise ConnectionError("database went away")
+
+    monkeypatch.setattr(job, "_delete", interrupted)
+    with pytest.raises(ConnectionError):
+        await job.run_once()
+    monkeypatch.undo()
+
+    # A delayed flush lands inside the archived segment's range
+    await database.log_page_views([late])
+    result = await job.run_once()
+    assert result["page_views"] == {"segments": 1, "records": 4, "deleted": 4}
+    assert await stored_page_views(database) == []
+    archived = sorted(doc["id"] for doc in read_archive(job.archive_dir, "page_views"))
+    assert archived == sorted([v.id for v in old] + [late.id])
+    assert len(SegmentManifest(job.archive_dir).segments) == 1
+
+
+async def test_backfill_keeps_rollups_of_archived_days(database, job):
+    await log_views(database, 10, 4)
+    await log_views(database, 1, 2)
+    await job.run_once()
+
+    await database.backfill_rollups()
+    summary = await database.get_analytics_summary(days=30)
+    assert summary["totalViews"] == 6
@@ -0,0 +1,20 @@
+import json
+
+import pytest
+
+from portfolio_service import SEED_PATH, load_seed
+
+
+def test_seed_fixture_loads_under_any_slug():
+    portfolio = load_seed(slug="someone")
+    assert portfolio.slug == "someone"
+    assert portfolio.personal.name
+
+
+def test_unknown_seed_version_is_rejected(tmp_path):
+    seed = json.loads(SEED_PATH.read_text())
+    seed["version"] = 999
+    path = tmp_path / "seed.json"
+    path.write_text(json.dumps(seed))
+    with pytest.raises(ValueError, match="Unsupported seed version"):
+        load_seed(path)
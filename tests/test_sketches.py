@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import datetime
+
+from models import PageView
+from sketches import HyperLogLog, SpaceSaving, TrafficSketch, referrer_host, sketch_page_views
+
+
+def test_hyperloglog_estimates_and_merges():
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(5000):
+        first.add(f"visitor-{i}")
+        second.add(f"visitor-{i + 2500}")
+    assert abs(first.count() - 5000) < 5000 * 0.05
+    merged = first.merge(second)
+    assert abs(merged.count() - 7500) < 7500 * 0.05
+    assert HyperLogLog.from_bytes(merged.to_bytes()).count() == merged.count()
+    # Small sets are counted exactly
+    small = HyperLogLog()
+    for value in ("a", "b", "c", "a"):
+        small.add(value)
+    assert small.count() == 3
+
+
+def test_space_saving_keeps_heavy_hitters_through_merges():
+    stream = ["google.com"] * 50 + ["github.com"] * 30 + [f"site{i}.com" for i in range(40)]
+    sketch = SpaceSaving(capacity=8)
+    for item in stream:
+        sketch.add(item)
+    top = sketch.top(2)
+    assert [item for item, _, _ in top] == ["google.com", "github.com"]
+    for item, count, error in sketch.top(8):
+        true_count = stream.count(item)
+        assert count - error <= true_count <= count
+
+    merged = sketch.merge(SpaceSaving.from_counts(Counter({"github.com": 40}), capacity=8))
+    assert merged.top(1)[0][0] == "github.com"
+
+
+def test_sketch_page_views_by_portfolio_and_day():
+    day = datetime(2024, 5, 1)
+    views = [
+        PageView(page="home", portfolio="a", timestamp=day, ipAddress="1.1.1.1", userAgent="x",
+                 referrer="https://www.google.com/search?q=1"),
+        PageView(page="home", portfolio="a", timestamp=day, ipAddress="1.1.1.1", userAgent="x",
+                 referrer="https://www.google.com/search?q=2"),
+        PageView(page="home", portfolio="b", timestamp=day, ipAddress="2.2.2.2", userAgent="y"),
+    ]
+    sketches = sketch_page_views(views)
+    assert sketches[("a", day)].visitors.count() == 1
+    assert sketches[("a", day)].referrers.top(1)[0][:2] == ("www.google.com", 2)
+    assert sketches[("b", day)].referrers.top(1) == []
+    restored = TrafficSketch.from_document(sketches[("a", day)].to_document())
+    assert restored.visitors.count() == 1
+
+
+def test_referrer_host():
+    assert referrer_host("https://News.ycombinator.com/item?id=1") == "news.ycombinator.com"
+    assert referrer_host("") is None
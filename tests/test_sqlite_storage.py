@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ContactSubmission, PageView
+from sqlite_storage import SQLiteStorage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def sqlite(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "portfolio.db"))
+    storage = SQLiteStorage()
+    await storage.connect()
+    yield storage
+    await storage.disconnect()
+
+
+async def test_failed_write_does_not_take_other_writes_with_it(sqlite, monkeypatch):
+    async def failing_merge(sketches):
+        # Fails after other coroutines have had a chance to write
+        await asyncio.sleep(0.1)
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(sqlite, "_merge_sketches", failing_merge)
+    views = [PageView(page="home")]
+    submission = ContactSubmission(name="Ada", email="ada@example.com", message="A message long enough")
+
+    async def submit_meanwhile():
+        await asyncio.sleep(0.02)
+        return await sqlite.create_contact_submission(submission)
+
+    logged, created = await asyncio.gather(sqlite.log_page_views(views), submit_meanwhile())
+    assert (logged, created) == (False, True)
+
+    # The page views were rolled back as a whole, and the submission kept
+    assert [doc async for doc in sqlite.iter_page_views()] == []
+    assert [doc["id"] async for doc in sqlite.iter_contact_submissions()] == [submission.id]
+    summary = await sqlite.get_analytics_summary(days=7)
+    assert summary["totalViews"] == 0
+    assert summary["totalContacts"] == 1
+
+
+async def test_window_stats_count_referrers_by_host(sqlite):
+    await sqlite.log_page_views([
+        PageView(page="home", referrer="https://www.google.com/search?q=1"),
+        PageView(page="home", referrer="https://WWW.google.com/search?q=2"),
+        PageView(page="home", referrer="https://news.ycombinator.com/item?id=1"),
+        PageView(page="home"),
+    ])
+    stats = await sqlite.page_view_window_stats([7], "day", 10)
+    assert stats["windows"][7]["topReferrers"] == [
+        {"referrer": "www.google.com", "views": 2},
+        {"referrer": "news.ycombinator.com", "views": 1},
+    ]
+
+
+async def test_backfill_rebuilds_only_days_with_raw_rows(sqlite):
+    old_day = datetime.utcnow() - timedelta(days=3)
+    await sqlite.log_page_views([PageView(page="home", timestamp=old_day) for _ in range(3)])
+    await sqlite.log_page_views([PageView(page="home")])
+    # As retention does once the old day is archived
+    await sqlite.delete_page_views(old_day - timedelta(hours=1), old_day + timedelta(hours=1), 100)
+
+    await sqlite.backfill_rollups()
+    assert (await sqlite.get_analytics_summary(days=7))["totalViews"] == 4
+
+
+async def test_views_already_stored_are_not_counted_again(sqlite):
+    first = PageView(page="home", referrer="https://a.example/")
+    second = PageView(page="home", referrer="https://a.example/")
+    assert await sqlite.log_page_views([first])
+    # A retried batch holding a view that made it in the first time
+    assert await sqlite.log_page_views([first, second, second])
+    assert len([doc async for doc in sqlite.iter_page_views()]) == 2
+    assert (await sqlite.get_analytics_summary(days=7))["totalViews"] == 2
+    [sketch] = (await sqlite.load_traffic_sketches(datetime.utcnow() - timedelta(days=1), "default")).values()
+    assert sketch.referrers.top(1) == [("a.example", 2, 0)]
+
+
+async def test_large_batches_are_inserted_in_chunks(sqlite, monkeypatch):
+    import sqlite_storage
+
+    monkeypatch.setattr(sqlite_storage, "INSERT_CHUNK_ROWS", 3)
+    assert await sqlite.log_page_views([PageView(page="home") for _ in range(7)])
+    assert (await sqlite.get_analytics_summary(days=7))["totalViews"] == 7
@@ -0,0 +1,29 @@
+import logging
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+pytestmark = pytest.mark.anyio
+
+PHASES = ("connect", "migrate", "portfolio", "warm_up", "page_view_buffer", "contact_queue", "coherence")
+
+# Generous for a shared CI box; the memory backend boots in tens of milliseconds
+STARTUP_BUDGET_SECONDS = 2.0
+
+
+async def test_startup_logs_its_phases_and_stays_within_budget(database, caplog):
+    from server import app
+
+    caplog.set_level(logging.INFO, logger="server")
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        elapsed = time.perf_counter() - started
+
+    assert elapsed < STARTUP_BUDGET_SECONDS
+    [message] = [r.getMessage() for r in caplog.records if "startup complete" in r.getMessage()]
+    for phase in PHASES + ("total",):
+        assert f"{phase}=" in message
+        assert REGISTRY.get_sample_value("startup_phase_seconds", {"phase": phase}) is not None
+    total = REGISTRY.get_sample_value("startup_phase_seconds", {"phase": "total"})
+    assert total <= elapsed